@@ -0,0 +1,140 @@
+"""Compare per-line and per-block coverage probes.
+
+Instruments a synthetic source tree with one probe per executable line and
+with one probe per basic block, and reports for each mode:
+
+- probes:   number of probes written into the instrumented files
+- executed: probes executed by the synthetic workload (each program is
+            called once on a dataset of --obs observations, so loop bodies
+            run once per variable)
+- runtime:  wall-clock time of the workload under Stata, if --stata is given
+
+Usage:
+    python benchmarks/bench_block_probes.py [--lines 10000] [--obs 1000]
+        [--stata stata-mp]
+"""
+
+from __future__ import annotations
+
+import argparse
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from statatest.coverage.instrument import basic_blocks, setup_instrumented_environment
+from statatest.coverage.models import InstrumentedFile, InstrumentOptions
+
+LINES_PER_FILE = 200
+LOOP_ITERATIONS = 3
+
+PROGRAM_BODY = """    tempvar tmp
+    quietly gen double `tmp' = .
+    local n = 0
+    foreach v in x1 x2 x3 {
+        quietly replace `tmp' = `v' * 2
+        local n = `n' + 1
+        local last "`v'"
+    }
+    if `n' > 0 {
+        quietly summarize `tmp'
+        local mean = r(mean)
+    }
+    capture drop `tmp'
+    local done = 1
+"""
+
+
+def make_tree(root: Path, total_lines: int) -> tuple[Path, int]:
+    """Write a synthetic source tree with about total_lines lines.
+
+    Args:
+        root: Directory in which to create the tree.
+        total_lines: Approximate number of source lines.
+
+    Returns:
+        Tuple of (source directory, number of programs).
+    """
+    source_dir = root / "src"
+    source_dir.mkdir()
+    body_lines = PROGRAM_BODY.count("\n")
+    repeats = max(1, (LINES_PER_FILE - 2) // body_lines)
+    programs = max(1, total_lines // LINES_PER_FILE)
+    for i in range(programs):
+        content = f"program define prog{i}\n" + PROGRAM_BODY * repeats + "end\n"
+        (source_dir / f"prog{i}.ado").write_text(content, encoding="utf-8")
+    return source_dir, programs
+
+
+def executed_probes(files: dict[int, InstrumentedFile], source_dir: Path) -> int:
+    """Count probe executions of one call of every program.
+
+    Lines inside the foreach body run LOOP_ITERATIONS times; every other
+    line runs once.
+    """
+    executed = 0
+    for instrumented in files.values():
+        lines = (source_dir / Path(instrumented.path).name).read_text().split("\n")
+        in_loop = {
+            lineno
+            for leader, members in basic_blocks(lines).items()
+            if lines[leader - 2].lstrip().startswith("foreach")
+            for lineno in members
+        }
+        probed = instrumented.block_leaders or sorted(instrumented.line_map.values())
+        executed += sum(LOOP_ITERATIONS if p in in_loop else 1 for p in probed)
+    return executed
+
+
+def time_stata(stata: str, instrumented_dir: Path, programs: int, obs: int) -> float:
+    """Run every program once under Stata and return the wall-clock time."""
+    do_file = instrumented_dir.parent / "workload.do"
+    calls = "\n".join(f"prog{i}" for i in range(programs))
+    do_file.write_text(
+        f'adopath ++ "{instrumented_dir}"\n'
+        f"clear\nset obs {obs}\n"
+        "gen x1 = runiform()\ngen x2 = runiform()\ngen x3 = runiform()\n"
+        f'log using "{instrumented_dir.parent / "workload.smcl"}", smcl replace\n'
+        f"{calls}\nlog close\n",
+        encoding="utf-8",
+    )
+    start = time.perf_counter()
+    subprocess.run(  # noqa: S603
+        [stata, "-s", "-q", str(do_file)],
+        check=False,
+        capture_output=True,
+        cwd=do_file.parent,
+    )
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Run the benchmark and print a table of results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=10_000)
+    parser.add_argument("--obs", type=int, default=1_000)
+    parser.add_argument("--stata", help="Stata executable; omit to skip runtime")
+    args = parser.parse_args()
+
+    print(f"{'granularity':>11} {'probes':>8} {'executed':>9} {'runtime':>8}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        source_dir, programs = make_tree(root, args.lines)
+        for granularity in ("line", "block"):
+            work_dir = root / granularity
+            instrumented_dir, files = setup_instrumented_environment(
+                [source_dir],
+                work_dir,
+                options=InstrumentOptions(granularity=granularity),
+            )
+            probes = sum(f.probe_count for f in files.values())
+            executed = executed_probes(files, source_dir)
+            runtime = "-"
+            if args.stata:
+                seconds = time_stata(args.stata, instrumented_dir, programs, args.obs)
+                runtime = f"{seconds:.3f}s"
+            print(f"{granularity:>11} {probes:>8} {executed:>9} {runtime:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark writing and querying the coverage context database.
+
+Records synthetic per-test line counts (--tests tests, each running
+--lines lines spread over --files of the --instrumented source files in the
+file table) and reports:
+
+- write:  time to record all tests in one transaction
+- rows/s: rows written per second
+- query:  average time of a who-covers query for a single line
+
+Usage:
+    python benchmarks/bench_contexts.py [--tests 200] [--lines 10000]
+        [--files 300] [--instrumented 3000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from statatest.core.models import TestResult
+from statatest.coverage.contexts import ContextDatabase
+from statatest.coverage.models import FileTable, InstrumentedFile
+
+QUERIES = 200
+
+
+def make_files(count: int) -> FileTable:
+    """Return a file table of count instrumented files of 500 lines."""
+    line_map = {lineno + 1: lineno for lineno in range(1, 500)}
+    return {
+        file_id: InstrumentedFile(
+            file_id=file_id, path=f"ado/p{file_id}.ado", line_map=dict(line_map)
+        )
+        for file_id in range(1, count + 1)
+    }
+
+
+def make_counts(
+    rng: random.Random, lines: int, files: int
+) -> dict[str, dict[int, int]]:
+    """Return probe counts of one synthetic test, keyed by file id."""
+    counts: dict[str, dict[int, int]] = {}
+    for _ in range(lines):
+        key = str(rng.randrange(1, files + 1))
+        counts.setdefault(key, {})[rng.randrange(1, 500)] = rng.randrange(1, 1000)
+    return counts
+
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tests", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=10_000)
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--instrumented", type=int, default=3000)
+    args = parser.parse_args()
+
+    files = make_files(max(args.instrumented, args.files))
+    rng = random.Random(0)  # noqa: S311
+    results = [
+        TestResult(
+            f"tests/test_{i}.do",
+            passed=True,
+            duration=0.0,
+            coverage_hits=make_counts(rng, args.lines, args.files),
+        )
+        for i in range(args.tests)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db = ContextDatabase.open(Path(tmpdir) / "coverage.db")
+        start = time.perf_counter()
+        rows = db.record_results(results, files)
+        write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(QUERIES):
+            db.who_covers(f"p{rng.randrange(args.files)}.ado", rng.randrange(1, 500))
+        query = (time.perf_counter() - start) / QUERIES
+        db.close()
+
+    print(f"{'rows':>10} {'write':>8} {'rows/s':>10} {'query':>8}")
+    print(f"{rows:>10,} {write:>7.2f}s {rows / write:>10,.0f} {query * 1000:>6.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
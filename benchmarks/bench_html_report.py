@@ -0,0 +1,72 @@
+"""Benchmark rendering the HTML coverage report.
+
+Writes a synthetic source tree (--files files of --lines lines each) with
+random line counts and reports the time to:
+
+- cold:    render the index and every file page into an empty directory
+- warm:    render again with nothing changed (every page is skipped)
+- changed: render again after the coverage of one file changed
+
+Usage:
+    python benchmarks/bench_html_report.py [--files 3000] [--lines 200]
+        [--workers N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from statatest.coverage.html_report import write_html
+from statatest.coverage.models import CoverageReport
+
+
+def make_report(
+    rng: random.Random, root: Path, files: int, lines: int
+) -> CoverageReport:
+    """Write a synthetic source tree and return random coverage for it."""
+    report = CoverageReport()
+    for i in range(files):
+        name = f"ado/p{i % 26}/prog{i}.ado"
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            "".join(f"    local x{n} = `x{n - 1}' + 1\n" for n in range(lines)),
+            encoding="utf-8",
+        )
+        report.set_total_lines(name, set(range(1, lines + 1)))
+        for lineno in range(1, lines + 1):
+            if rng.random() < 0.8:  # noqa: PLR2004
+                report.add_hit(name, lineno, rng.randrange(1, 10_000))
+    return report
+
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=3_000)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--workers", type=int, help="Rendering processes")
+    args = parser.parse_args()
+
+    rng = random.Random(0)  # noqa: S311
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        report = make_report(rng, root, args.files, args.lines)
+        output_dir = root / "htmlcov"
+
+        print(f"{'run':>8} {'pages':>6} {'time':>8}")
+        for run in ("cold", "warm", "changed"):
+            if run == "changed":
+                report.add_hit("ado/p0/prog0.ado", 1)
+            start = time.perf_counter()
+            pages = write_html(report, output_dir, root, args.workers)
+            elapsed = time.perf_counter() - start
+            print(f"{run:>8} {pages:>6} {elapsed:>7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark coverage instrumentation on synthetic source trees.
+
+Generates .ado trees of roughly 1k, 10k and 50k lines and times
+setup_instrumented_environment:
+
+- sequential: one process, no cache (the previous behaviour)
+- parallel:   process pool, no cache
+- warm:       second run against the cached instrumented tree
+
+Usage:
+    python benchmarks/bench_instrumentation.py [--lines 1000 10000 50000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from statatest.coverage.instrument import setup_instrumented_environment
+
+LINES_PER_FILE = 200
+
+PROGRAM_BODY = """    version 16
+    syntax varlist [if] [in], [GENerate(name)]
+    marksample touse
+    // compute something
+    tempvar tmp
+    quietly gen double `tmp' = . if `touse'
+    foreach v of local varlist {
+        quietly replace `tmp' = `v' * 2 if `touse' & !missing(`v')
+    }
+    if "`generate'" != "" {
+        rename `tmp' `generate'
+    }
+"""
+
+
+def make_tree(root: Path, total_lines: int) -> Path:
+    """Write a synthetic source tree with about total_lines lines.
+
+    Args:
+        root: Directory in which to create the tree.
+        total_lines: Approximate number of source lines.
+
+    Returns:
+        Path to the source directory.
+    """
+    source_dir = root / "src"
+    source_dir.mkdir()
+    body_lines = PROGRAM_BODY.count("\n")
+    repeats = max(1, (LINES_PER_FILE - 2) // body_lines)
+    for i in range(max(1, total_lines // LINES_PER_FILE)):
+        content = f"program define prog{i}\n" + PROGRAM_BODY * repeats + "end\n"
+        (source_dir / f"prog{i}.ado").write_text(content, encoding="utf-8")
+    return source_dir
+
+
+def time_setup(source_dir: Path, work_dir: Path, max_workers: int | None) -> float:
+    """Time one setup_instrumented_environment call."""
+    start = time.perf_counter()
+    setup_instrumented_environment([source_dir], work_dir, max_workers=max_workers)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Run the benchmark and print a table of timings."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    args = parser.parse_args()
+
+    print(f"{'lines':>8} {'files':>6} {'sequential':>11} {'parallel':>9} {'warm':>7}")
+    for total_lines in args.lines:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            source_dir = make_tree(root, total_lines)
+            files = len(list(source_dir.glob("*.ado")))
+
+            sequential = time_setup(source_dir, root / "seq", max_workers=1)
+            parallel = time_setup(source_dir, root / "par", max_workers=None)
+            warm = time_setup(source_dir, root / "par", max_workers=None)
+            shutil.rmtree(root / "seq")
+
+        print(
+            f"{total_lines:>8} {files:>6} {sequential:>10.3f}s "
+            f"{parallel:>8.3f}s {warm:>6.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark the Stata lexer on a synthetic codebase.
+
+Generates --lines lines of Stata code mixing the constructs the lexer has to
+track (/* */ and // comments, /// continuations, strings, #delimit ; code,
+quietly blocks and Mata blocks), split into files of about 200 lines, and
+reports:
+
+- lex:    time to split every file into statements
+- lines/s: source lines lexed per second
+- total:  time of get_total_lines (lexing plus executable-line counting)
+
+The lexer should handle 100k lines in well under a second.
+
+Usage:
+    python benchmarks/bench_lexer.py [--lines 100000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from statatest.coverage.instrument import get_total_lines
+from statatest.coverage.lexer import lex
+
+LINES_PER_FILE = 200
+
+PROGRAM_BODY = """    version 16
+    syntax varlist [if] [in], [GENerate(name)]
+    /* Compute a scaled copy of each variable; the scale comes from
+       the options (see the help file: http://example.com/help) */
+    tempvar tmp
+    quietly {
+        gen double `tmp' = . if `touse' // missing by default
+        foreach v of local varlist {
+            replace `tmp' = `v' * 2 ///
+                if `touse' & !missing(`v')
+        }
+    }
+    * a star comment with "quotes" and a /// continuation ///
+      that runs on
+    local label `"scaled "copy" of `varlist'"'
+#delimit ;
+    label variable `tmp' "`label'; scaled";
+    display as text "done" _n
+        as result `tmp';
+#delimit cr
+    mata:
+        x = st_data(., "`varlist'") // load
+        y = x :* 2
+    end
+"""
+
+
+def make_files(total_lines: int) -> list[list[str]]:
+    """Return synthetic source files with about total_lines lines in all."""
+    body = PROGRAM_BODY.split("\n")[:-1]
+    repeats = max(1, (LINES_PER_FILE - 2) // len(body))
+    return [
+        [f"program define prog{i}", *body * repeats, "end"]
+        for i in range(max(1, total_lines // LINES_PER_FILE))
+    ]
+
+
+def main() -> None:
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100_000)
+    args = parser.parse_args()
+
+    files = make_files(args.lines)
+    lines = sum(len(f) for f in files)
+
+    start = time.perf_counter()
+    statements = sum(len(lex(f).statements) for f in files)
+    elapsed = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = []
+        for i, content in enumerate(files):
+            path = Path(tmpdir) / f"prog{i}.ado"
+            path.write_text("\n".join(content), encoding="utf-8")
+            paths.append(path)
+        start = time.perf_counter()
+        for path in paths:
+            get_total_lines(path)
+        total = time.perf_counter() - start
+
+    print(f"{'lines':>8} {'statements':>11} {'lex':>7} {'lines/s':>10} {'total':>7}")
+    print(
+        f"{lines:>8,} {statements:>11,} {elapsed:>6.3f}s "
+        f"{lines / elapsed:>10,.0f} {total:>6.3f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
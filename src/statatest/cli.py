@@ -8,7 +8,9 @@ This module provides the CLI entry point. It follows the Controller pattern:
 
 from __future__ import annotations
 
+import functools
 import sys
+import time
 from pathlib import Path
 from typing import TYPE_CHECKING
 
@@ -16,31 +18,95 @@ import click
 
 from statatest import __version__
 from statatest.core.config import Config
+from statatest.core.constants import (
+    COVERAGE_CONTEXTS,
+    COVERAGE_REPORT_FORMATS,
+    DEFAULT_COBERTURA_FILENAME,
+    DEFAULT_COVERAGE_DATA,
+)
 from statatest.core.logging import Colors, colorize, configure_logging
+from statatest.coverage.aggregator import aggregate_coverage
+from statatest.coverage.cobertura import write_cobertura
+from statatest.coverage.contexts import ContextDatabase
+from statatest.coverage.data import (
+    CoverageDataError,
+    combine_coverage_data,
+    write_coverage_data,
+)
+from statatest.coverage.diff import CoverageDiffError, changed_lines, patch_coverage
+from statatest.coverage.html_report import write_html
 from statatest.coverage.instrument import (
     cleanup_instrumented_environment,
+    record_proven_lines,
     setup_instrumented_environment,
 )
-from statatest.coverage.reporter import generate_html, generate_lcov
-from statatest.discovery import discover_tests
-from statatest.execution import run_tests
-from statatest.reporting import write_junit_xml
+from statatest.coverage.models import CoverageReport, InstrumentOptions
+from statatest.coverage.reachability import SourceIndex, unreachable_sources
+from statatest.coverage.reporter import write_lcov
+from statatest.coverage.workspace import RunRoot
+from statatest.discovery import (
+    DiscoveryIndex,
+    ExpressionError,
+    dedupe_roots,
+    discover_tests,
+)
+from statatest.execution import create_conftest_graph, run_tests
+from statatest.fixtures import ConftestGraph
+from statatest.reporting import (
+    CollectedTest,
+    Timings,
+    format_collection_json,
+    format_collection_text,
+    format_context_hits,
+    format_coverage_summary,
+    format_patch_coverage,
+    format_timings,
+    write_junit_xml,
+)
 
 if TYPE_CHECKING:
     from statatest.core.models import TestFile, TestResult
+    from statatest.coverage.models import FileTable
+
+
+def _record_durations(
+    index: DiscoveryIndex, tests: list[TestFile], results: list[TestResult]
+) -> None:
+    """Record test durations in the discovery index and save it.
+
+    Args:
+        index: Discovery index of the session.
+        tests: Test files that were run.
+        results: Their results, matched to the tests by test_file.
+    """
+    paths = {test.relative_path: test.path for test in tests}
+    for result in results:
+        if (path := paths.get(result.test_file)) is not None:
+            index.record_duration(path, result.duration)
+    index.save()
 
 
 def _setup_coverage(
-    config: Config, verbose: bool
-) -> tuple[Path | None, dict[str, dict[int, int]]]:
+    config: Config,
+    verbose: bool,
+    tests: list[TestFile] | None = None,
+    conftest_graph: ConftestGraph | None = None,
+) -> tuple[RunRoot | None, FileTable]:
     """Set up coverage instrumentation if source directories are configured.
 
+    With coverage.lazy, only the sources the tests can reach are
+    instrumented.
+
     Args:
         config: Configuration object with coverage_source paths.
         verbose: Whether to print verbose output.
+        tests: Test files of the session; None instruments every source.
+        conftest_graph: Session conftest graph, if any.
 
     Returns:
-        Tuple of (instrumented_dir, line_maps). Both are None/empty if no sources.
+        Tuple of (run_root, files): this run's instrumentation root, to be
+        released after the tests, and the instrumented files. Both are
+        None/empty if no sources.
     """
     source_dirs = [Path(p) for p in config.coverage_source]
     if not source_dirs:
@@ -58,14 +124,97 @@ def _setup_coverage(
             colorize(f"Instrumenting source files from: {source_dirs}", Colors.DIM)
         )
 
-    instrumented_dir, line_maps = setup_instrumented_environment(
-        source_dirs, Path.cwd()
-    )
+    index: SourceIndex | None = None
+    lazy = None
+    if config.coverage_lazy and tests:
+        index = SourceIndex.for_project(Path.cwd())
+        lazy = functools.partial(
+            _unreachable_sources,
+            tests=tests,
+            config=config,
+            conftest_graph=conftest_graph,
+            index=index,
+        )
+
+    run_root = RunRoot.create(Path.cwd())
+    try:
+        _, files = setup_instrumented_environment(
+            source_dirs,
+            Path.cwd(),
+            norecursedirs=config.norecursedirs,
+            options=_instrument_options(config),
+            run_root=run_root,
+            lazy=lazy,
+        )
+    except ValueError as e:
+        run_root.release()
+        click.echo(colorize(str(e), Colors.YELLOW))
+        sys.exit(1)
+    if index is not None:
+        index.save()
 
     if verbose:
-        click.echo(colorize(f"Instrumented {len(line_maps)} file(s)\n", Colors.DIM))
+        not_loaded = sum(1 for f in files.values() if not f.instrumented)
+        message = f"Instrumented {len(files) - not_loaded} file(s)"
+        if not_loaded:
+            message += f"; {not_loaded} not loaded by the selected tests"
+        click.echo(colorize(message + "\n", Colors.DIM))
+
+    return run_root, files
+
+
+def _unreachable_sources(
+    sources: dict[str, Path],
+    tests: list[TestFile],
+    config: Config,
+    conftest_graph: ConftestGraph | None,
+    index: SourceIndex,
+) -> dict[str, list[int]]:
+    """Find the sources the session's tests cannot reach.
+
+    Args:
+        sources: Source files by report key.
+        tests: Test files of the session.
+        config: Configuration object.
+        conftest_graph: Session conftest graph, if any.
+        index: Source index of the project.
 
-    return instrumented_dir, line_maps
+    Returns:
+        Executable lines of each unreachable source, by report key.
+    """
+    entry_points = _coverage_entry_points(tests, config, conftest_graph)
+    return unreachable_sources(sources, entry_points, index)
+
+
+def _coverage_entry_points(
+    tests: list[TestFile], config: Config, conftest_graph: ConftestGraph | None
+) -> list[Path]:
+    """Return the files a test session runs code from.
+
+    Args:
+        tests: Test files of the session.
+        config: Configuration object (setup_do).
+        conftest_graph: Session conftest graph, if any.
+
+    Returns:
+        The test files, their conftest.do files and the setup do-file.
+    """
+    graph = conftest_graph or create_conftest_graph(config)
+    entry_points = [test.path for test in tests]
+    for directory in dict.fromkeys(test.path.parent for test in tests):
+        entry_points.extend(graph.conftest_files(directory))
+    if config.setup_do:
+        entry_points.append(Path(config.setup_do))
+    return list(dict.fromkeys(entry_points))
+
+
+def _instrument_options(config: Config) -> InstrumentOptions:
+    """Return the instrumentation options set in the configuration."""
+    return InstrumentOptions(
+        probes=config.coverage_probes,
+        granularity=config.coverage_granularity,
+        adaptive=config.coverage_adaptive,
+    )
 
 
 def _run_test_session(
@@ -75,6 +224,11 @@ def _run_test_session(
     cov_report: str | None,
     junit_xml: str | None,
     verbose: bool,
+    index: DiscoveryIndex | None = None,
+    conftest_graph: ConftestGraph | None = None,
+    timings: Timings | None = None,
+    cov_context: str | None = None,
+    cov_data: str | None = None,
 ) -> int:
     """Execute tests and generate reports.
 
@@ -82,86 +236,282 @@ def _run_test_session(
         tests: List of test files to run.
         config: Configuration object.
         coverage: Whether coverage collection is enabled.
-        cov_report: Coverage report format (lcov, html) or None.
+        cov_report: Coverage report format (lcov, html, xml) or None.
         junit_xml: Path for JUnit XML output or None.
         verbose: Whether to print verbose output.
+        index: Discovery index in which to record test durations.
+        conftest_graph: Session conftest graph built at collection time.
+        timings: If given, phase timings are added to it and printed.
+        cov_context: If "test", each test's line coverage is stored in the
+            coverage context database.
+        cov_data: Path of the coverage data file (default:
+            .statatest/coverage.stcov).
 
     Returns:
         Number of failed tests.
     """
+    show_timings = timings is not None
+    timings = timings or Timings()
+
     # Set up coverage instrumentation if enabled
-    instrumented_dir: Path | None = None
-    line_maps: dict[str, dict[int, int]] = {}
+    run_root: RunRoot | None = None
+    files: FileTable = {}
 
     if coverage:
-        instrumented_dir, line_maps = _setup_coverage(config, verbose)
-
-    # Run tests
-    results = run_tests(
-        tests,
-        config,
-        coverage=coverage,
-        verbose=verbose,
-        instrumented_dir=instrumented_dir,
-    )
+        with timings.measure("instrumentation"):
+            run_root, files = _setup_coverage(config, verbose, tests, conftest_graph)
+        probes = sum(f.probe_count for f in files.values())
+        not_loaded = sum(1 for f in files.values() if not f.instrumented)
+        note = f"{len(files) - not_loaded} files, {probes} probes"
+        if not_loaded:
+            note += f", {not_loaded} not loaded"
+        timings.note("instrumentation", note)
+
+    # Run tests; the run's instrumented files are not needed afterwards
+    try:
+        with timings.measure("execution"):
+            results = run_tests(
+                tests,
+                config,
+                coverage=coverage,
+                verbose=verbose,
+                instrumented_dir=run_root.path if run_root else None,
+                conftest_graph=conftest_graph,
+            )
+    finally:
+        if run_root is not None:
+            run_root.release()
 
     # Generate reports
-    if junit_xml:
-        write_junit_xml(results, Path(junit_xml))
-        click.echo(f"\nJUnit XML written to: {junit_xml}")
+    with timings.measure("reporting"):
+        if junit_xml:
+            write_junit_xml(results, Path(junit_xml))
+            click.echo(f"\nJUnit XML written to: {junit_xml}")
 
-    if coverage and cov_report:
-        _generate_coverage_report(results, cov_report, config, line_maps)
+        if coverage:
+            _write_coverage(results, files, config, cov_report, cov_context, cov_data)
 
-    # Clean up instrumented files
-    if instrumented_dir:
-        cleanup_instrumented_environment(Path.cwd())
+    # Remember durations for --collect-only predictions
+    if index is not None:
+        _record_durations(index, tests, results)
 
     # Print summary
     _print_summary(results)
+    if show_timings:
+        click.echo()
+        for line in format_timings(timings):
+            click.echo(line)
 
     return sum(1 for r in results if not r.passed)
 
 
-@click.group(invoke_without_command=True)
-@click.argument("path", type=click.Path(exists=True), required=False)
+def _write_coverage(
+    results: list[TestResult],
+    files: FileTable,
+    config: Config,
+    cov_report: str | None,
+    cov_context: str | None,
+    cov_data: str | None,
+) -> None:
+    """Write the coverage data file, report and contexts of a test session.
+
+    Args:
+        results: Test results with coverage hits.
+        files: Instrumented files by coverage file id.
+        config: Configuration object.
+        cov_report: Coverage report format, if any.
+        cov_context: Coverage context kind, if any.
+        cov_data: Path of the coverage data file (default:
+            .statatest/coverage.stcov).
+    """
+    report = aggregate_coverage(results, files)
+    data_path = Path(cov_data or DEFAULT_COVERAGE_DATA)
+    write_coverage_data(report, data_path)
+    click.echo(f"\nCoverage data written to: {data_path}")
+    if cov_report:
+        _generate_coverage_report(report, cov_report, config)
+
+    if cov_context:
+        with ContextDatabase.for_project(Path.cwd()) as db:
+            rows = db.record_results(results, files)
+        click.echo(f"Coverage contexts ({rows:,} lines) written to: {db.path}")
+
+    if config.coverage_adaptive:
+        try:
+            proven = record_proven_lines(
+                Path.cwd(), files, report, _instrument_options(config)
+            )
+        except ValueError as e:
+            click.echo(colorize(f"Warning: {e}", Colors.YELLOW))
+        else:
+            click.echo(f"Adaptive coverage: {proven:,} newly covered line(s)")
+
+
+class _DefaultGroup(click.Group):
+    """Command group that runs tests unless a subcommand is named.
+
+    `statatest tests/ -v` runs the default command with its arguments, while
+    `statatest coverage ...` reaches the coverage subcommands. A directory
+    named like a subcommand is taken as a test path, unless it is followed
+    by one of that subcommand's own commands (`statatest coverage diff`).
+    """
+
+    default_command = "run"
+
+    def parse_args(self, ctx: click.Context, args: list[str]) -> list[str]:
+        """Route arguments that do not start with a subcommand name."""
+        if not args or not self._is_subcommand(args):
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+    def _is_subcommand(self, args: list[str]) -> bool:
+        """Return whether the arguments name a subcommand, not a test path."""
+        command = self.commands.get(args[0])
+        if command is None or command.hidden:
+            return False
+        if not Path(args[0]).is_dir():
+            return True
+        following = args[1] if len(args) > 1 else None
+        if following == "--help":
+            return True
+        return isinstance(command, click.Group) and following in command.commands
+
+
+class _RunCommand(click.Command):
+    """The default command, whose help is also the help of statatest.
+
+    Its usage is shown without the hidden `run` name, and its help lists the
+    group's subcommands.
+    """
+
+    def format_usage(self, ctx: click.Context, formatter: click.HelpFormatter) -> None:
+        """Write both forms of the statatest command line."""
+        prog = ctx.parent.command_path if ctx.parent else ctx.command_path
+        formatter.write_usage(prog, " ".join(self.collect_usage_pieces(ctx)))
+        formatter.write_usage(prog, "COMMAND [ARGS]...", prefix="   or: ")
+
+    def format_epilog(self, ctx: click.Context, formatter: click.HelpFormatter) -> None:
+        """List the group's subcommands after the options."""
+        if ctx.parent is not None and isinstance(ctx.parent.command, click.Group):
+            ctx.parent.command.format_commands(ctx.parent, formatter)
+        super().format_epilog(ctx, formatter)
+
+
+@click.group(cls=_DefaultGroup)
+def main() -> None:
+    """statatest - Pytest-inspired testing framework for Stata."""
+
+
+@main.command(cls=_RunCommand, hidden=True)
+@click.argument("paths", nargs=-1, type=click.Path(exists=True))
 @click.option("-c", "--coverage", is_flag=True, help="Enable coverage collection.")
 @click.option(
     "-r",
     "--cov-report",
-    type=click.Choice(["lcov", "html"]),
+    type=click.Choice(COVERAGE_REPORT_FORMATS),
     help="Coverage report format.",
 )
+@click.option(
+    "--cov-context",
+    type=click.Choice(COVERAGE_CONTEXTS),
+    help="Also store which test ran each line, in .statatest/coverage.db.",
+)
+@click.option(
+    "--cov-data",
+    type=click.Path(dir_okay=False),
+    help=f"Coverage data file to write (default: {DEFAULT_COVERAGE_DATA}).",
+)
 @click.option("-j", "--junit-xml", type=click.Path(), help="Output JUnit XML to path.")
-@click.option("-m", "--marker", type=str, help="Only run tests with this marker.")
-@click.option("-k", "--keyword", type=str, help="Only run tests matching keyword.")
+@click.option(
+    "-m",
+    "--marker",
+    type=str,
+    help="Only run tests matching marker expression, e.g. 'panel and not slow'.",
+)
+@click.option(
+    "-k",
+    "--keyword",
+    type=str,
+    help="Only run tests whose name matches expression, e.g. 'merge or reshape'.",
+)
+@click.option(
+    "--collect-only",
+    is_flag=True,
+    help="Only collect tests and show the plan; do not run Stata.",
+)
+@click.option(
+    "--json",
+    "as_json",
+    is_flag=True,
+    help="With --collect-only, print the plan as JSON.",
+)
+@click.option(
+    "-n",
+    "--workers",
+    type=click.IntRange(min=1),
+    help="Number of test files to run concurrently.",
+)
+@click.option(
+    "--timings",
+    "show_timings",
+    is_flag=True,
+    help="Show how long collection, instrumentation and execution took.",
+)
+@click.option(
+    "--cache-clear",
+    is_flag=True,
+    help="Remove cached discovery and instrumentation data before running.",
+)
 @click.option("-v", "--verbose", is_flag=True, help="Verbose output.")
 @click.option("-V", "--version", "show_version", is_flag=True, help="Show version.")
 @click.option("-i", "--init", is_flag=True, help="Create statatest.toml template.")
-@click.pass_context
-def main(
-    ctx: click.Context,
-    path: str | None,
+def run(
+    paths: tuple[str, ...],
     coverage: bool,
     cov_report: str | None,
+    cov_context: str | None,
+    cov_data: str | None,
     junit_xml: str | None,
     marker: str | None,
     keyword: str | None,
+    collect_only: bool,
+    as_json: bool,
+    workers: int | None,
+    show_timings: bool,
+    cache_clear: bool,
     verbose: bool,
     show_version: bool,
     init: bool,
 ) -> None:
     """statatest - Pytest-inspired testing framework for Stata.
 
+    Runs the tests under each PATH, or under every configured testpath
+    when no PATH is given.
+
     \b
     Examples:
+        statatest                       Run all configured testpaths
         statatest tests/                Run all tests
         statatest tests/ -v             Verbose output
         statatest tests/ -c             Enable coverage
         statatest tests/ -c -r lcov     Coverage with LCOV report
+        statatest tests/ -c -r xml      Coverage with Cobertura XML report
         statatest tests/ -j junit.xml   Generate JUnit XML
         statatest tests/ -m unit        Run @marker: unit tests
         statatest tests/ -k panel       Run tests matching 'panel'
+        statatest tests/ -m "unit and not slow"
+                                        Run unit tests that are not slow
+        statatest -n 4                  Run 4 test files at a time
+        statatest tests/ --collect-only --json
+                                        Print the test plan as JSON
+        statatest tests/ -c --cov-context test
+                                        Record which test ran each line
+        statatest coverage who-covers myreg.ado:120
+                                        List the tests that ran a line
+        statatest coverage combine shard-*.stcov -o all.stcov
+                                        Merge the coverage of CI shards
+        statatest coverage diff --base main --fail-under-patch 80
+                                        Check coverage of changed lines
         statatest -i                    Create config template
 
     \b
@@ -177,28 +527,43 @@ def main(
         _create_config_template()
         sys.exit(0)
 
-    if ctx.invoked_subcommand is None and path is None:
-        click.echo(colorize("Usage: statatest <path> [OPTIONS]", Colors.YELLOW))
-        click.echo("Run 'statatest --help' for more information.")
+    if as_json and not collect_only:
+        click.echo(colorize("--json requires --collect-only", Colors.YELLOW))
         sys.exit(1)
 
-    if path is None:
-        return
-
     # Configure logging
     configure_logging(verbose)
 
     # Load configuration
-    config = Config.from_project(Path.cwd())
-    if verbose:
-        config.verbose = True
+    config = _load_config(verbose, workers)
 
-    # Discover tests
-    test_path = Path(path)
-    click.echo(colorize(f"statatest v{__version__}", Colors.BOLD + Colors.BLUE))
-    click.echo(f"Collecting tests from: {test_path}")
+    test_paths = _resolve_test_paths(paths, config)
+    if not test_paths:
+        click.echo(colorize("Usage: statatest <path> [OPTIONS]", Colors.YELLOW))
+        click.echo(
+            "No path given and none of the configured testpaths exist: "
+            + ", ".join(config.testpaths)
+        )
+        click.echo("Run 'statatest --help' for more information.")
+        sys.exit(1)
 
-    tests = discover_tests(test_path, config, marker=marker, keyword=keyword)
+    timings = Timings()
+    start_time = time.perf_counter()
+    with timings.measure("collection"):
+        index = _load_index(cache_clear)
+        tests, conftest_graph = _collect_tests(
+            test_paths, config, marker, keyword, index, as_json
+        )
+
+    if collect_only:
+        _print_collection(
+            tests,
+            index,
+            conftest_graph,
+            time.perf_counter() - start_time,
+            as_json,
+        )
+        sys.exit(0)
 
     if not tests:
         click.echo(colorize("No tests found.", Colors.YELLOW))
@@ -207,10 +572,296 @@ def main(
     click.echo(f"Found {len(tests)} test file(s)\n")
 
     # Run test session and exit with appropriate code
-    failed = _run_test_session(tests, config, coverage, cov_report, junit_xml, verbose)
+    failed = _run_test_session(
+        tests,
+        config,
+        coverage,
+        cov_report,
+        junit_xml,
+        verbose,
+        index,
+        conftest_graph,
+        timings if show_timings else None,
+        cov_context,
+        cov_data,
+    )
     sys.exit(1 if failed > 0 else 0)
 
 
+@main.group("coverage")
+def coverage_group() -> None:
+    """Inspect stored coverage data."""
+
+
+@coverage_group.command("who-covers")
+@click.argument("location")
+def who_covers(location: str) -> None:
+    """List the tests that ran a line, or any line of a file.
+
+    LOCATION is a source file (a path relative to the project root, or its
+    trailing part such as the file name) with an optional :LINE suffix, e.g.
+    myreg.ado:120. Tests are recorded with `statatest -c --cov-context test`.
+    """
+    path, _, line = location.rpartition(":")
+    lineno: int | None = int(line) if path and line.isdigit() else None
+    if lineno is None:
+        path = location
+
+    with ContextDatabase.for_project(Path.cwd()) as db:
+        hits = db.who_covers(path, lineno)
+    if not hits:
+        click.echo(colorize(f"No recorded test covers {location}", Colors.YELLOW))
+        sys.exit(1)
+
+    for line_out in format_context_hits(hits, by_line=lineno is not None):
+        click.echo(line_out)
+
+
+@coverage_group.command("combine")
+@click.argument("data_files", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False),
+    default=DEFAULT_COVERAGE_DATA,
+    show_default=True,
+    help="Combined coverage data file.",
+)
+def combine(data_files: tuple[str, ...], output: str) -> None:
+    """Merge coverage data files, e.g. one per CI shard, into one.
+
+    Line and branch counts are summed. Each DATA_FILE is written by
+    `statatest -c --cov-data DATA_FILE`.
+    """
+    report = _combine_data_files(data_files)
+    write_coverage_data(report, Path(output))
+    click.echo(f"Combined {len(data_files)} coverage data file(s) into: {output}")
+
+
+@coverage_group.command("report")
+@click.argument("data_files", nargs=-1, type=click.Path(exists=True))
+@click.option(
+    "-r",
+    "--cov-report",
+    type=click.Choice(COVERAGE_REPORT_FORMATS),
+    help="Report format; omit to print a summary.",
+)
+def coverage_report(data_files: tuple[str, ...], cov_report: str | None) -> None:
+    """Report coverage from coverage data files.
+
+    Several DATA_FILES are combined first. Without DATA_FILES the data file
+    of the last run is used.
+    """
+    report = _combine_data_files(data_files or _default_data_files())
+    if cov_report:
+        _generate_coverage_report(report, cov_report, Config.from_project(Path.cwd()))
+        return
+    for line_out in format_coverage_summary(report):
+        click.echo(line_out)
+
+
+@coverage_group.command("diff")
+@click.argument("data_files", nargs=-1, type=click.Path(exists=True))
+@click.option(
+    "--base",
+    default="HEAD",
+    show_default=True,
+    help="Coverage data file or git revision to compare with.",
+)
+@click.option(
+    "--fail-under-patch",
+    type=click.FloatRange(0, 100),
+    help="Exit with status 1 if changed lines are less covered (percent).",
+)
+def coverage_diff(
+    data_files: tuple[str, ...], base: str, fail_under_patch: float | None
+) -> None:
+    """Report coverage of the lines changed in the working tree.
+
+    Changed lines come from `git diff` and coverage from DATA_FILES (default:
+    the data file of the last run), so no test is run. --base is either a
+    git revision, to report lines changed since it, or a coverage data file
+    of an earlier run, to compare total coverage with it; lines are then
+    those changed since HEAD.
+    """
+    baseline: CoverageReport | None = None
+    ref = base
+    if Path(base).is_file():
+        baseline = _combine_data_files((base,))
+        ref = "HEAD"
+
+    coverage = _combine_data_files(data_files or _default_data_files())
+    try:
+        patch = patch_coverage(coverage, changed_lines(ref))
+    except CoverageDiffError as e:
+        click.echo(colorize(str(e), Colors.YELLOW))
+        sys.exit(1)
+
+    for line_out in format_patch_coverage(patch, coverage, baseline):
+        click.echo(line_out)
+    if fail_under_patch is not None and patch.coverage_percent < fail_under_patch:
+        msg = f"Patch coverage is below {fail_under_patch:g}%"
+        click.echo(colorize(msg, Colors.RED))
+        sys.exit(1)
+
+
+def _default_data_files() -> tuple[str, ...]:
+    """Return the data file of the last run, exiting with status 1 if none."""
+    if not Path(DEFAULT_COVERAGE_DATA).exists():
+        msg = f"No coverage data found at {DEFAULT_COVERAGE_DATA}"
+        click.echo(colorize(msg, Colors.YELLOW))
+        sys.exit(1)
+    return (DEFAULT_COVERAGE_DATA,)
+
+
+def _combine_data_files(data_files: tuple[str, ...]) -> CoverageReport:
+    """Merge coverage data files, exiting with status 1 on a bad file."""
+    try:
+        return combine_coverage_data(Path(p) for p in data_files)
+    except CoverageDataError as e:
+        click.echo(colorize(str(e), Colors.YELLOW))
+        sys.exit(1)
+
+
+def _collect_tests(
+    test_paths: list[Path],
+    config: Config,
+    marker: str | None,
+    keyword: str | None,
+    index: DiscoveryIndex,
+    as_json: bool,
+) -> tuple[list[TestFile], ConftestGraph]:
+    """Discover tests and check their fixture references.
+
+    Exits with status 1 if a filter expression is invalid or a test uses a
+    fixture that is not defined, so mistakes surface before Stata starts.
+
+    Args:
+        test_paths: Paths to collect tests from.
+        config: Configuration object.
+        marker: Marker expression, if given.
+        keyword: Keyword expression, if given.
+        index: Discovery index (saved after discovery).
+        as_json: Whether JSON output was requested (suppresses the banner).
+
+    Returns:
+        Tuple of (collected tests, session conftest graph).
+    """
+    if not as_json:
+        click.echo(colorize(f"statatest v{__version__}", Colors.BOLD + Colors.BLUE))
+        click.echo(f"Collecting tests from: {', '.join(str(p) for p in test_paths)}")
+
+    try:
+        tests = discover_tests(
+            test_paths, config, marker=marker, keyword=keyword, index=index
+        )
+    except ExpressionError as e:
+        click.echo(colorize(str(e), Colors.YELLOW))
+        sys.exit(1)
+    index.save()
+
+    # Fixtures may still be found on the user's adopath at run time, so
+    # unknown ones are reported but do not stop the session
+    conftest_graph = create_conftest_graph(config)
+    for test in tests:
+        if missing := conftest_graph.missing_fixtures(test):
+            click.echo(
+                colorize(
+                    f"Warning: {test.relative_path}: unknown fixture(s): "
+                    f"{', '.join(missing)} (not in conftest.do, setup_do or "
+                    "a known fixture_*.ado; looked up on the adopath at run time)",
+                    Colors.YELLOW,
+                ),
+                err=as_json,
+            )
+
+    return tests, conftest_graph
+
+
+def _load_config(verbose: bool, workers: int | None) -> Config:
+    """Load project configuration and apply command-line overrides.
+
+    Args:
+        verbose: Whether verbose output was requested.
+        workers: Number of concurrent test files, if given.
+
+    Returns:
+        Config object.
+    """
+    config = Config.from_project(Path.cwd())
+    if verbose:
+        config.verbose = True
+    if workers:
+        config.workers = workers
+    return config
+
+
+def _load_index(cache_clear: bool) -> DiscoveryIndex:
+    """Load the project's discovery index.
+
+    Args:
+        cache_clear: Whether to remove the cached state (discovery index
+            with its timings, source index, instrumented files) first.
+
+    Returns:
+        DiscoveryIndex for the current project.
+    """
+    if cache_clear:
+        cleanup_instrumented_environment(Path.cwd())
+    return DiscoveryIndex.for_project(Path.cwd())
+
+
+def _resolve_test_paths(paths: tuple[str, ...], config: Config) -> list[Path]:
+    """Determine which paths to collect tests from.
+
+    Args:
+        paths: Paths given on the command line.
+        config: Configuration object with testpaths.
+
+    Returns:
+        The command-line paths, or else the configured testpaths that exist,
+        with duplicates and nested paths removed.
+    """
+    if paths:
+        return dedupe_roots([Path(p) for p in paths])
+    configured = [Path(p) for p in config.testpaths]
+    return dedupe_roots([p for p in configured if p.exists()])
+
+
+def _print_collection(
+    tests: list[TestFile],
+    index: DiscoveryIndex,
+    conftest_graph: ConftestGraph,
+    elapsed: float,
+    as_json: bool,
+) -> None:
+    """Print the collected test plan without running Stata.
+
+    Args:
+        tests: Discovered (and filtered) test files.
+        index: Discovery index holding durations of previous runs.
+        conftest_graph: Session conftest graph.
+        elapsed: Seconds spent on discovery so far.
+        as_json: Whether to print JSON instead of text.
+    """
+    start_time = time.perf_counter()
+    collected = [
+        CollectedTest(
+            test=test,
+            conftest_files=conftest_graph.conftest_files(test.path.parent),
+            predicted_duration=index.predicted_duration(test.path),
+        )
+        for test in tests
+    ]
+    elapsed += time.perf_counter() - start_time
+
+    if as_json:
+        click.echo(format_collection_json(collected, elapsed))
+    else:
+        for line in format_collection_text(collected, elapsed):
+            click.echo(line)
+
+
 def _create_config_template() -> None:
     """Create a statatest.toml template in the current directory."""
     template = """[tool.statatest]
@@ -236,31 +887,28 @@ lcov = "coverage.lcov"
 
 
 def _generate_coverage_report(
-    results: list[TestResult],
-    report_format: str,
-    config: Config,
-    line_maps: dict[str, dict[int, int]] | None = None,
+    coverage: CoverageReport, report_format: str, config: Config
 ) -> None:
     """Generate coverage report in the specified format.
 
     Args:
-        results: List of test results with coverage data.
-        report_format: Output format ('lcov' or 'html').
+        coverage: Aggregated coverage.
+        report_format: Output format ('lcov', 'html' or 'xml').
         config: Configuration object.
-        line_maps: Optional mapping of instrumented to original line numbers.
     """
-    # TODO: Use line_maps to map instrumented line numbers back to original
-    _ = line_maps  # Suppress unused warning for now
-
     match report_format.lower():
         case "lcov":
             lcov_path = Path(config.reporting.get("lcov", "coverage.lcov"))
-            generate_lcov(results, lcov_path)
+            write_lcov(coverage, lcov_path)
             click.echo(f"LCOV coverage written to: {lcov_path}")
         case "html":
             html_dir = Path(config.reporting.get("htmlcov", "htmlcov"))
-            generate_html(results, html_dir)
-            click.echo(f"HTML coverage written to: {html_dir}")
+            pages = write_html(coverage, html_dir)
+            click.echo(f"HTML coverage written to: {html_dir} ({pages} pages updated)")
+        case "xml":
+            xml_path = Path(config.reporting.get("xml", DEFAULT_COBERTURA_FILENAME))
+            write_cobertura(coverage, xml_path)
+            click.echo(f"Cobertura XML coverage written to: {xml_path}")
         case _:
             click.echo(
                 colorize(f"Unknown coverage format: {report_format}", Colors.YELLOW)
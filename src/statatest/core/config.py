@@ -12,10 +12,14 @@ from pathlib import Path
 from typing import Any
 
 from statatest.core.constants import (
+    DEFAULT_COVERAGE_GRANULARITY,
+    DEFAULT_COVERAGE_PROBES,
+    DEFAULT_NORECURSE_DIRS,
     DEFAULT_STATA_EXECUTABLE,
     DEFAULT_TEST_FILE_PATTERNS,
     DEFAULT_TEST_PATHS,
     DEFAULT_TIMEOUT_SECONDS,
+    DEFAULT_WORKERS,
 )
 
 
@@ -26,23 +30,43 @@ class Config:
     Attributes:
         testpaths: Directories to search for test files.
         test_files: Glob patterns for test file names.
+        norecursedirs: Glob patterns for directory names skipped by discovery.
         stata_executable: Path or name of Stata executable.
         timeout: Timeout in seconds for each test file.
+        workers: Number of test files executed concurrently.
         verbose: Whether to show verbose output.
         setup_do: Path to a setup.do file to run before each test.
         coverage_source: Directories containing source files for coverage.
         coverage_omit: Patterns for files to exclude from coverage.
-        reporting: Reporting configuration (junit_xml, lcov paths).
+        coverage_probes: How instrumented lines record hits: "log" writes an
+            SMCL marker to the log, "memory" increments a counter that is
+            written to a file once at the end of each test.
+        coverage_granularity: Where probes are placed: "line" (every
+            executable line) or "block" (first line of each basic block).
+        coverage_adaptive: Whether lines covered by earlier runs are
+            instrumented without probes in later runs.
+        coverage_lazy: Whether only the sources the selected tests can reach
+            are instrumented; the others are reported as not loaded. Off by
+            default, since reachability is found statically.
+        reporting: Reporting configuration (junit_xml, lcov, htmlcov, xml paths).
     """
 
     testpaths: list[str] = field(default_factory=list)
     test_files: list[str] = field(default_factory=list)
+    norecursedirs: list[str] = field(
+        default_factory=lambda: list(DEFAULT_NORECURSE_DIRS)
+    )
     stata_executable: str = DEFAULT_STATA_EXECUTABLE
     timeout: int = DEFAULT_TIMEOUT_SECONDS
+    workers: int = DEFAULT_WORKERS
     verbose: bool = False
     setup_do: str | None = None
     coverage_source: list[str] = field(default_factory=list)
     coverage_omit: list[str] = field(default_factory=list)
+    coverage_probes: str = DEFAULT_COVERAGE_PROBES
+    coverage_granularity: str = DEFAULT_COVERAGE_GRANULARITY
+    coverage_adaptive: bool = False
+    coverage_lazy: bool = False
     reporting: dict[str, str] = field(default_factory=dict)
 
     def __post_init__(self) -> None:
@@ -131,8 +155,10 @@ class Config:
         direct_keys = [
             "testpaths",
             "test_files",
+            "norecursedirs",
             "stata_executable",
             "timeout",
+            "workers",
             "verbose",
             "setup_do",
             "reporting",
@@ -147,5 +173,13 @@ class Config:
             settings["coverage_source"] = coverage["source"]
         if "omit" in coverage:
             settings["coverage_omit"] = coverage["omit"]
+        if "probes" in coverage:
+            settings["coverage_probes"] = coverage["probes"]
+        if "granularity" in coverage:
+            settings["coverage_granularity"] = coverage["granularity"]
+        if "adaptive" in coverage:
+            settings["coverage_adaptive"] = coverage["adaptive"]
+        if "lazy" in coverage:
+            settings["coverage_lazy"] = coverage["lazy"]
 
         return settings
@@ -20,6 +20,9 @@ DEFAULT_TIMEOUT_SECONDS: int = 300
 DEFAULT_STATA_EXECUTABLE: str = "stata-mp"
 """Default Stata executable name."""
 
+DEFAULT_WORKERS: int = 1
+"""Default number of test files executed concurrently."""
+
 # =============================================================================
 # Coverage Thresholds
 # =============================================================================
@@ -40,6 +43,95 @@ DEFAULT_TEST_PATHS: tuple[str, ...] = ("tests",)
 DEFAULT_TEST_FILE_PATTERNS: tuple[str, ...] = ("test_*.do",)
 """Default patterns for test file names."""
 
+DEFAULT_NORECURSE_DIRS: tuple[str, ...] = (
+    ".*",
+    "__pycache__",
+    "build",
+    "dist",
+    "node_modules",
+    "venv",
+)
+"""Default glob patterns for directory names that discovery does not enter."""
+
+CONFTEST_FILENAME: str = "conftest.do"
+"""Name of the per-directory file defining shared fixtures and setup."""
+
+# =============================================================================
+# Cache Directory
+# =============================================================================
+
+STATATEST_DIR: str = ".statatest"
+"""Directory (relative to the project root) for statatest's working files."""
+
+DISCOVERY_INDEX_FILENAME: str = "discovery-index.json"
+"""Filename of the persistent test discovery index inside STATATEST_DIR."""
+
+DISCOVERY_INDEX_VERSION: int = 1
+"""Schema version of the discovery index. Bump when TestFile metadata changes."""
+
+SOURCE_INDEX_FILENAME: str = "source-index.json"
+"""Filename of the index of program definitions and calls inside STATATEST_DIR."""
+
+SOURCE_INDEX_VERSION: int = 1
+"""Schema version of the source index."""
+
+COVERAGE_DB_FILENAME: str = "coverage.db"
+"""Filename of the per-test coverage context database inside STATATEST_DIR."""
+
+COVERAGE_DB_VERSION: int = 1
+"""Schema version of the coverage context database."""
+
+COVERAGE_CONTEXTS: tuple[str, ...] = ("test",)
+"""Values of --cov-context: what a coverage context is."""
+
+INSTRUMENTED_DIRNAME: str = "instrumented"
+"""Directory inside STATATEST_DIR holding instrumented source files."""
+
+RUNS_DIRNAME: str = "runs"
+"""Directory inside STATATEST_DIR holding the instrumentation root of each
+running coverage session."""
+
+INSTRUMENT_LOCK_FILENAME: str = "instrumented.lock"
+"""Lock file inside STATATEST_DIR guarding the shared instrumented files."""
+
+INSTRUMENT_LOCK_TIMEOUT: float = 300.0
+"""Seconds to wait for another run to finish instrumenting."""
+
+INSTRUMENT_MANIFEST_FILENAME: str = "manifest.json"
+"""Filename of the instrumentation cache manifest inside INSTRUMENTED_DIRNAME."""
+
+CACHE_ENTRIES: tuple[str, ...] = (
+    INSTRUMENTED_DIRNAME,
+    DISCOVERY_INDEX_FILENAME,
+    SOURCE_INDEX_FILENAME,
+)
+"""Entries of STATATEST_DIR that --cache-clear removes. Coverage data files
+(coverage.stcov, coverage.db) are results, not cache, and are kept."""
+
+INSTRUMENTED_DO_DIRNAME: str = "do"
+"""Directory inside INSTRUMENTED_DIRNAME holding instrumented .do files. Each
+copy is stored at its source's absolute path (without the leading slash or
+drive colon), so that a do or run call can find it from any directory."""
+
+DEFAULT_INSTRUMENT_PATTERNS: tuple[str, ...] = ("*.ado", "*.do")
+"""Glob patterns for source files instrumented for coverage. Test files and
+conftest.do files are never instrumented."""
+
+DO_REDIRECT_PROGRAM: str = "_stt_do"
+"""Program that do and run statements are routed through in instrumented code
+and tests, so that instrumented copies of .do files run instead of the
+originals."""
+
+DO_REDIRECT_GLOBAL: str = "STATATEST_DO_DIR"
+"""Global macro holding the directory of instrumented .do files."""
+
+INSTRUMENT_PARALLEL_MIN_FILES: int = 32
+"""Minimum number of files to instrument before a process pool is used."""
+
+INSTRUMENTER_VERSION: int = 6
+"""Version of the instrumentation output. Bump whenever instrument_file changes
+what it writes, so that cached instrumented files are rebuilt."""
+
 # =============================================================================
 # Output Markers (for parsing test results)
 # =============================================================================
@@ -60,22 +152,76 @@ ASSERTION_FAILED_SUFFIX: str = "_END_"
 # Coverage Markers (for SMCL log parsing)
 # =============================================================================
 
-COVERAGE_MARKER_FORMAT: str = "{{* COV:{filename}:{lineno} }}"
-"""SMCL comment format for coverage markers. Format: {* COV:filename:lineno }."""
+COVERAGE_MARKER_FORMAT: str = "{{* COV:{file_id}:{lineno} }}"
+"""SMCL comment format for coverage markers. Format: {* COV:file_id:lineno }."""
+
+COVERAGE_PROBE_MODES: tuple[str, ...] = ("log", "memory")
+"""Coverage probe modes: SMCL markers written to the log, or in-memory counters."""
+
+DEFAULT_COVERAGE_PROBES: str = "log"
+"""Default coverage probe mode."""
+
+COVERAGE_GRANULARITIES: tuple[str, ...] = ("line", "block")
+"""Probe placement: before every executable line, or once per basic block."""
+
+DEFAULT_COVERAGE_GRANULARITY: str = "line"
+"""Default probe placement."""
+
+COVERAGE_COUNTER_PREFIX: str = "_stc_"
+"""Prefix of the global macros counting line executions in memory probe mode.
+Counters are named {prefix}{file_id}_{lineno}."""
+
+BRANCH_PROBE_SUFFIX: str = "b"
+"""Suffix of the file id in branch probes. Branch probes are keyed by the line
+of their branch point, e.g. {* COV:3b:12 } or _stc_3b_12, so that they are
+collected like line probes but kept apart from them."""
+
+BRANCH_FLAG_PREFIX: str = "_stb_"
+"""Prefix of the local macros marking that a loop body ran. Flags are named
+{prefix}{lineno}."""
 
 # =============================================================================
 # Report Defaults
 # =============================================================================
 
+COVERAGE_REPORT_FORMATS: tuple[str, ...] = ("lcov", "html", "xml")
+"""Values of --cov-report. "xml" is Cobertura XML."""
+
 DEFAULT_LCOV_FILENAME: str = "coverage.lcov"
 """Default LCOV output filename."""
 
+DEFAULT_COBERTURA_FILENAME: str = "coverage.xml"
+"""Default Cobertura XML output filename."""
+
 DEFAULT_HTML_COV_DIR: str = "htmlcov"
 """Default HTML coverage output directory."""
 
+HTML_REPORT_VERSION: int = 1
+"""Version of the HTML coverage pages. Bump whenever their markup changes, so
+that pages kept from a previous report are rendered again."""
+
+HTML_STATUS_FILENAME: str = "status.json"
+"""File in the HTML coverage directory recording what each page was rendered
+from."""
+
+HTML_PARALLEL_MIN_FILES: int = 32
+"""Minimum number of pages to render before a process pool is used."""
+
 DEFAULT_JUNIT_FILENAME: str = "junit.xml"
 """Default JUnit XML output filename."""
 
+DEFAULT_COVERAGE_DATA: str = ".statatest/coverage.stcov"
+"""Default coverage data file written by runs with --coverage."""
+
+COVERAGE_DATA_FORMAT: str = "statatest-coverage"
+"""Format name in the header of coverage data files."""
+
+COVERAGE_DATA_VERSION: int = 1
+"""Version of the coverage data file format."""
+
+COLLECTION_FORMAT_VERSION: int = 1
+"""Schema version of the `--collect-only --json` output."""
+
 # =============================================================================
 # Truncation Limits
 # =============================================================================
@@ -106,6 +252,9 @@ PATTERN_ASSERTION_FAILED: str = r"_STATATEST_FAIL_:(\w+)_:(.+?)_END_"
 PATTERN_COVERAGE_MARKER: str = r"\{\*\s*COV:([^:]+):(\d+)\s*\}"
 """Regex pattern for parsing SMCL coverage markers."""
 
+PATTERN_COVERAGE_COUNTER: str = r"^_stc_(\d+b?)_(\d+)[ \t]+(\d+)"
+"""Regex pattern for parsing flushed in-memory coverage counters."""
+
 # Test discovery patterns
 PATTERN_MARKER: str = r"//\s*@marker:\s*(\w+)"
 """Regex pattern for parsing @marker: annotations."""
@@ -113,6 +262,15 @@ PATTERN_MARKER: str = r"//\s*@marker:\s*(\w+)"
 PATTERN_PROGRAM: str = r"^\s*program\s+(?:define\s+)?(\w+)"
 """Regex pattern for parsing Stata program definitions."""
 
+PATTERN_USES_FIXTURE: str = r"//\s*@uses_fixture:\s*(\w+(?:\s*,\s*\w+)*)"
+"""Regex pattern for parsing @uses_fixture: annotations (comma-separated)."""
+
+PATTERN_USE_FIXTURE_CALL: str = r"use_fixture\s+(\w+)"
+"""Regex pattern for parsing use_fixture calls."""
+
+PATTERN_FIXTURE_PROGRAM: str = r"^\s*program\s+(?:define\s+)?fixture_(\w+)"
+"""Regex pattern for parsing fixture_* program definitions."""
+
 # =============================================================================
 # Instrumentation Skip Patterns
 # =============================================================================
@@ -123,20 +281,94 @@ INSTRUMENT_SKIP_PATTERNS: tuple[str, ...] = (
     r"^\s*//",  # Comment lines
     r"^\s*/\*",  # Block comment start
     r"^\s*\*/",  # Block comment end
-    r"^\s*program\s+define\s+",  # Program definition
+    # Program definition, e.g. `program define myreg, eclass` or `prog myreg`
+    r"^\s*pr(?:o|og|ogr|ogra|ogram)?\s+(?:de(?:f|fi|fin|fine)?\s+)?\w+\s*(?:,.*)?$",
     r"^\s*program\s+drop\s+",  # Program drop
     r"^\s*end\s*$",  # Program end
     r"^\s*version\s+",  # Version statement
     r"^\s*syntax\s+",  # Syntax statement
     r"^\s*args\s+",  # Args statement
     r"^\s*marksample\s+",  # Marksample
-    r"^\s*mata\s*:",  # Mata start
-    r"^\s*mata\s*$",  # Mata start
+    r"^\s*mata\s*:?\s*(?://.*)?$",  # Mata block start
     r"^\s*end\s+mata",  # Mata end
     r"^\s*\{",  # Block start
     r"^\s*\}",  # Block end
+    r"^\s*else\b",  # Else branch (must directly follow its if block)
 )
 """Lines matching these patterns should NOT be instrumented for coverage."""
 
 INSTRUMENT_SKIP_KEYWORDS: frozenset[str] = frozenset({"}", "else", "else {"})
 """Keywords that should not be instrumented (after stripping)."""
+
+PATTERN_BLOCK_BOUNDARY: str = r"^\s*(?:\{|\}|else\b|program\b|end\b|mata\b)"
+"""Non-executable lines that control flow can jump to or from. The next
+executable line starts a new basic block."""
+
+PATTERN_BLOCK_EXIT: str = (
+    r"^\s*(?:(?:qui|quietly|noi|noisily)\s*:?\s+)?"
+    r"(?:cap|capt|captu|captur|capture|exit|error|continue|break)\b"
+)
+"""Statements after which the next statement may not run, or may run after a
+failure: the current basic block ends with them."""
+
+PATTERN_BLOCK_OPEN: str = r"\{\s*(?://.*)?$"
+"""Line ending in an opening brace (if, else, loops, capture, quietly, ...):
+the current basic block ends with it."""
+
+# Branch patterns (matched against the first line of a statement)
+PATTERN_BRANCH_IF: str = r"^\s*if\b"
+"""If statement; with a brace block, a branch point."""
+
+PATTERN_BRANCH_ELSE: str = r"^\s*\}?\s*else\b(\s+if\b)?"
+"""Else or else if continuing an if chain, possibly after the closing brace of
+the previous block. Group 1 is set for else if."""
+
+PATTERN_BRANCH_LOOP: str = (
+    r"^\s*(?:(?:qui|quietly|noi|noisily)\s*:?\s+)?"
+    r"(?:foreach|forv(?:a|al|alu|alue|alues)?|while)\b"
+)
+"""Loop statement; a branch point between running the body and skipping it."""
+
+PATTERN_BRANCH_CAPTURE: str = (
+    r"^\s*(?:(?:qui|quietly|noi|noisily)\s*:?\s+)?cap(?:t|tu|tur|ture)?\b"
+)
+"""Capture statement; a branch point between success and failure."""
+
+PATTERN_DELIMIT: str = r"#d(?:e|el|eli|elim|elimi|elimit)?\b\s*(;)?"
+"""#delimit directive, matched where a statement starts. Group 1 is set when
+statements end at semicolons from then on, and empty for #delimit cr."""
+
+PATTERN_QUIETLY_BLOCK: str = (
+    r"^(?:(?:cap|capt|captu|captur|capture)\s*:?\s+)?qui(?:e|et|etl|etly)?\s*:?\s*\{"
+)
+"""Start of a quietly block, in which display output (and log probes) would
+be suppressed."""
+
+PATTERN_NOISILY_BLOCK: str = (
+    r"^(?:(?:cap|capt|captu|captur|capture)\s*:?\s+)?noi(?:s|si|sil|sily)?\s*:?\s*\{"
+)
+"""Start of a noisily block, which shows output again inside a quietly
+block."""
+
+PATTERN_MATA_BLOCK: str = r"^\s*mata\s*:?\s*(?://.*)?$"
+"""Start of a Mata block, which runs until the next end statement."""
+
+PATTERN_MATA_DECLARATION: str = (
+    r"^\s*(?:(?:transmorphic|numeric|real|complex|string|struct|class|void"
+    r"|function|external|matrix|vector|rowvector|colvector|scalar|static|final"
+    r"|virtual|local|version|pragma)\s+[\w*&]|pointer\s*[(\s]"
+    r"|(?:public|protected|private)\s*:|\w+\s*:\s*$)"
+)
+"""Mata lines that are not executable: declarations (of variables, functions,
+structures and classes), compiler directives and labels."""
+
+PATTERN_MATA_CONTROL: str = r"^(?:else\b\s*(?:if\s*\()?|(?:if|for|while)\s*\(|do\b)"
+"""Mata control statement (matched after any closing brace). Without a brace
+or a statement after its condition, the next statement is its body."""
+
+PATTERN_DO_CALL: str = (
+    r"^(\s*(?:(?:cap|capt|captu|captur|capture|qui|quie|quiet|quietl|quietly"
+    r"|n|no|noi|nois|noisi|noisil|noisily)\s*:?\s+)*)(do|run)(?=\s)"
+)
+"""Stata do or run statement, possibly after capture, quietly or noisily
+(group 1). Group 2 is the command."""
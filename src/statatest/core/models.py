@@ -9,6 +9,7 @@ This module defines the core data structures used throughout statatest:
 
 from __future__ import annotations
 
+from collections.abc import Mapping
 from dataclasses import dataclass, field
 from pathlib import Path
 
@@ -21,11 +22,13 @@ class TestFile:
         path: Absolute path to the test file.
         markers: List of markers extracted from the file (e.g., "unit", "slow").
         programs: List of test program names defined in the file.
+        fixtures: List of fixture names the file requests (e.g., "sample_panel").
     """
 
     path: Path
     markers: list[str] = field(default_factory=list)
     programs: list[str] = field(default_factory=list)
+    fixtures: list[str] = field(default_factory=list)
 
     @property
     def name(self) -> str:
@@ -59,7 +62,8 @@ class TestResult:
         error_message: Human-readable error message if failed.
         assertions_passed: Number of passed assertions.
         assertions_failed: Number of failed assertions.
-        coverage_hits: Dictionary mapping source files to hit line numbers.
+        coverage_hits: Dictionary mapping coverage file ids to execution
+            counts per line number.
     """
 
     test_file: str
@@ -71,7 +75,7 @@ class TestResult:
     error_message: str = ""
     assertions_passed: int = 0
     assertions_failed: int = 0
-    coverage_hits: dict[str, set[int]] = field(default_factory=dict)
+    coverage_hits: Mapping[str, Mapping[int, int]] = field(default_factory=dict)
 
 
 @dataclass
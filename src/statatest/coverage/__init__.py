@@ -2,33 +2,118 @@
 
 This module provides coverage functionality:
 - instrument: Source code instrumentation with SMCL markers
-- models: FileCoverage and CoverageReport data classes
+- lexer: Split Stata code into statements for instrumentation
+- reachability: Sources reachable from the selected tests (lazy
+  instrumentation)
+- cache: Incremental cache of instrumented files between runs
+- contexts: Per-test line coverage in an SQLite database
+- data: Coverage data files, for reporting later and combining shards
+- diff: Coverage of lines changed since a git revision
+- models: InstrumentedFile, BranchPoint, FileCoverage and CoverageReport
+  data classes
 - aggregator: Aggregate coverage from test results
 - reporter: Generate LCOV and HTML reports
+- html_report: HTML index and annotated source pages
+- cobertura: Cobertura XML report
+- workspace: Instrumentation lock and per-run instrumentation roots
 """
 
-from statatest.coverage.aggregator import aggregate_coverage
+from statatest.coverage.aggregator import aggregate_coverage, result_line_counts
+from statatest.coverage.cache import InstrumentationCache
+from statatest.coverage.cobertura import write_cobertura
+from statatest.coverage.contexts import ContextDatabase, ContextHit
+from statatest.coverage.data import (
+    CoverageDataError,
+    combine_coverage_data,
+    read_coverage_data,
+    write_coverage_data,
+)
+from statatest.coverage.diff import (
+    CoverageDiffError,
+    PatchCoverage,
+    changed_lines,
+    parse_diff,
+    patch_coverage,
+)
+from statatest.coverage.html_report import write_html
 from statatest.coverage.instrument import (
     cleanup_instrumented_environment,
+    coverage_probe,
+    executable_lines,
     get_total_lines,
     instrument_directory,
     instrument_file,
+    mata_coverage_probe,
+    mata_statements,
+    record_proven_lines,
+    redirect_do_calls,
     setup_instrumented_environment,
     should_instrument_line,
 )
-from statatest.coverage.models import CoverageReport, FileCoverage
-from statatest.coverage.reporter import generate_html, generate_lcov
+from statatest.coverage.lexer import LexedSource, Statement, lex
+from statatest.coverage.models import (
+    BranchPoint,
+    CoverageReport,
+    FileCoverage,
+    FileTable,
+    InstrumentedFile,
+)
+from statatest.coverage.reachability import (
+    SourceIndex,
+    reachable_sources,
+    unreachable_sources,
+)
+from statatest.coverage.reporter import generate_html, generate_lcov, write_lcov
+from statatest.coverage.workspace import (
+    InstrumentationLockError,
+    RunRoot,
+    instrumentation_lock,
+)
 
 __all__ = [
+    "BranchPoint",
+    "ContextDatabase",
+    "ContextHit",
+    "CoverageDataError",
+    "CoverageDiffError",
     "CoverageReport",
     "FileCoverage",
+    "FileTable",
+    "InstrumentationCache",
+    "InstrumentationLockError",
+    "InstrumentedFile",
+    "LexedSource",
+    "PatchCoverage",
+    "RunRoot",
+    "SourceIndex",
+    "Statement",
     "aggregate_coverage",
+    "changed_lines",
     "cleanup_instrumented_environment",
+    "combine_coverage_data",
+    "coverage_probe",
+    "executable_lines",
     "generate_html",
     "generate_lcov",
     "get_total_lines",
     "instrument_directory",
     "instrument_file",
+    "instrumentation_lock",
+    "lex",
+    "mata_coverage_probe",
+    "mata_statements",
+    "parse_diff",
+    "patch_coverage",
+    "reachable_sources",
+    "read_coverage_data",
+    "record_proven_lines",
+    "redirect_do_calls",
+    "result_line_counts",
     "setup_instrumented_environment",
     "should_instrument_line",
+    "unreachable_sources",
+    "write_cobertura",
+    "write_coverage_data",
+    "write_html",
+    "write_lcov",
 ]
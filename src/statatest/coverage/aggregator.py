@@ -6,27 +6,118 @@ from multiple test results into a single report.
 
 from __future__ import annotations
 
+from collections.abc import Mapping
+
+from statatest.core.constants import BRANCH_PROBE_SUFFIX
 from statatest.core.models import TestResult
-from statatest.coverage.models import CoverageReport
+from statatest.coverage.models import CoverageReport, FileTable, InstrumentedFile
 
 
-def aggregate_coverage(results: list[TestResult]) -> CoverageReport:
+def aggregate_coverage(
+    results: list[TestResult],
+    files: FileTable | None = None,
+    include_proven: bool = True,
+) -> CoverageReport:
     """Aggregate coverage data from multiple test results.
 
     Combines coverage hits from all test results into a single
-    CoverageReport that tracks which lines were executed.
+    CoverageReport that tracks which lines were executed and how often, and
+    which branch outcomes were taken.
 
     Args:
         results: List of TestResult objects with coverage_hits data.
+        files: Instrumented files by coverage file id. Every file is
+            reported with its executable lines and branch points, including
+            files that no test loaded (at 0%). Hits recorded under a known
+            file id are reported under the file's source path (block probe
+            hits are expanded to the lines of the block, and branch outcomes
+            are derived from line and branch probe hits); other keys are
+            reported as they are.
+        include_proven: Whether lines that were instrumented without a
+            probe because earlier runs covered them (adaptive mode) are
+            reported with their recorded counts.
 
     Returns:
         CoverageReport with aggregated coverage data.
     """
     report = CoverageReport()
+    by_key = {str(file_id): f for file_id, f in (files or {}).items()}
+    for known in by_key.values():
+        report.set_total_lines(known.path, set(known.executable_lines))
+        if known.branches:
+            report.set_branch_points(
+                known.path, {p.line: p.outcomes for p in known.branches}
+            )
+        if include_proven:
+            for lineno, count in known.proven.items():
+                report.add_hit(known.path, lineno, count)
 
     for result in results:
-        for filename, lines in result.coverage_hits.items():
-            for lineno in lines:
-                report.add_hit(filename, lineno)
+        hits = result.coverage_hits
+        for key, probe_counts in hits.items():
+            if key.endswith(BRANCH_PROBE_SUFFIX) and key[:-1] in by_key:
+                continue  # added with the file's line hits
+            instrumented = by_key.get(key)
+            if instrumented is None:
+                for lineno, count in probe_counts.items():
+                    report.add_hit(key, lineno, count)
+                continue
+
+            branch_probes = hits.get(key + BRANCH_PROBE_SUFFIX, {})
+            _add_file_hits(report, instrumented, probe_counts, branch_probes)
 
     return report
+
+
+def result_line_counts(
+    result: TestResult, by_key: Mapping[str, InstrumentedFile]
+) -> dict[str, dict[int, int]]:
+    """Return the line execution counts of one test, by source path.
+
+    Unlike aggregate_coverage, only the files the test's hits name are
+    looked at, so the cost does not grow with the size of the file table.
+    Lines that ran without a probe (adaptive mode) are not included.
+
+    Args:
+        result: Test result with coverage hits.
+        by_key: Instrumented files by coverage file id (as a string).
+
+    Returns:
+        Execution counts keyed by line, by source path (or by hit key for
+        files that are not in by_key).
+    """
+    counts: dict[str, dict[int, int]] = {}
+    for key, probe_counts in result.coverage_hits.items():
+        if key.endswith(BRANCH_PROBE_SUFFIX) and key[:-1] in by_key:
+            continue
+        instrumented = by_key.get(key)
+        if instrumented is None:
+            path, line_counts = key, probe_counts
+        else:
+            path, line_counts = (
+                instrumented.path,
+                instrumented.line_counts(probe_counts),
+            )
+        if not line_counts:
+            continue
+        merged = counts.setdefault(path, {})
+        for lineno, count in line_counts.items():
+            merged[lineno] = merged.get(lineno, 0) + count
+    return counts
+
+
+def _add_file_hits(
+    report: CoverageReport,
+    instrumented: InstrumentedFile,
+    probe_counts: Mapping[int, int],
+    branch_probes: Mapping[int, int],
+) -> None:
+    """Add one test's line and branch probe hits of an instrumented file."""
+    filename = instrumented.path
+    counts = instrumented.line_counts(probe_counts)
+    for lineno, count in counts.items():
+        report.add_hit(filename, lineno, count)
+    if instrumented.branches:
+        outcomes = instrumented.branch_counts(counts, branch_probes)
+        for lineno, taken in outcomes.items():
+            report.add_branch_hits(filename, lineno, taken)
@@ -0,0 +1,328 @@
+"""Incremental instrumentation cache.
+
+Instrumented files and their line maps are kept in .statatest/instrumented
+between coverage runs. A manifest records, for each instrumented file, the
+source it was built from, the source's SHA-256, the file id used in its
+coverage markers, its branch points, the instrumenter version and the
+instrumentation options
+(e.g. the probe mode), so that only sources that changed, were added or were
+removed are processed again.
+
+In adaptive mode, each record also keeps the lines that earlier runs saw run
+("proven" lines, with their counts) and the lines its instrumented file was
+built without probes for. A file whose proven lines have grown is built again
+without probes on them; when any source changes, all proven lines are
+forgotten and every file gets its full set of probes back.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+from collections.abc import Iterable, Mapping
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+from statatest.core.constants import (
+    INSTRUMENT_MANIFEST_FILENAME,
+    INSTRUMENTER_VERSION,
+)
+from statatest.core.logging import get_logger
+from statatest.coverage.models import BranchPoint, InstrumentedFile
+
+logger = get_logger(__name__)
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    """Manifest record for one instrumented file.
+
+    Attributes:
+        source: Absolute path of the original source file.
+        file_id: Numeric id written in the file's coverage markers.
+        sha256: Hex digest of the source content when it was instrumented.
+        mtime_ns: Source modification time (nanoseconds) when last checked.
+        size: Source size in bytes when last checked.
+        line_map: Mapping of instrumented line numbers to original lines.
+        block_leaders: First line of each basic block (block granularity).
+        branches: Branch points of the source.
+        proven: Execution counts of lines recorded as run (adaptive mode).
+        unprobed: Lines the instrumented file has no probe for.
+    """
+
+    source: str
+    file_id: int
+    sha256: str
+    mtime_ns: int
+    size: int
+    line_map: dict[int, int] = field(default_factory=dict)
+    block_leaders: list[int] = field(default_factory=list)
+    branches: list[BranchPoint] = field(default_factory=list)
+    proven: dict[int, int] = field(default_factory=dict)
+    unprobed: list[int] = field(default_factory=list)
+
+    @property
+    def outdated(self) -> bool:
+        """Whether lines were proven since the file was instrumented."""
+        return self.unprobed != sorted(self.proven)
+
+
+@dataclass
+class InstrumentationCache:
+    """Manifest of the instrumented files in a directory.
+
+    Attributes:
+        directory: Directory holding the instrumented files and manifest.
+        options: Instrumentation options the files were built with.
+        entries: Mapping of instrumented file paths, relative to directory
+            (POSIX style), to manifest records.
+    """
+
+    directory: Path
+    options: dict[str, str] = field(default_factory=dict)
+    entries: dict[str, CacheEntry] = field(default_factory=dict)
+    _dirty: bool = field(default=False, repr=False)
+
+    @classmethod
+    def load(
+        cls, directory: Path, options: dict[str, str] | None = None
+    ) -> InstrumentationCache:
+        """Load the manifest of an instrumented directory.
+
+        If the manifest is missing, unreadable, or was written by another
+        instrumenter version or with other options, the directory's contents
+        cannot be trusted and the directory is emptied.
+
+        Args:
+            directory: Directory holding instrumented files.
+            options: Instrumentation options for this run.
+
+        Returns:
+            InstrumentationCache (empty if the directory was reset).
+        """
+        cache = cls(directory=directory, options=dict(options or {}))
+        manifest = directory / INSTRUMENT_MANIFEST_FILENAME
+        try:
+            data = json.loads(manifest.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = None
+
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != INSTRUMENTER_VERSION
+            or data.get("options", {}) != cache.options
+        ):
+            if directory.exists():
+                logger.debug("Discarding instrumented files in %s", directory)
+                shutil.rmtree(directory)
+            return cache
+
+        for name, raw in data.get("files", {}).items():
+            with contextlib.suppress(KeyError, TypeError, ValueError):
+                cache.entries[name] = CacheEntry(
+                    source=raw["source"],
+                    file_id=raw["file_id"],
+                    sha256=raw["sha256"],
+                    mtime_ns=raw["mtime_ns"],
+                    size=raw["size"],
+                    line_map={int(k): v for k, v in raw["line_map"].items()},
+                    block_leaders=raw.get("block_leaders", []),
+                    branches=[BranchPoint(**b) for b in raw.get("branches", [])],
+                    proven={int(k): v for k, v in raw.get("proven", {}).items()},
+                    unprobed=raw.get("unprobed", []),
+                )
+        return cache
+
+    def file_id(self, source_path: Path, dest_path: Path) -> int | None:
+        """Return the file id previously assigned to a source.
+
+        Reusing ids keeps cached instrumented files valid.
+
+        Args:
+            source_path: Path to the original source file.
+            dest_path: Path of the instrumented file inside the directory.
+
+        Returns:
+            The cached file id, or None if the source was not instrumented
+            into dest_path before.
+        """
+        entry = self.entries.get(self._entry_key(dest_path))
+        if entry is None or entry.source != _source_key(source_path):
+            return None
+        return entry.file_id
+
+    def lookup(self, source_path: Path, dest_path: Path) -> CacheEntry | None:
+        """Return the cache entry if the instrumented file is up to date.
+
+        A source whose mtime and size are unchanged is not read; otherwise
+        its content hash decides whether the cached copy is still valid.
+
+        Args:
+            source_path: Path to the original source file.
+            dest_path: Path of the instrumented file inside the directory.
+
+        Returns:
+            The entry (with line map, block leaders and branch points), or
+            None if the file must be instrumented (again).
+        """
+        entry = self.entries.get(self._entry_key(dest_path))
+        if entry is None or entry.source != _source_key(source_path):
+            return None
+        if not dest_path.exists():
+            return None
+
+        stat = source_path.stat()
+        if entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            return entry
+        if hash_file(source_path) != entry.sha256:
+            return None
+        entry.mtime_ns, entry.size = stat.st_mtime_ns, stat.st_size
+        self._dirty = True
+        return entry
+
+    def store(
+        self,
+        source_path: Path,
+        dest_path: Path,
+        file_id: int,
+        line_map: dict[int, int],
+        sha256: str,
+        block_leaders: list[int] | None = None,
+        branches: list[BranchPoint] | None = None,
+        proven: dict[int, int] | None = None,
+    ) -> None:
+        """Record a freshly instrumented file.
+
+        Args:
+            source_path: Path to the original source file.
+            dest_path: Path of the instrumented file inside the directory.
+            file_id: Numeric id written in the file's coverage markers.
+            line_map: Mapping of instrumented to original line numbers.
+            sha256: Hex digest of the source content that was instrumented.
+            block_leaders: First line of each basic block, if any.
+            branches: Branch points of the source.
+            proven: Proven lines the file was instrumented without probes
+                for, with their counts.
+        """
+        stat = source_path.stat()
+        self.entries[self._entry_key(dest_path)] = CacheEntry(
+            source=_source_key(source_path),
+            file_id=file_id,
+            sha256=sha256,
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            line_map=line_map,
+            block_leaders=block_leaders or [],
+            branches=branches or [],
+            proven=dict(proven or {}),
+            unprobed=sorted(proven or ()),
+        )
+        self._dirty = True
+
+    def prove(self, instrumented: InstrumentedFile, counts: Mapping[int, int]) -> int:
+        """Record lines of an instrumented file as proven (run at least once).
+
+        Lines already proven keep their first recorded count. Nothing is
+        recorded if the file was instrumented again since the counts were
+        collected, e.g. by a concurrent run.
+
+        Args:
+            instrumented: The instrumented file the counts were collected
+                with.
+            counts: Execution counts of the lines that ran.
+
+        Returns:
+            Number of newly proven lines.
+        """
+        entry = next(
+            (e for e in self.entries.values() if e.file_id == instrumented.file_id),
+            None,
+        )
+        if entry is None or entry.line_map != instrumented.line_map:
+            return 0
+        new = {lineno: n for lineno, n in counts.items() if lineno not in entry.proven}
+        if new:
+            entry.proven.update(new)
+            self._dirty = True
+        return len(new)
+
+    def forget_proven(self) -> None:
+        """Forget all proven lines, e.g. after a source changed."""
+        for entry in self.entries.values():
+            if entry.proven:
+                entry.proven = {}
+                self._dirty = True
+
+    def prune(self, keep: Iterable[Path]) -> None:
+        """Remove instrumented files whose sources are no longer instrumented.
+
+        Args:
+            keep: Instrumented files produced by this run.
+        """
+        kept = {self._entry_key(path) for path in keep}
+        for name in [n for n in self.entries if n not in kept]:
+            with contextlib.suppress(FileNotFoundError):
+                (self.directory / name).unlink()
+            del self.entries[name]
+            self._dirty = True
+
+    def _entry_key(self, dest_path: Path) -> str:
+        """Return the manifest key of an instrumented file."""
+        try:
+            return dest_path.relative_to(self.directory).as_posix()
+        except ValueError:
+            return dest_path.name
+
+    def save(self) -> None:
+        """Write the manifest if it changed."""
+        if not self._dirty:
+            return
+
+        data: dict[str, Any] = {
+            "version": INSTRUMENTER_VERSION,
+            "options": self.options,
+            "files": {
+                name: {
+                    "source": entry.source,
+                    "file_id": entry.file_id,
+                    "sha256": entry.sha256,
+                    "mtime_ns": entry.mtime_ns,
+                    "size": entry.size,
+                    "line_map": entry.line_map,
+                    "block_leaders": entry.block_leaders,
+                    "branches": [asdict(point) for point in entry.branches],
+                    "proven": entry.proven,
+                    "unprobed": entry.unprobed,
+                }
+                for name, entry in self.entries.items()
+            },
+        }
+        manifest = self.directory / INSTRUMENT_MANIFEST_FILENAME
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            manifest.write_text(json.dumps(data, separators=(",", ":")), "utf-8")
+        except OSError as e:
+            logger.debug("Could not write instrumentation manifest: %s", e)
+            return
+        self._dirty = False
+
+
+def hash_file(path: Path) -> str:
+    """Return the SHA-256 hex digest of a file's content.
+
+    Args:
+        path: Path to the file.
+
+    Returns:
+        Hex digest string.
+    """
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _source_key(path: Path) -> str:
+    """Return the manifest key for a source path."""
+    return os.path.abspath(path)  # noqa: PTH100
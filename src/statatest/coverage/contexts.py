@@ -0,0 +1,251 @@
+"""Per-test coverage contexts.
+
+aggregate_coverage merges the hits of all tests, so reports cannot say which
+test ran a line. With --cov-context test, each test's line counts are also
+stored in an SQLite database under .statatest, with one row per
+(test, file, line):
+
+    line_hit(context_id, file_id, lineno, count)
+
+Test names and file paths are stored once and referenced by integer ids. The
+primary key keeps each test's rows together, so that re-recording a test
+replaces a contiguous range and a test's rows, written in key order, are
+appended rather than scattered; a second index on (file_id, lineno) answers
+"which tests cover myreg.ado:120?" without a scan.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from collections.abc import Iterator, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Self
+
+from statatest.core.constants import (
+    COVERAGE_DB_FILENAME,
+    COVERAGE_DB_VERSION,
+    STATATEST_DIR,
+)
+from statatest.core.logging import get_logger
+from statatest.core.models import TestResult
+from statatest.coverage.aggregator import result_line_counts
+from statatest.coverage.models import FileTable
+
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS context (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS line_hit (
+    context_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    lineno INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (context_id, file_id, lineno)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS line_hit_by_line ON line_hit (file_id, lineno);
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class ContextHit:
+    """Execution count of one line in one context.
+
+    Attributes:
+        context: Context name (the test file).
+        path: Source path relative to the project root (POSIX style).
+        lineno: Line number.
+        count: Number of times the line ran in the context.
+    """
+
+    context: str
+    path: str
+    lineno: int
+    count: int
+
+
+@dataclass
+class ContextDatabase:
+    """Line coverage per context, stored in SQLite.
+
+    Attributes:
+        path: Location of the database file.
+    """
+
+    path: Path
+    _conn: sqlite3.Connection = field(repr=False)
+    _file_ids: dict[str, int] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def for_project(cls, project_root: Path) -> ContextDatabase:
+        """Open the database stored under a project's .statatest directory.
+
+        Args:
+            project_root: Root directory of the project.
+
+        Returns:
+            ContextDatabase bound to <project_root>/.statatest/coverage.db.
+        """
+        return cls.open(project_root / STATATEST_DIR / COVERAGE_DB_FILENAME)
+
+    @classmethod
+    def open(cls, path: Path) -> ContextDatabase:
+        """Open (or create) a context database.
+
+        A database written with another schema version is discarded.
+
+        Args:
+            path: Path to the database file.
+
+        Returns:
+            ContextDatabase ready for reading and writing.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, COVERAGE_DB_VERSION):
+            logger.debug("Discarding coverage database with version %s", version)
+            conn.close()
+            path.unlink()
+            conn = sqlite3.connect(path)
+
+        # The database is derived data: trade durability for write speed
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(_SCHEMA)
+        conn.execute(f"PRAGMA user_version = {COVERAGE_DB_VERSION}")
+        file_ids = dict(conn.execute("SELECT path, id FROM file"))
+        return cls(path=path, _conn=conn, _file_ids=file_ids)
+
+    def __enter__(self) -> Self:
+        """Return the database for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close the database."""
+        self.close()
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._conn.close()
+
+    def record(self, context: str, counts: Mapping[str, Mapping[int, int]]) -> int:
+        """Store the line counts of one context, replacing earlier ones.
+
+        Args:
+            context: Context name (the test file).
+            counts: Execution counts per line, keyed by source path.
+
+        Returns:
+            Number of rows written.
+        """
+        with self._conn:
+            return self._record(context, counts)
+
+    def record_results(
+        self, results: list[TestResult], files: FileTable | None = None
+    ) -> int:
+        """Store the line counts of each test result as its own context.
+
+        All results are written in one transaction. Lines that ran without a
+        probe (adaptive mode) are not attributed to any test.
+
+        Args:
+            results: Test results with coverage hits.
+            files: Instrumented files by coverage file id.
+
+        Returns:
+            Number of rows written.
+        """
+        by_key = {str(file_id): f for file_id, f in (files or {}).items()}
+        rows = 0
+        with self._conn:
+            for result in results:
+                counts = result_line_counts(result, by_key)
+                rows += self._record(result.test_file, counts)
+        return rows
+
+    def contexts(self) -> list[str]:
+        """Return the names of all recorded contexts, sorted."""
+        query = "SELECT name FROM context ORDER BY name"
+        return [name for (name,) in self._conn.execute(query)]
+
+    def who_covers(self, path: str, lineno: int | None = None) -> list[ContextHit]:
+        """Return the contexts that ran a line, or any line of a file.
+
+        Args:
+            path: Source path relative to the project root, or a trailing
+                part of it (e.g. just the file name).
+            lineno: Line number; None for every line of the file.
+
+        Returns:
+            Hits sorted by context, path and line.
+        """
+        file_ids = {
+            file_id: name
+            for name, file_id in self._file_ids.items()
+            if _path_matches(name, path)
+        }
+        hits: list[ContextHit] = []
+        for file_id, name in file_ids.items():
+            query = (
+                "SELECT c.name, h.lineno, h.count FROM line_hit h"
+                " JOIN context c ON c.id = h.context_id WHERE h.file_id = ?"
+            )
+            params: tuple[int, ...] = (file_id,)
+            if lineno is not None:
+                query += " AND h.lineno = ?"
+                params = (file_id, lineno)
+            hits.extend(
+                ContextHit(context, name, line, count)
+                for context, line, count in self._conn.execute(query, params)
+            )
+        return sorted(hits, key=lambda h: (h.context, h.path, h.lineno))
+
+    def _record(self, context: str, counts: Mapping[str, Mapping[int, int]]) -> int:
+        """Store one context's counts inside the current transaction."""
+        conn = self._conn
+        conn.execute("INSERT OR IGNORE INTO context (name) VALUES (?)", (context,))
+        (context_id,) = conn.execute(
+            "SELECT id FROM context WHERE name = ?", (context,)
+        ).fetchone()
+        conn.execute("DELETE FROM line_hit WHERE context_id = ?", (context_id,))
+
+        file_ids = {path: self._file_id(path) for path in counts}
+        cursor = conn.executemany(
+            "INSERT INTO line_hit VALUES (?, ?, ?, ?)",
+            _rows(context_id, file_ids, counts),
+        )
+        return cursor.rowcount
+
+    def _file_id(self, path: str) -> int:
+        """Return the id of a source path, adding it if needed."""
+        file_id = self._file_ids.get(path)
+        if file_id is None:
+            cursor = self._conn.execute("INSERT INTO file (path) VALUES (?)", (path,))
+            file_id = self._file_ids[path] = cursor.lastrowid or 0
+        return file_id
+
+
+def _rows(
+    context_id: int,
+    file_ids: Mapping[str, int],
+    counts: Mapping[str, Mapping[int, int]],
+) -> Iterator[tuple[int, int, int, int]]:
+    """Yield line_hit rows for one context, in primary key order."""
+    for path, file_id in sorted(file_ids.items(), key=lambda item: item[1]):
+        lines = counts[path]
+        for lineno in sorted(lines):
+            yield context_id, file_id, lineno, lines[lineno]
+
+
+def _path_matches(stored: str, query: str) -> bool:
+    """Check whether a stored path is the queried path or ends with it."""
+    query = query.replace("\\", "/").removeprefix("./")
+    return stored == query or stored.endswith("/" + query)
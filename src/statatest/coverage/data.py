@@ -0,0 +1,185 @@
+"""Coverage data files.
+
+A coverage data file (.stcov) keeps the aggregated coverage of one run, or of
+one CI shard, so that reports can be produced later and shards can be
+combined. It is gzip-compressed JSON Lines:
+
+- a header line with the format name, the version and the table of source
+  paths; a file is referred to by its index in this table
+- one line per source file, e.g.
+
+      {"id": 0, "lines": [[3, 40]], "hits": [[3, 12, 1], [15, 4, 250]],
+       "branches": [[20, 2, [3, 0]]]}
+
+  "lines" lists executable lines as [first, length] runs, "hits" lists
+  execution counts as [first, length, count] runs of consecutive lines with
+  the same count, and "branches" lists [line, outcomes, counts] (counts is
+  omitted for branch points that were never reached).
+
+Files are read record by record, so combining many data files holds only the
+combined report in memory.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+from collections.abc import Iterable, Iterator, Mapping
+from pathlib import Path
+from typing import Any
+
+from statatest.core.constants import COVERAGE_DATA_FORMAT, COVERAGE_DATA_VERSION
+from statatest.coverage.models import CoverageReport, FileCoverage
+
+
+class CoverageDataError(ValueError):
+    """Raised when a coverage data file cannot be read."""
+
+
+def write_coverage_data(coverage: CoverageReport, path: Path) -> None:
+    """Write a coverage report to a coverage data file.
+
+    The file is written next to its destination first and then moved into
+    place, so readers never see a partial file and concurrent runs do not
+    write into each other's file.
+
+    Args:
+        coverage: Aggregated coverage.
+        path: Destination path.
+    """
+    files = sorted(coverage.files.items())
+    header = {
+        "format": COVERAGE_DATA_FORMAT,
+        "version": COVERAGE_DATA_VERSION,
+        "paths": [name for name, _ in files],
+    }
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+        f.write(json.dumps(header, separators=(",", ":")) + "\n")
+        for file_id, (_, file_cov) in enumerate(files):
+            record = _encode_file(file_id, file_cov)
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+    tmp_path.replace(path)
+
+
+def read_coverage_data(path: Path) -> Iterator[FileCoverage]:
+    """Read the per-file records of a coverage data file one at a time.
+
+    Args:
+        path: Path to the coverage data file.
+
+    Yields:
+        Coverage of each source file in the data file.
+
+    Raises:
+        CoverageDataError: If the file is not a coverage data file or was
+            written by an incompatible version.
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            paths = _read_header(path, f.readline())
+            for line in f:
+                yield _decode_file(json.loads(line), paths)
+    except (OSError, EOFError, ValueError, KeyError, IndexError, TypeError) as e:
+        if isinstance(e, CoverageDataError):
+            raise
+        msg = f"Cannot read coverage data file {path}: {e}"
+        raise CoverageDataError(msg) from e
+
+
+def combine_coverage_data(
+    paths: Iterable[Path], coverage: CoverageReport | None = None
+) -> CoverageReport:
+    """Merge any number of coverage data files into one report.
+
+    Args:
+        paths: Coverage data files, e.g. one per CI shard.
+        coverage: Report to merge into (default: a new, empty report).
+
+    Returns:
+        The combined report.
+
+    Raises:
+        CoverageDataError: If a file cannot be read.
+    """
+    coverage = coverage or CoverageReport()
+    for path in paths:
+        for file_cov in read_coverage_data(path):
+            coverage.merge(file_cov)
+    return coverage
+
+
+def _read_header(path: Path, line: str) -> list[str]:
+    """Validate the header line and return the path table."""
+    header = json.loads(line) if line else None
+    if not isinstance(header, dict) or header.get("format") != COVERAGE_DATA_FORMAT:
+        msg = f"{path} is not a statatest coverage data file"
+        raise CoverageDataError(msg)
+    if header.get("version") != COVERAGE_DATA_VERSION:
+        msg = (
+            f"{path} has coverage data version {header.get('version')}; "
+            f"this statatest reads version {COVERAGE_DATA_VERSION}"
+        )
+        raise CoverageDataError(msg)
+    return [str(name) for name in header["paths"]]
+
+
+def _encode_file(file_id: int, file_cov: FileCoverage) -> dict[str, Any]:
+    """Encode one file's coverage as a data file record."""
+    counts = dict(file_cov.hit_counts)
+    for lineno in file_cov.lines_hit - counts.keys():
+        counts[lineno] = 1
+    record: dict[str, Any] = {
+        "id": file_id,
+        "lines": _line_runs(file_cov.lines_total),
+        "hits": _count_runs(counts),
+    }
+    if file_cov.branch_points:
+        branches: list[list[Any]] = []
+        for lineno, outcomes in sorted(file_cov.branch_points.items()):
+            taken = file_cov.branch_hits.get(lineno)
+            branches.append([lineno, outcomes, taken] if taken else [lineno, outcomes])
+        record["branches"] = branches
+    return record
+
+
+def _decode_file(record: Mapping[str, Any], paths: list[str]) -> FileCoverage:
+    """Decode a data file record."""
+    file_cov = FileCoverage(filepath=paths[record["id"]])
+    for first, length in record["lines"]:
+        file_cov.lines_total.update(range(first, first + length))
+    for first, length, count in record["hits"]:
+        for lineno in range(first, first + length):
+            file_cov.hit_counts[lineno] = count
+    file_cov.lines_hit = set(file_cov.hit_counts)
+    for branch in record.get("branches", []):
+        file_cov.branch_points[branch[0]] = branch[1]
+        if len(branch) > 2:  # noqa: PLR2004
+            file_cov.branch_hits[branch[0]] = list(branch[2])
+    return file_cov
+
+
+def _line_runs(lines: Iterable[int]) -> list[list[int]]:
+    """Encode line numbers as [first, length] runs of consecutive lines."""
+    runs: list[list[int]] = []
+    for lineno in sorted(lines):
+        if runs and runs[-1][0] + runs[-1][1] == lineno:
+            runs[-1][1] += 1
+        else:
+            runs.append([lineno, 1])
+    return runs
+
+
+def _count_runs(counts: Mapping[int, int]) -> list[list[int]]:
+    """Encode line counts as [first, length, count] runs."""
+    runs: list[list[int]] = []
+    for lineno in sorted(counts):
+        count = counts[lineno]
+        if runs and runs[-1][0] + runs[-1][1] == lineno and runs[-1][2] == count:
+            runs[-1][1] += 1
+        else:
+            runs.append([lineno, 1, count])
+    return runs
@@ -0,0 +1,207 @@
+"""Patch coverage: coverage of the lines changed in the working tree.
+
+The changed lines come from `git diff -U0 <base>`, plus every line of the
+untracked source files (new files not yet added to git), and the coverage
+from a stored coverage data file, so no test is run. Only executable lines
+count:
+an added comment or blank line is neither covered nor missed, and changed
+files that are not instrumented (tests, docs) are left out.
+"""
+
+from __future__ import annotations
+
+import re
+import subprocess
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from pathlib import Path
+
+from statatest.core.constants import DEFAULT_INSTRUMENT_PATTERNS
+from statatest.coverage.models import CoverageReport
+
+_FILE_HEADER = re.compile(r'^\+\+\+ (?:"((?:[^"\\]|\\.)*)"|(.+?))\t?$')
+_C_ESCAPES = {"a": 7, "b": 8, "t": 9, "n": 10, "v": 11, "f": 12, "r": 13}
+_HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+
+
+class CoverageDiffError(ValueError):
+    """Raised when the changed lines cannot be determined."""
+
+
+@dataclass
+class PatchCoverage:
+    """Coverage of changed executable lines.
+
+    Attributes:
+        changed: Changed executable lines, by source path.
+        covered: Changed lines that ran, by source path.
+    """
+
+    changed: dict[str, set[int]] = field(default_factory=dict)
+    covered: dict[str, set[int]] = field(default_factory=dict)
+
+    @property
+    def total_lines(self) -> int:
+        """Number of changed executable lines."""
+        return sum(len(lines) for lines in self.changed.values())
+
+    @property
+    def covered_lines(self) -> int:
+        """Number of changed executable lines that ran."""
+        return sum(len(lines) for lines in self.covered.values())
+
+    @property
+    def coverage_percent(self) -> float:
+        """Percentage of changed lines covered. Returns 100 if none changed."""
+        if not self.total_lines:
+            return 100.0
+        return self.covered_lines / self.total_lines * 100
+
+    def missed(self, path: str) -> list[int]:
+        """Return the changed lines of a file that did not run, sorted."""
+        return sorted(self.changed[path] - self.covered.get(path, set()))
+
+
+def changed_lines(base: str = "HEAD", cwd: Path | None = None) -> dict[str, set[int]]:
+    """Return the lines added or modified in the working tree since base.
+
+    Untracked source files (not ignored) are new code too: all their lines
+    count as changed.
+
+    Args:
+        base: Git revision to compare the working tree with.
+        cwd: Directory to run git in (default: the current directory); paths
+            are relative to it.
+
+    Returns:
+        New line numbers of changed lines, by path.
+
+    Raises:
+        CoverageDiffError: If git is missing or the diff fails.
+    """
+    diff = _git(
+        ["diff", "-U0", "--no-color", "--no-ext-diff", "--relative", base, "--"], cwd
+    )
+    changed = parse_diff(diff)
+    for path in _git(["ls-files", "--others", "--exclude-standard", "-z"], cwd).split(
+        "\0"
+    ):
+        name = path.rpartition("/")[2]
+        if path and any(fnmatch(name, p) for p in DEFAULT_INSTRUMENT_PATTERNS):
+            lines = _count_lines((cwd or Path()) / path)
+            if lines:
+                changed[path] = set(range(1, lines + 1))
+    return changed
+
+
+def _git(arguments: list[str], cwd: Path | None) -> str:
+    """Run a git command that lists paths and return its output.
+
+    Paths are printed as they are (core.quotePath=false) where git allows.
+
+    Raises:
+        CoverageDiffError: If git is missing or the command fails.
+    """
+    try:
+        process = subprocess.run(  # noqa: S603
+            ["git", "-c", "core.quotePath=false", *arguments],  # noqa: S607
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="surrogateescape",
+            check=False,
+            cwd=cwd,
+        )
+    except OSError as e:
+        msg = f"Cannot run git: {e}"
+        raise CoverageDiffError(msg) from e
+    if process.returncode != 0:
+        command = " ".join(a for a in arguments if not a.startswith("-"))
+        msg = f"git {command} failed: {process.stderr.strip()}"
+        raise CoverageDiffError(msg)
+    return process.stdout
+
+
+def _count_lines(path: Path) -> int:
+    """Return the number of lines of a file, 0 if it cannot be read."""
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return 0
+    return data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0)
+
+
+def parse_diff(diff: str) -> dict[str, set[int]]:
+    """Extract changed line numbers from a unified diff.
+
+    Args:
+        diff: Output of `git diff` (best with -U0, so that context lines are
+            not reported).
+
+    Returns:
+        New line numbers of added or modified lines, by path. Deleted files
+        are left out. Paths git prints C-quoted ("b/tab\\there.ado") are
+        unquoted.
+    """
+    changed: dict[str, set[int]] = {}
+    lines: set[int] | None = None
+    for line in diff.splitlines():
+        if line.startswith("+++ "):
+            match = _FILE_HEADER.match(line)
+            if match is None:
+                path = "/dev/null"
+            elif match.group(1) is not None:
+                path = _unquote(match.group(1))
+            else:
+                path = match.group(2)
+            path = path.removeprefix("b/")
+            lines = None if path == "/dev/null" else changed.setdefault(path, set())
+        elif lines is not None and (match := _HUNK_HEADER.match(line)):
+            start = int(match.group(1))
+            count = int(match.group(2) or "1")
+            lines.update(range(start, start + count))
+    return {path: lines for path, lines in changed.items() if lines}
+
+
+def _unquote(quoted: str) -> str:
+    """Undo git's C-style quoting of a path (without the outer quotes)."""
+    result = bytearray()
+    i = 0
+    while i < len(quoted):
+        char = quoted[i]
+        if char != "\\" or i + 1 == len(quoted):
+            result.extend(char.encode("utf-8", "surrogateescape"))
+            i += 1
+            continue
+        escape = quoted[i + 1]
+        if escape in "01234567":
+            result.append(int(quoted[i + 1 : i + 4], 8))
+            i += 4
+        else:
+            result.append(_C_ESCAPES.get(escape, ord(escape)))
+            i += 2
+    return result.decode("utf-8", "replace")
+
+
+def patch_coverage(
+    coverage: CoverageReport, changed: dict[str, set[int]]
+) -> PatchCoverage:
+    """Compute the coverage of changed lines.
+
+    Args:
+        coverage: Coverage of the working tree, e.g. from the last run.
+        changed: Changed lines by path (see changed_lines).
+
+    Returns:
+        Changed executable lines of instrumented files and those that ran.
+    """
+    patch = PatchCoverage()
+    for path, lines in sorted(changed.items()):
+        file_cov = coverage.files.get(path)
+        if file_cov is None:
+            continue
+        executable = lines & (file_cov.lines_total | file_cov.lines_hit)
+        if executable:
+            patch.changed[path] = executable
+            patch.covered[path] = executable & file_cov.lines_hit
+    return patch
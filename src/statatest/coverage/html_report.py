@@ -0,0 +1,341 @@
+"""HTML coverage report.
+
+The report consists of:
+
+- index.html: a table of all files with their line and branch coverage, which
+  can be sorted by clicking a column header
+- one page per source file, showing every source line with its execution
+  count, highlighted as run, missed or partially run (a branch point with an
+  outcome never taken)
+- style.css, shared by all pages
+- status.json, recording a digest of the source and coverage each page was
+  rendered from
+
+Pages are written line by line straight to disk. A page whose digest matches
+the one in status.json is left as it is, so re-running a report after a
+change only renders the affected files. Pages are rendered in a process pool
+once there are at least HTML_PARALLEL_MIN_FILES of them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import html
+import json
+import os
+from collections.abc import Collection, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import IO
+
+from statatest.core.constants import (
+    COVERAGE_HIGH_THRESHOLD,
+    COVERAGE_MEDIUM_THRESHOLD,
+    HTML_PARALLEL_MIN_FILES,
+    HTML_REPORT_VERSION,
+    HTML_STATUS_FILENAME,
+)
+from statatest.core.logging import get_logger
+from statatest.coverage.models import CoverageReport, FileCoverage
+
+logger = get_logger(__name__)
+
+_STYLE = """\
+body { font-family: sans-serif; margin: 20px; }
+table { border-collapse: collapse; width: 100%; }
+th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+th { background-color: #4CAF50; color: white; cursor: pointer; }
+tr:nth-child(even) { background-color: #f2f2f2; }
+.high { color: green; }
+.medium { color: orange; }
+.low { color: red; }
+table.source { font-family: monospace; font-size: 13px; }
+table.source td { border: none; padding: 0 8px; white-space: pre; }
+table.source td.n, table.source td.c { color: #888; text-align: right; }
+table.source tr { background-color: white; }
+table.source tr.hit { background-color: #dfd; }
+table.source tr.miss { background-color: #fdd; }
+table.source tr.partial { background-color: #ffc; }
+"""
+
+_SORT_SCRIPT = """\
+<script>
+document.querySelectorAll("th").forEach((th, col) => th.addEventListener(
+  "click", () => {
+    const body = th.closest("table").tBodies[0];
+    const asc = th.dataset.order !== "asc";
+    th.dataset.order = asc ? "asc" : "desc";
+    const key = (tr) => tr.cells[col].dataset.sort ?? tr.cells[col].textContent;
+    [...body.rows].sort((a, b) => {
+      const x = key(a), y = key(b);
+      const d = isNaN(x) || isNaN(y) ? x.localeCompare(y) : x - y;
+      return asc ? d : -d;
+    }).forEach((tr) => body.append(tr));
+  }));
+</script>"""
+
+_PageJob = tuple[FileCoverage, str, str, str | None]
+"""(coverage, source path, page path, digest of the existing page)."""
+
+
+def write_html(
+    coverage: CoverageReport,
+    output_dir: Path,
+    source_root: Path | None = None,
+    max_workers: int | None = None,
+) -> int:
+    """Write an aggregated coverage report as HTML.
+
+    Files whose source cannot be found are listed in the index without a
+    page.
+
+    Args:
+        coverage: CoverageReport with aggregated data.
+        output_dir: Directory to write HTML files.
+        source_root: Directory that report paths are relative to (default:
+            the current directory).
+        max_workers: Maximum number of rendering processes (default: number
+            of CPUs).
+
+    Returns:
+        Number of file pages rendered; unchanged pages are not counted.
+    """
+    source_root = source_root or Path.cwd()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    previous = _load_status(output_dir)
+
+    names = sorted(coverage.files)
+    jobs: list[_PageJob] = [
+        (
+            coverage.files[name],
+            str(source_root / name),
+            str(output_dir / page_name(name)),
+            previous.get(name),
+        )
+        for name in names
+    ]
+    workers = max_workers or os.cpu_count() or 1
+    if workers > 1 and len(jobs) >= HTML_PARALLEL_MIN_FILES:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_render_job, jobs, chunksize=chunksize))
+    else:
+        results = [_render_job(job) for job in jobs]
+
+    digests = {
+        name: digest
+        for name, (digest, _) in zip(names, results, strict=True)
+        if digest is not None
+    }
+    for name in previous.keys() - digests.keys():
+        (output_dir / page_name(name)).unlink(missing_ok=True)
+
+    (output_dir / "style.css").write_text(_STYLE, encoding="utf-8")
+    with (output_dir / "index.html").open("w", encoding="utf-8") as f:
+        _write_index(f, coverage, digests.keys())
+    _save_status(output_dir, digests)
+    return sum(1 for _, rendered in results if rendered)
+
+
+def page_name(filepath: str) -> str:
+    """Return the file name of the HTML page of a source file.
+
+    Args:
+        filepath: Source path as reported (relative to the project root).
+
+    Returns:
+        Name made of the file's base name and a hash of its full path, so
+        that files with the same name in different directories do not clash.
+    """
+    digest = hashlib.sha256(filepath.encode("utf-8")).hexdigest()[:12]
+    return f"{Path(filepath).name.replace('.', '_')}_{digest}.html"
+
+
+def _render_job(job: _PageJob) -> tuple[str | None, bool]:
+    """Render one file page unless it is up to date; runs in a worker process.
+
+    Args:
+        job: (coverage, source path, page path, previous digest).
+
+    Returns:
+        Tuple of (digest of the page's inputs, or None if the source is
+        missing; whether the page was rendered).
+    """
+    file_cov, source, page, previous = job
+    source_path, page_path = Path(source), Path(page)
+    try:
+        source_bytes = source_path.read_bytes()
+    except OSError:
+        logger.debug("No source for coverage page: %s", source_path)
+        return None, False
+
+    digest = _page_digest(file_cov, source_bytes)
+    if digest == previous and page_path.exists():
+        return digest, False
+
+    text = source_bytes.decode("utf-8", errors="replace")
+    with page_path.open("w", encoding="utf-8") as f:
+        _write_page(f, file_cov, text.splitlines())
+    return digest, True
+
+
+def _page_digest(file_cov: FileCoverage, source: bytes) -> str:
+    """Return a digest of everything a file page is rendered from."""
+    data = (
+        sorted(file_cov.lines_total),
+        sorted(file_cov.lines_hit),
+        sorted(file_cov.hit_counts.items()),
+        sorted(file_cov.branch_points.items()),
+        sorted(file_cov.branch_hits.items()),
+    )
+    digest = hashlib.sha256(source)
+    digest.update(repr(data).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _write_page(f: IO[str], file_cov: FileCoverage, lines: list[str]) -> None:
+    """Write the annotated source page of one file."""
+    title = html.escape(file_cov.filepath)
+    pct = file_cov.coverage_percent
+    f.write(_head(title))
+    f.write(
+        f"<h1>{title}</h1>\n<p><a href='index.html'>Index</a> &middot; Lines: "
+        f"<strong class='{_coverage_class(pct)}'>{pct:.1f}%</strong> "
+        f"({file_cov.lines_covered}/{len(file_cov.lines_total)})"
+    )
+    if file_cov.branches_found:
+        f.write(
+            f" &middot; Branches taken: {file_cov.branches_covered}"
+            f"/{file_cov.branches_found}"
+        )
+    f.write("</p>\n<table class='source'>\n")
+    f.writelines(_source_rows(file_cov, lines))
+    f.write("</table>\n</body>\n</html>\n")
+
+
+def _source_rows(file_cov: FileCoverage, lines: list[str]) -> Iterator[str]:
+    """Yield one table row per source line."""
+    executable = file_cov.lines_total | file_cov.lines_hit
+    for lineno, text in enumerate(lines, start=1):
+        css_class = ""
+        count = ""
+        if lineno in file_cov.lines_hit:
+            css_class = "hit"
+            if lineno in file_cov.hit_counts:
+                count = f"{file_cov.hit_counts[lineno]:,}"
+        elif lineno in executable:
+            css_class = "miss"
+            count = "0"
+
+        branches = ""
+        outcomes = file_cov.branch_points.get(lineno)
+        if outcomes:
+            taken = file_cov.branch_hits.get(lineno, [])
+            covered = sum(1 for n in taken if n)
+            branches = f" title='branches taken: {covered}/{outcomes}'"
+            if css_class == "hit" and covered < outcomes:
+                css_class = "partial"
+
+        row_class = f" class='{css_class}'" if css_class else ""
+        yield (
+            f"<tr id='L{lineno}'{row_class}{branches}>"
+            f"<td class='n'><a href='#L{lineno}'>{lineno}</a></td>"
+            f"<td class='c'>{count}</td><td>{html.escape(text)}</td></tr>\n"
+        )
+
+
+def _write_index(f: IO[str], coverage: CoverageReport, pages: Collection[str]) -> None:
+    """Write the sortable index of all files."""
+    f.write(_head("statatest Coverage Report"))
+    f.write(
+        "<h1>statatest Coverage Report</h1>\n"
+        f"<p>Overall coverage: <strong>{coverage.coverage_percent:.1f}%"
+        "</strong></p>\n"
+    )
+    if coverage.total_branches:
+        f.write(
+            f"<p>Branches taken: <strong>{coverage.covered_branches}"
+            f"/{coverage.total_branches}</strong></p>\n"
+        )
+    f.write(
+        "<table>\n<thead><tr><th>File</th><th>Lines</th><th>Covered</th>"
+        "<th>Coverage</th><th>Branches</th><th>Hits</th><th>Hottest line</th>"
+        "</tr></thead>\n<tbody>\n"
+    )
+    for filename, file_cov in sorted(coverage.files.items()):
+        f.write(_index_row(filename, file_cov, filename in pages))
+    f.write(f"</tbody>\n</table>\n{_SORT_SCRIPT}\n</body>\n</html>\n")
+
+
+def _index_row(filename: str, file_cov: FileCoverage, has_page: bool) -> str:
+    """Return the index row of one file."""
+    pct = file_cov.coverage_percent
+    total = len(file_cov.lines_total) or len(file_cov.lines_hit)
+    name = html.escape(filename)
+    if has_page:
+        name = f"<a href='{page_name(filename)}'>{name}</a>"
+
+    hottest = file_cov.hottest_line()
+    hottest_cell = "<td data-sort='-1'></td>"
+    if hottest:
+        hottest_cell = (
+            f"<td data-sort='{hottest[1]}'>{hottest[0]} ({hottest[1]:,}&times;)</td>"
+        )
+    branches_cell = "<td data-sort='-1'></td>"
+    if file_cov.branches_found:
+        branches_cell = (
+            f"<td data-sort='{file_cov.branches_covered / file_cov.branches_found}'>"
+            f"{file_cov.branches_covered}/{file_cov.branches_found}</td>"
+        )
+    return (
+        f"<tr><td data-sort='{html.escape(filename)}'>{name}</td>"
+        f"<td>{total}</td><td>{len(file_cov.lines_hit)}</td>"
+        f"<td class='{_coverage_class(pct)}' data-sort='{pct:.3f}'>{pct:.1f}%</td>"
+        f"{branches_cell}<td data-sort='{file_cov.total_hits}'>"
+        f"{file_cov.total_hits:,}</td>{hottest_cell}</tr>\n"
+    )
+
+
+def _head(title: str) -> str:
+    """Return the start of an HTML page, up to and including <body>."""
+    return (
+        "<!DOCTYPE html>\n<html>\n<head>\n<meta charset='utf-8'>\n"
+        f"<title>{title}</title>\n"
+        "<link rel='stylesheet' href='style.css'>\n</head>\n<body>\n"
+    )
+
+
+def _coverage_class(percent: float) -> str:
+    """Get CSS class for coverage percentage.
+
+    Args:
+        percent: Coverage percentage (0-100).
+
+    Returns:
+        CSS class name ("high", "medium", or "low").
+    """
+    if percent >= COVERAGE_HIGH_THRESHOLD:
+        return "high"
+    if percent >= COVERAGE_MEDIUM_THRESHOLD:
+        return "medium"
+    return "low"
+
+
+def _load_status(output_dir: Path) -> dict[str, str]:
+    """Return the page digests of the previous report, by source path."""
+    try:
+        status = json.loads((output_dir / HTML_STATUS_FILENAME).read_text("utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(status, dict) or status.get("version") != HTML_REPORT_VERSION:
+        return {}
+    pages = status.get("pages")
+    return pages if isinstance(pages, dict) else {}
+
+
+def _save_status(output_dir: Path, digests: dict[str, str]) -> None:
+    """Record the page digests of this report."""
+    status = {"version": HTML_REPORT_VERSION, "pages": digests}
+    (output_dir / HTML_STATUS_FILENAME).write_text(
+        json.dumps(status, indent=1, sort_keys=True), encoding="utf-8"
+    )
@@ -5,24 +5,132 @@ that are preserved in .smcl log files but invisible in rendered output.
 
 The instrumentation process:
 1. Copy source files to .statatest/instrumented/
-2. Inject SMCL comment markers: {* COV:filename:lineno }
+2. Split them into statements (coverage.lexer) and inject SMCL comment
+   markers before the executable ones: {* COV:file_id:lineno }
 3. Run tests with instrumented files
 4. Parse .smcl logs to extract coverage data
-5. Map coverage back to original file paths
+5. Map file ids back to source paths (see coverage.models.InstrumentedFile)
+
+In "memory" probe mode, step 2 instead injects a global macro counter
+increment per line. Nothing is written to the log while the code runs; the
+test wrapper writes all counters to a file once, after the test.
+
+With "block" granularity, only the first line of each basic block gets a
+probe; the other lines of the block are counted as often as its first line.
+
+Branch outcomes of if / else if / else chains are derived from the counts of
+the first line of each block. Loops and capture statements get one extra
+branch probe each, recording a skipped loop or a failed capture; see
+coverage.models.BranchPoint.
+
+Lines inside Mata blocks get Mata probes (printf of the same marker, or an
+st_global() counter update) before each statement, so that compiled Mata
+functions record their coverage when they run.
+
+.do files are instrumented too, into a tree of their own. do and run
+statements in instrumented code and in tests are routed through the _stt_do
+program, which runs the instrumented copy of a .do file if there is one.
+
+The instrumented directory is kept between runs; see coverage.cache. In
+adaptive mode, lines that earlier runs recorded as run are instrumented
+without probes, so that later runs only pay for probes on code that has not
+run yet.
 """
 
 from __future__ import annotations
 
+import os
 import re
 import shutil
+from array import array
+from collections import defaultdict
+from collections.abc import Callable, Collection, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 
 from statatest.core.constants import (
+    BRANCH_FLAG_PREFIX,
+    BRANCH_PROBE_SUFFIX,
+    CACHE_ENTRIES,
+    CONFTEST_FILENAME,
+    COVERAGE_COUNTER_PREFIX,
+    COVERAGE_PROBE_MODES,
+    DEFAULT_COVERAGE_PROBES,
+    DEFAULT_INSTRUMENT_PATTERNS,
+    DEFAULT_NORECURSE_DIRS,
+    DEFAULT_TEST_FILE_PATTERNS,
+    DO_REDIRECT_PROGRAM,
+    INSTRUMENT_PARALLEL_MIN_FILES,
     INSTRUMENT_SKIP_KEYWORDS,
     INSTRUMENT_SKIP_PATTERNS,
+    INSTRUMENTED_DIRNAME,
+    INSTRUMENTED_DO_DIRNAME,
+    PATTERN_BLOCK_BOUNDARY,
+    PATTERN_BLOCK_EXIT,
+    PATTERN_BLOCK_OPEN,
+    PATTERN_BRANCH_CAPTURE,
+    PATTERN_BRANCH_ELSE,
+    PATTERN_BRANCH_IF,
+    PATTERN_BRANCH_LOOP,
+    PATTERN_DO_CALL,
+    PATTERN_MATA_CONTROL,
+    PATTERN_MATA_DECLARATION,
+    PATTERN_NOISILY_BLOCK,
+    PATTERN_PROGRAM,
+    PATTERN_QUIETLY_BLOCK,
+    RUNS_DIRNAME,
+    STATATEST_DIR,
+)
+from statatest.core.logging import get_logger
+from statatest.coverage.cache import InstrumentationCache, hash_file
+from statatest.coverage.lexer import LexedSource, Statement, lex
+from statatest.coverage.models import (
+    BranchPoint,
+    CoverageReport,
+    FileTable,
+    InstrumentedFile,
+    InstrumentOptions,
 )
+from statatest.coverage.workspace import (
+    RunRoot,
+    instrumentation_lock,
+    prune_run_roots,
+)
+from statatest.discovery.parser import read_file_content, read_file_with_encoding
+from statatest.discovery.walker import compile_patterns, walk_files
+
+logger = get_logger(__name__)
 
 _SKIP_REGEX = re.compile("|".join(INSTRUMENT_SKIP_PATTERNS), re.IGNORECASE)
+_BLOCK_BOUNDARY_REGEX = re.compile(PATTERN_BLOCK_BOUNDARY, re.IGNORECASE)
+_BLOCK_EXIT_REGEX = re.compile(PATTERN_BLOCK_EXIT, re.IGNORECASE)
+_BLOCK_OPEN_REGEX = re.compile(PATTERN_BLOCK_OPEN)
+_IF_REGEX = re.compile(PATTERN_BRANCH_IF, re.IGNORECASE)
+_ELSE_REGEX = re.compile(PATTERN_BRANCH_ELSE, re.IGNORECASE)
+_LOOP_REGEX = re.compile(PATTERN_BRANCH_LOOP, re.IGNORECASE)
+_CAPTURE_REGEX = re.compile(PATTERN_BRANCH_CAPTURE, re.IGNORECASE)
+_QUIETLY_BLOCK_REGEX = re.compile(PATTERN_QUIETLY_BLOCK)
+_NOISILY_BLOCK_REGEX = re.compile(PATTERN_NOISILY_BLOCK)
+_PROGRAM_REGEX = re.compile(PATTERN_PROGRAM, re.IGNORECASE)
+_END_REGEX = re.compile(r"^\s*end\b", re.IGNORECASE)
+_MATA_DECLARATION_REGEX = re.compile(PATTERN_MATA_DECLARATION)
+_MATA_CONTROL_REGEX = re.compile(PATTERN_MATA_CONTROL)
+_MATA_STRING_REGEX = re.compile(r'"[^"]*"')
+_MATA_COMMENT_REGEX = re.compile(r"/\*.*?\*/")
+# A Mata statement continues after an operator, a comma or an open bracket;
+# ++ and -- end statements
+_MATA_CONTINUED_REGEX = re.compile(r"(?:[,*/=&|<>^?\\#(\[]|(?<!\+)\+|(?<!-)-)$")
+_DO_CALL_REGEX = re.compile(PATTERN_DO_CALL)
+
+_Built = tuple[dict[int, int], list[int], list[BranchPoint]]
+"""Line map, block leaders and branch points of an instrumented file."""
+
+_Edits = defaultdict[int, list[tuple[int, int, str]]]
+"""Text to insert into source lines: (column, kind, text) by line number."""
+
+# Kinds of edits; at the same column they are applied in this order
+_AFTER, _BEFORE, _INLINE = 0, 1, 2
 
 
 def _ends_with_continuation(line: str) -> bool:
@@ -41,10 +149,13 @@ def _ends_with_continuation(line: str) -> bool:
 
 
 def should_instrument_line(line: str, in_continuation: bool = False) -> bool:
-    """Check if a line should be instrumented.
+    """Check if a line, or a statement, should be instrumented.
+
+    The instrumenter passes the code of each statement found by the lexer,
+    without comments.
 
     Args:
-        line: The source code line.
+        line: The source code line or statement.
         in_continuation: Whether this line is part of a multi-line command
             started with /// on a previous line.
 
@@ -65,133 +176,1105 @@ def should_instrument_line(line: str, in_continuation: bool = False) -> bool:
     return stripped not in INSTRUMENT_SKIP_KEYWORDS
 
 
-def instrument_file(source_path: Path, dest_path: Path) -> dict[int, int]:
-    """Instrument a single .ado file with SMCL coverage markers.
+def coverage_probe(
+    file_id: int | str, lineno: int, probes: str = DEFAULT_COVERAGE_PROBES
+) -> str:
+    """Return the Stata statement recording one execution of a line.
+
+    Args:
+        file_id: Numeric id of the instrumented file (with
+            BRANCH_PROBE_SUFFIX for branch probes).
+        lineno: Original line number.
+        probes: Probe mode, "log" or "memory".
+
+    Returns:
+        A Stata statement.
+
+    Raises:
+        ValueError: If probes is not a known probe mode.
+    """
+    _check_probes(probes)
+    if probes == "memory":
+        # An undefined global expands to nothing, so the first hit stores 1
+        counter = f"{COVERAGE_COUNTER_PREFIX}{file_id}_{lineno}"
+        return f"global {counter} = ${{{counter}}} + 1"
+    # Format: display `"{* COV:file_id:lineno }"'
+    return f'display `"{{* COV:{file_id}:{lineno} }}"\''
+
+
+def mata_coverage_probe(
+    file_id: int | str, lineno: int, probes: str = DEFAULT_COVERAGE_PROBES
+) -> str:
+    """Return the Mata statement recording one execution of a line.
+
+    The statement writes the same marker, or updates the same global macro
+    counter, as coverage_probe, so Mata lines are collected like Stata lines.
+
+    Args:
+        file_id: Numeric id of the instrumented file.
+        lineno: Original line number.
+        probes: Probe mode, "log" or "memory".
+
+    Returns:
+        A Mata statement.
+
+    Raises:
+        ValueError: If probes is not a known probe mode.
+    """
+    _check_probes(probes)
+    if probes == "memory":
+        # "0" + "" is "0", so an undefined counter starts at zero
+        counter = f'"{COVERAGE_COUNTER_PREFIX}{file_id}_{lineno}"'
+        count = f'strtoreal("0" + st_global({counter})) + 1'
+        return f'st_global({counter}, strtrim(strofreal({count}, "%21.0g")))'
+    return f'printf("{{* COV:{file_id}:{lineno} }}\\n")'
+
+
+def mata_statements(
+    lines: list[str], blocks: list[tuple[int, int]] | None = None
+) -> tuple[set[int], set[int]]:
+    """Find the Mata blocks of a file and the statements inside them.
+
+    A statement gets a probe unless it is a declaration, a label, a brace or
+    an else, or the body of an if, else, for, while or do written without
+    braces (a probe there would become the body). A statement spanning
+    several lines (open brackets, a trailing operator or ///) is probed and
+    reported on its first line only.
+
+    Args:
+        lines: Source lines.
+        blocks: (first, last) lines of the Mata blocks, if the file was
+            lexed already (see coverage.lexer).
+
+    Returns:
+        Tuple of (lines of Mata blocks, including their mata and end lines;
+        first lines of the statements to probe).
+    """
+    if blocks is None:
+        blocks = lex(lines).mata_blocks
+    region: set[int] = set()
+    statements: set[int] = set()
+    for first, last in blocks:
+        region.update(range(first, last + 1))
+        statements.update(_mata_block_statements(lines, first, last))
+    return region, statements
+
+
+def _mata_block_statements(lines: list[str], first: int, last: int) -> set[int]:
+    """Return the first lines of the statements to probe in a Mata block."""
+    statements: set[int] = set()
+    in_comment = continued = body = False
+    depth = 0
+    text = ""
+    for lineno in range(first + 1, last + 1):
+        line = lines[lineno - 1]
+        if not (continued or in_comment) and _END_REGEX.match(line):
+            break
+        code, in_comment = _mata_code(line, in_comment)
+        if not code:
+            continue
+
+        if not continued:
+            text = code
+            is_body, body = body, False
+            if not (
+                is_body
+                or code[0] in "{}"
+                or _ELSE_REGEX.match(code)
+                or _MATA_DECLARATION_REGEX.match(code)
+            ):
+                statements.add(lineno)
+        else:
+            text = f"{text} {code}"
+
+        depth = max(0, depth + _bracket_balance(code))
+        continued = (
+            depth > 0
+            or bool(_MATA_CONTINUED_REGEX.search(code))
+            or _ends_with_continuation(line)
+        )
+        if not continued:
+            body = _opens_mata_body(text)
+
+    return statements
+
+
+def _mata_code(line: str, in_comment: bool) -> tuple[str, bool]:
+    """Strip strings and comments from a Mata line.
+
+    Args:
+        line: Source line.
+        in_comment: Whether the line starts inside a /* */ comment.
+
+    Returns:
+        Tuple of (remaining code, stripped; whether the next line starts
+        inside a /* */ comment).
+    """
+    if in_comment:
+        end = line.find("*/")
+        if end < 0:
+            return "", True
+        line, in_comment = line[end + 2 :], False
+    code = _MATA_COMMENT_REGEX.sub(" ", _MATA_STRING_REGEX.sub('""', line))
+    start = code.find("/*")
+    if start >= 0:
+        code, in_comment = code[:start], True
+    return code.split("//", 1)[0].strip(), in_comment
+
+
+def _bracket_balance(code: str) -> int:
+    """Return the number of brackets a line opens minus those it closes."""
+    opened = code.count("(") + code.count("[")
+    return opened - code.count(")") - code.count("]")
+
+
+def _opens_mata_body(statement: str) -> bool:
+    """Check whether the next Mata statement is the body of this one."""
+    closes_block = statement.startswith("}")
+    statement = statement.lstrip("} \t")
+    match = _MATA_CONTROL_REGEX.match(statement)
+    if match is None or (closes_block and statement.startswith("while")):
+        return False  # not a control statement, or the end of do ... while
+    rest = statement[match.end() :]
+    if match.group().endswith("("):
+        depth = 1
+        for i, char in enumerate(rest):
+            depth += {"(": 1, ")": -1}.get(char, 0)
+            if not depth:
+                rest = rest[i + 1 :]
+                break
+    return not rest.strip()
+
+
+def redirect_do_calls(source: str) -> str:
+    """Route the do and run statements of Stata code through _stt_do.
+
+    `do "clean.do", nostop` becomes `_stt_do do "clean.do", nostop`;
+    _stt_do runs the instrumented copy of the .do file when coverage is
+    collected, and the file itself otherwise. Mata blocks and comments are
+    left alone.
+
+    Args:
+        source: Content of a Stata file.
+
+    Returns:
+        The content with do and run statements redirected.
+    """
+    lines = source.split("\n")
+    edits: _Edits = defaultdict(list)
+    _redirect_do_calls(lines, lex(lines).statements, edits)
+    edited, _ = _apply_edits(lines, edits)
+    return "\n".join(edited)
+
+
+def _redirect_do_calls(
+    lines: list[str], statements: list[Statement], edits: _Edits
+) -> None:
+    """Add the edits redirecting do and run statements; see above."""
+    for statement in statements:
+        if not _DO_CALL_REGEX.match(statement.code):
+            continue
+        line = lines[statement.line - 1]
+        match = _DO_CALL_REGEX.match(line[statement.column :])
+        if match is not None:
+            column = statement.column + match.start(2)
+            edits[statement.line].append((column, _INLINE, f"{DO_REDIRECT_PROGRAM} "))
+
+
+def _apply_edits(
+    lines: list[str], edits: _Edits
+) -> tuple[list[str], Callable[[int, int], int]]:
+    """Insert statements and text into source lines.
+
+    Statements inserted at a column go on lines of their own: the text
+    before the column (unless it is only indentation) ends its line, and
+    the rest of the line follows them. Inline text is inserted as is. Edits
+    at the same column are applied after-statements first, then
+    before-statements, then inline text, each in the order they were added.
+
+    Args:
+        lines: Source lines.
+        edits: (column, kind, text) edits by line number.
+
+    Returns:
+        Tuple of (edited lines; function returning the edited line number of
+        an original line and column).
+    """
+    edited: list[str] = []
+    last = [0]  # edited line number of each line's last part
+    moved: dict[int, list[tuple[int, int]]] = {}
+    for lineno, line in enumerate(lines, start=1):
+        line_edits = edits.get(lineno)
+        if not line_edits:
+            edited.append(line)
+            last.append(len(edited))
+            continue
+
+        segments: list[tuple[int, int]] = []
+        current, pos, start = "", 0, 0
+        for column, kind, text in sorted(line_edits, key=lambda e: (e[0], e[1])):
+            current += line[pos:column]
+            pos = column
+            if kind == _INLINE:
+                current += text
+                continue
+            if current.strip():
+                segments.append((start, len(edited) + 1))
+                edited.append(current)
+                current, start = "", column
+            edited.append(text)
+        current += line[pos:]
+        if current or not segments:
+            segments.append((start, len(edited) + 1))
+            edited.append(current)
+        moved[lineno] = segments
+        last.append(segments[-1][1])
+
+    def locate(lineno: int, column: int) -> int:
+        segments = moved.get(lineno)
+        if segments is None:
+            return last[lineno]
+        return next(n for start, n in reversed(segments) if start <= column)
+
+    return edited, locate
+
+
+def _check_probes(probes: str) -> None:
+    """Raise ValueError for an unknown probe mode."""
+    if probes not in COVERAGE_PROBE_MODES:
+        modes = ", ".join(COVERAGE_PROBE_MODES)
+        msg = f"Unknown coverage probe mode {probes!r} (expected one of: {modes})"
+        raise ValueError(msg)
+
+
+def basic_blocks(lines: list[str]) -> dict[int, list[int]]:
+    """Group the executable lines of a file into basic blocks.
+
+    A basic block is a run of executable lines that always run together:
+    it ends after a statement that opens or closes a brace block (if, else,
+    loops, capture, quietly, ...) or that may skip what follows (capture,
+    exit, error, continue, break), and at program boundaries. A statement is
+    represented by its first line. Each Mata statement is a block of its
+    own.
+
+    Args:
+        lines: Source lines.
+
+    Returns:
+        Mapping of the first line of each block to all lines in the block.
+    """
+    lexed = lex(lines)
+    _, mata_probes = mata_statements(lines, lexed.mata_blocks)
+    return _basic_blocks(lexed, mata_probes)
+
+
+def _basic_blocks(lexed: LexedSource, mata_probes: set[int]) -> dict[int, list[int]]:
+    """Group executable statements into basic blocks; see basic_blocks."""
+    blocks: dict[int, list[int]] = {}
+    current: list[int] | None = None
+    ends_block = False
+    mata_blocks = iter(lexed.mata_blocks)
+    mata_block = next(mata_blocks, None)
+
+    for statement in [*lexed.statements, None]:
+        while mata_block is not None and (
+            statement is None or mata_block[0] < statement.line
+        ):
+            first, last = mata_block
+            for lineno in sorted(n for n in mata_probes if first <= n <= last):
+                blocks[lineno] = [lineno]
+            current = None
+            mata_block = next(mata_blocks, None)
+        if statement is None:
+            break
+
+        code, lineno = statement.code, statement.line
+        if should_instrument_line(code):
+            # Statements sharing a line (#delimit ;) share its probe
+            same_line = current is not None and current[-1] == lineno
+            if not same_line:
+                if ends_block:
+                    current = None
+                ends_block = False
+                if current is None:
+                    current = blocks[lineno] = []
+                current.append(lineno)
+            ends_block = (
+                ends_block
+                or bool(_BLOCK_EXIT_REGEX.match(code))
+                or bool(_BLOCK_OPEN_REGEX.search(code))
+            )
+        elif _BLOCK_BOUNDARY_REGEX.match(code):
+            current = None
+
+    return blocks
+
+
+@dataclass
+class _Block:
+    """A brace block open while scanning for branch points."""
+
+    line: int
+    point: BranchPoint | None = None
+    first: int | None = None
+    quiet: bool = False
+
+
+@dataclass
+class _BranchScanner:
+    """Find branch points and the statements that record their outcomes.
+
+    Also finds the statements inside quietly blocks, whose log probes must
+    be run noisily to reach the log.
+
+    Attributes:
+        probe: Returns the branch probe statement for a line, given whether
+            it runs inside a quietly block.
+        points: Branch points found, in source order.
+        before: Statements to insert before a statement, by its index.
+        after: Statements to insert after a statement, by its index.
+        quiet: Indexes of the statements inside quietly blocks.
+    """
+
+    probe: Callable[[int, bool], str]
+    points: list[BranchPoint] = field(default_factory=list)
+    before: defaultdict[int, list[str]] = field(
+        default_factory=lambda: defaultdict(list)
+    )
+    after: defaultdict[int, list[str]] = field(
+        default_factory=lambda: defaultdict(list)
+    )
+    quiet: set[int] = field(default_factory=set)
+    _stack: list[_Block] = field(default_factory=list)
+    _chain: BranchPoint | None = None
+    _index: int = 0
+
+    def scan(self, statements: list[Statement]) -> None:
+        """Scan the statements of a file."""
+        for index, statement in enumerate(statements):
+            self._index = index
+            self._begin(statement)
+            self._end(statement)
+
+    def _in_quiet_block(self) -> bool:
+        """Whether the innermost open block is a quietly block."""
+        return bool(self._stack) and self._stack[-1].quiet
+
+    def _begin(self, statement: Statement) -> None:
+        """Handle the start of a statement."""
+        code = statement.code
+        if self._in_quiet_block():
+            self.quiet.add(self._index)
+        if _PROGRAM_REGEX.match(code) or _END_REGEX.match(code):
+            self._stack.clear()
+            self._chain = None
+        elif code.startswith("}"):
+            self._close(statement.line)
+        elif should_instrument_line(code):
+            self._chain = None
+            if self._stack and self._stack[-1].first is None:
+                self._stack[-1].first = statement.line
+
+    def _end(self, statement: Statement) -> None:
+        """Handle a complete statement."""
+        start, head, index = statement.line, statement.code, self._index
+        opens = bool(_BLOCK_OPEN_REGEX.search(head))
+        point: BranchPoint | None = None
+        if match := _ELSE_REGEX.match(head):
+            point, self._chain = self._chain, None
+            if point is not None and opens and not match.group(1):
+                point.remainder = False
+        elif _IF_REGEX.match(head) and opens:
+            point = BranchPoint(start, "if")
+        elif _LOOP_REGEX.match(head) and opens:
+            point = BranchPoint(start, "loop")
+            flag = f"{BRANCH_FLAG_PREFIX}{start}"
+            self.before[index].append(f"local {flag} 0")
+            self.after[index].append(f"local {flag} 1")
+        elif _CAPTURE_REGEX.match(head):
+            point = BranchPoint(start, "capture")
+            if not opens:
+                probe = self.probe(start, self._in_quiet_block())
+                self.after[index].append(f"if _rc {probe}")
+
+        if point is not None and point.line == start:
+            self.points.append(point)
+        if opens:
+            quiet = bool(_QUIETLY_BLOCK_REGEX.match(head)) or (
+                self._in_quiet_block() and not _NOISILY_BLOCK_REGEX.match(head)
+            )
+            self._stack.append(_Block(start, point, quiet=quiet))
+
+    def _close(self, lineno: int) -> None:
+        """Handle a statement closing a brace block."""
+        self._chain = None
+        if not self._stack:
+            return
+        quiet = self._in_quiet_block()
+        block = self._stack.pop()
+        point = block.point
+        if point is None:
+            return
+        if point.kind == "if":
+            if block.first is None:
+                self.before[self._index].append(self.probe(lineno, quiet))
+            point.arms.append(block.first or lineno)
+            self._chain = point if point.remainder else None
+            return
+        probe = self.probe(point.line, self._in_quiet_block())
+        if point.kind == "loop":
+            flag = f"{BRANCH_FLAG_PREFIX}{point.line}"
+            self.after[self._index].append(f"if !`{flag}' {probe}")
+        else:
+            self.after[self._index].append(f"if _rc {probe}")
+
+
+def branch_points(lines: list[str]) -> list[BranchPoint]:
+    """Find the branch points of a file.
 
-    Handles Stata continuation lines (///) so that all lines of a multi-line
-    command are instrumented and reported as covered.
+    Branch points are if statements with a brace block (together with their
+    else if and else blocks), loops with a brace block, and capture
+    statements. Mata blocks are skipped.
 
     Args:
-        source_path: Path to the original .ado file
+        lines: Source lines.
+
+    Returns:
+        Branch points in source order.
+    """
+    scanner = _BranchScanner(probe=lambda lineno, _: str(lineno))
+    scanner.scan(lex(lines).statements)
+    return scanner.points
+
+
+def instrument_file(
+    source_path: Path,
+    dest_path: Path,
+    file_id: int,
+    options: InstrumentOptions | None = None,
+) -> dict[int, int]:
+    """Instrument a single .ado or .do file with coverage probes.
+
+    The file is split into statements (see coverage.lexer), and a probe goes
+    before the first executable statement of each line, so a statement
+    spanning several lines gets one probe and is reported on its first line.
+    Probes never land inside comments or multi-line commands; in #delimit ;
+    code they end with a semicolon, and in quietly blocks log probes are
+    run noisily. Mata statements get
+    Mata probes, and do and run statements are routed through _stt_do (see
+    redirect_do_calls).
+
+    Args:
+        source_path: Path to the original source file
         dest_path: Path where instrumented file will be written
+        file_id: Numeric id identifying the file in coverage probes
+        options: Probe mode and granularity (default: a "log" probe before
+            every executable line)
 
     Returns:
-        Mapping of instrumented line numbers to original line numbers
+        Mapping of instrumented line numbers to original line numbers, for
+        every executable line
     """
-    content = source_path.read_text(encoding="utf-8")
-    lines = content.split("\n")
+    line_map, _, _ = _instrument_source(source_path, dest_path, file_id, options)
+    return line_map
 
-    # Track line number mapping (instrumented -> original)
-    line_map: dict[int, int] = {}
+
+def _instrument_source(
+    source_path: Path,
+    dest_path: Path,
+    file_id: int,
+    options: InstrumentOptions | None = None,
+    unprobed: Collection[int] = (),
+) -> tuple[dict[int, int], list[int], list[BranchPoint]]:
+    """Instrument a file; see instrument_file.
+
+    Lines in unprobed get no probe but are still mapped as executable.
+    Sources that are not UTF-8 are read as Latin-1, and their instrumented
+    copy is written in the same encoding.
+
+    Returns:
+        Tuple of (line map, block leaders, branch points). Block leaders are
+        empty unless options.granularity is "block".
+    """
+    options = options or InstrumentOptions()
+    text, encoding = read_file_with_encoding(source_path)
+    lines = text.split("\n")
+    lexed = lex(lines)
+    statements = lexed.statements
+    _, mata_probes = mata_statements(lines, lexed.mata_blocks)
+
+    def probe(key: int | str, lineno: int, quiet: bool) -> str:
+        text = coverage_probe(key, lineno, options.probes)
+        # display output, and with it a log probe, is lost in quietly blocks
+        return f"noisily {text}" if quiet and options.probes == "log" else text
+
+    branch_id = f"{file_id}{BRANCH_PROBE_SUFFIX}"
+    branches = _BranchScanner(
+        probe=lambda lineno, quiet: probe(branch_id, lineno, quiet)
+    )
+    branches.scan(statements)
+
+    # With block granularity, only the first line of each block gets a probe
+    leaders: list[int] = []
+    if options.granularity == "block":
+        leaders = list(_basic_blocks(lexed, mata_probes))
+
+    # Each line gets one probe, before its first executable statement
+    starts: dict[int, tuple[int, int]] = {}
+    for index, statement in enumerate(statements):
+        if statement.line not in starts and should_instrument_line(statement.code):
+            starts[statement.line] = (index, statement.column)
+    starts.update((lineno, (-1, 0)) for lineno in mata_probes)
+    probed = set(leaders or starts).difference(unprobed)
+
+    edits: _Edits = defaultdict(list)
+    for index, statement in enumerate(statements):
+        before = list(branches.before.get(index, ()))
+        lineno = statement.line
+        if lineno in probed and starts[lineno][0] == index:
+            before.append(probe(file_id, lineno, index in branches.quiet))
+        after = branches.after.get(index, ())
+        terminator = ";" if statement.delimited else ""
+        if before:
+            edits[lineno].extend(
+                (statement.column, _BEFORE, text + terminator) for text in before
+            )
+        if after:
+            edits[statement.end_line].extend(
+                (statement.end_column, _AFTER, text + terminator) for text in after
+            )
+    for lineno in mata_probes & probed:
+        mata_probe = mata_coverage_probe(file_id, lineno, options.probes)
+        edits[lineno].append((0, _BEFORE, mata_probe))
+    _redirect_do_calls(lines, statements, edits)
 
     # Add marker header so `which` command shows this is instrumented
-    instrumented_lines: list[str] = [
-        f"*! INSTRUMENTED BY STATATEST - {source_path.name}",
-    ]
-    filename = source_path.name
-
-    # Track continuation state across lines
-    in_continuation = False
-
-    for orig_lineno, line in enumerate(lines, start=1):
-        if should_instrument_line(line, in_continuation=in_continuation):
-            # Insert SMCL coverage marker before the line
-            # Format: display `"{* COV:filename:lineno }"'
-            marker = f'display `"{{* COV:{filename}:{orig_lineno} }}"\''
-            instrumented_lines.append(marker)
-            line_map[len(instrumented_lines)] = orig_lineno
-            instrumented_lines.append(line)
-        else:
-            instrumented_lines.append(line)
+    edited, locate = _apply_edits(lines, edits)
+    instrumented_lines = [f"*! INSTRUMENTED BY STATATEST - {source_path.name}"]
+    instrumented_lines.extend(edited)
 
-        # Update continuation state for next line
-        # If current line ends with ///, next line is a continuation
-        in_continuation = _ends_with_continuation(line)
+    # Track line number mapping (instrumented -> original)
+    line_map = {
+        locate(lineno, column) + 1: lineno
+        for lineno, (_, column) in sorted(starts.items())
+    }
 
-    # Write instrumented file
+    # Write instrumented file. It is replaced rather than rewritten, since
+    # running sessions may hold hard links to the previous version.
     dest_path.parent.mkdir(parents=True, exist_ok=True)
-    dest_path.write_text("\n".join(instrumented_lines), encoding="utf-8")
+    tmp_path = dest_path.with_name(f".{dest_path.name}.{os.getpid()}.tmp")
+    # Latin-1 sources stay Latin-1 (only the header's file name may not fit)
+    tmp_path.write_text(
+        "\n".join(instrumented_lines), encoding=encoding, errors="replace"
+    )
+    tmp_path.replace(dest_path)
 
-    return line_map
+    return line_map, leaders, branches.points
 
 
 def instrument_directory(
     source_dir: Path,
     dest_dir: Path,
     patterns: list[str] | None = None,
-) -> dict[str, dict[int, int]]:
-    """Instrument all .ado files in a directory.
+    cache: InstrumentationCache | None = None,
+    max_workers: int | None = None,
+    options: InstrumentOptions | None = None,
+) -> FileTable:
+    """Instrument all .ado and .do files in a directory tree.
+
+    Subdirectories (e.g. adopath-style letter folders a/, b/, ...) are
+    searched recursively. Instrumented program files are written flat into
+    dest_dir, so that a single adopath entry finds all of them; see
+    collect_sources for how duplicate file names are handled. .do files are
+    written below dest_dir/do, at their absolute source path.
 
     Args:
         source_dir: Directory containing source .ado files
         dest_dir: Directory where instrumented files will be written
-        patterns: Glob patterns for files to instrument (default: ["*.ado"])
+        patterns: Glob patterns for files to instrument (default:
+            DEFAULT_INSTRUMENT_PATTERNS)
+        cache: Optional instrumentation cache for dest_dir. Files whose
+            source is unchanged since they were cached are not rewritten.
+        max_workers: Maximum number of instrumentation processes
+            (default: number of CPUs).
+        options: Probe mode and granularity.
+
+    Returns:
+        Table of instrumented files by file id. Paths are relative to
+        source_dir (POSIX style).
+    """
+    jobs = _plan_jobs([source_dir], dest_dir, source_dir, patterns, None)
+    return instrument_files(jobs, cache, max_workers, options)
+
+
+def instrument_files(
+    jobs: dict[str, tuple[Path, Path]],
+    cache: InstrumentationCache | None = None,
+    max_workers: int | None = None,
+    options: InstrumentOptions | None = None,
+    skip: Mapping[str, Collection[int]] | None = None,
+) -> FileTable:
+    """Instrument many files, in parallel when there are enough of them.
+
+    Each file gets a numeric id for its coverage markers; files known to the
+    cache keep their previous id. Files with an up-to-date cached copy are
+    skipped. The rest are instrumented in a process pool once there are at
+    least INSTRUMENT_PARALLEL_MIN_FILES of them; each worker sends back only
+    the line map and block leaders (as flat integer arrays), the branch
+    points and the source digest.
+
+    In adaptive mode (options.adaptive), a cached file is also instrumented
+    again when lines were proven since it was built, this time without
+    probes on them. If any source was added, changed or removed, proven
+    lines are forgotten and every file is built with all its probes.
+
+    Files in skip (lazy mode) are not instrumented: they are listed with
+    their executable lines and instrumented=False, unless an up-to-date
+    instrumented copy is cached, which is used as it is.
+
+    Args:
+        jobs: Mapping of report paths to (source_path, dest_path) pairs.
+        cache: Optional instrumentation cache for the destination directory.
+        max_workers: Maximum number of instrumentation processes
+            (default: number of CPUs).
+        options: Probe mode and granularity. A cache must have been loaded
+            with the same options.
+        skip: Executable lines of the files not to instrument, by report
+            key.
 
     Returns:
-        Dictionary mapping filenames to their line number mappings
+        Table of instrumented files by file id, in the order of jobs.
     """
-    if patterns is None:
-        patterns = ["*.ado"]
+    options = options or InstrumentOptions()
+    skip = skip or {}
+    pairs = list(jobs.values())
+    skipped = [key in skip for key in jobs]
+    file_ids = _assign_file_ids(pairs, cache)
+    built: list[_Built | None] = [None] * len(pairs)
+    proven: list[dict[int, int]] = [{} for _ in pairs]
+    if cache is not None:
+        _reuse_cached(pairs, cache, options, built, proven, skipped)
+    stale = [i for i, item in enumerate(built) if item is None and not skipped[i]]
+    stale_jobs = [
+        (str(pairs[i][0]), str(pairs[i][1]), file_ids[i], options, tuple(proven[i]))
+        for i in stale
+    ]
+
+    workers = max_workers or os.cpu_count() or 1
+    if workers > 1 and len(stale_jobs) >= INSTRUMENT_PARALLEL_MIN_FILES:
+        chunksize = max(1, len(stale_jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_instrument_job, stale_jobs, chunksize=chunksize))
+    else:
+        results = [_instrument_job(job) for job in stale_jobs]
+
+    for i, (flat_map, flat_leaders, branches, digest) in zip(
+        stale, results, strict=True
+    ):
+        line_map = dict(zip(flat_map[::2], flat_map[1::2], strict=True))
+        leaders = flat_leaders.tolist()
+        if cache is not None:
+            source, dest = pairs[i]
+            cache.store(
+                source,
+                dest,
+                file_ids[i],
+                line_map,
+                digest,
+                leaders,
+                branches,
+                proven[i],
+            )
+        built[i] = (line_map, leaders, branches)
 
-    all_maps: dict[str, dict[int, int]] = {}
+    files: FileTable = {}
+    for file_id, path, item, counts in zip(file_ids, jobs, built, proven, strict=True):
+        if item is None:
+            line_map = {lineno: lineno for lineno in skip.get(path, ())}
+            files[file_id] = InstrumentedFile(
+                file_id, path, line_map, proven=counts, instrumented=False
+            )
+            continue
+        line_map, leaders, branches = item
+        files[file_id] = InstrumentedFile(
+            file_id, path, line_map, leaders, branches, counts
+        )
+    return files
 
-    for pattern in patterns:
-        for source_path in source_dir.glob(pattern):
-            if source_path.is_file():
-                dest_path = dest_dir / source_path.name
-                line_map = instrument_file(source_path, dest_path)
-                all_maps[source_path.name] = line_map
 
-    return all_maps
+def _reuse_cached(
+    pairs: list[tuple[Path, Path]],
+    cache: InstrumentationCache,
+    options: InstrumentOptions,
+    built: list[_Built | None],
+    proven: list[dict[int, int]],
+    skipped: list[bool],
+) -> None:
+    """Fill in the builds of up-to-date cached files, and their proven lines.
+
+    Args:
+        pairs: (source_path, dest_path) of each file.
+        cache: Instrumentation cache for the destination directory.
+        options: Instrumentation options.
+        built: Build of each file, set here for reusable cached files.
+        proven: Proven lines of each file, set here in adaptive mode.
+        skipped: Whether each file is left uninstrumented unless cached. A
+            skipped file that was never instrumented does not count as
+            added.
+    """
+    entries = [cache.lookup(source, dest) for source, dest in pairs]
+    changed = any(
+        entry is None and not skip for entry, skip in zip(entries, skipped, strict=True)
+    ) or len(cache.entries) != len(entries) - entries.count(None)
+    if options.adaptive and changed:
+        cache.forget_proven()
+    for i, entry in enumerate(entries):
+        if entry is None:
+            continue
+        if options.adaptive:
+            proven[i] = entry.proven
+            if entry.outdated:
+                continue
+        built[i] = (entry.line_map, entry.block_leaders, entry.branches)
 
 
 def setup_instrumented_environment(
     source_dirs: list[Path],
     work_dir: Path,
     patterns: list[str] | None = None,
-) -> tuple[Path, dict[str, dict[int, int]]]:
+    max_workers: int | None = None,
+    norecursedirs: list[str] | None = None,
+    options: InstrumentOptions | None = None,
+    run_root: RunRoot | None = None,
+    lazy: Callable[[dict[str, Path]], Mapping[str, Collection[int]]] | None = None,
+) -> tuple[Path, FileTable]:
     """Set up an instrumented environment for coverage collection.
 
+    Source directories are searched recursively and program files are
+    instrumented into one flat directory that is put on the adopath; .do
+    files go to a tree below it (see instrument_directory). The
+    instrumented directory persists between runs and is shared by them; it
+    is only changed under the project's instrumentation lock. Only sources
+    that changed, were added or were removed since the previous run are
+    (re-)instrumented or deleted.
+
+    With a run root, the instrumented files are also linked into it while
+    the lock is held, and the run root is returned as the directory to run
+    tests with, so that concurrent runs cannot change it (see
+    coverage.workspace).
+
+    With lazy, only the sources the run can reach are instrumented (see
+    coverage.reachability); the others are linked into the run root as they
+    are, so that they still run, and reported as not loaded. Lazy
+    instrumentation needs a run root; without one, lazy is ignored.
+
     Args:
         source_dirs: List of directories containing source files
         work_dir: Working directory (usually project root)
-        patterns: Glob patterns for files to instrument
+        patterns: Glob patterns for files to instrument (default:
+            DEFAULT_INSTRUMENT_PATTERNS)
+        max_workers: Maximum number of instrumentation processes
+            (default: number of CPUs).
+        norecursedirs: Glob patterns for directory names not to search
+            (default: DEFAULT_NORECURSE_DIRS).
+        options: Probe mode and granularity. Changing them re-instruments
+            every file.
+        run_root: Instrumentation root of this run, if any.
+        lazy: Called with every source file, by report key; returns the
+            executable lines of the sources not to instrument, by report
+            key (e.g. coverage.reachability.unreachable_sources).
+
+    Returns:
+        Tuple of (instrumented_dir, files). instrumented_dir is the run root
+        if one is given. files maps the file ids used in coverage markers to
+        the instrumented files; their paths are relative to work_dir (POSIX
+        style).
+
+    Raises:
+        InstrumentationLockError: If another run holds the lock too long.
+    """
+    instrumented_dir = work_dir / STATATEST_DIR / INSTRUMENTED_DIRNAME
+    options = options or InstrumentOptions()
+    with instrumentation_lock(work_dir):
+        cache = InstrumentationCache.load(instrumented_dir, options.as_dict())
+        instrumented_dir.mkdir(parents=True, exist_ok=True)
+
+        jobs = _plan_jobs(
+            source_dirs, instrumented_dir, work_dir, patterns, norecursedirs
+        )
+        skip = None
+        if lazy is not None and run_root is not None:
+            skip = lazy({key: source for key, (source, _) in jobs.items()})
+        files = instrument_files(jobs, cache, max_workers, options, skip)
+
+        cache.prune(dest for _, dest in jobs.values())
+        cache.save()
+
+        if run_root is not None:
+            not_loaded = {f.path for f in files.values() if not f.instrumented}
+            run_root.link(
+                instrumented_dir,
+                (dest for key, (_, dest) in jobs.items() if key not in not_loaded),
+            )
+            run_root.link_sources(
+                source
+                for key, (source, dest) in jobs.items()
+                if key in not_loaded and dest.parent == instrumented_dir
+            )
+            return run_root.path, files
+
+    return instrumented_dir, files
+
+
+def record_proven_lines(
+    work_dir: Path,
+    files: FileTable,
+    coverage: CoverageReport,
+    options: InstrumentOptions,
+) -> int:
+    """Record the lines a run covered, for adaptive instrumentation.
+
+    The next run instruments these lines without probes and reports them
+    with the counts recorded here. Lines that branch outcomes are derived
+    from keep their probes.
+
+    Args:
+        work_dir: Working directory (usually project root).
+        files: Instrumented files of the run, by file id.
+        coverage: Coverage of the run (see aggregate_coverage).
+        options: Instrumentation options of the run.
 
     Returns:
-        Tuple of (instrumented_dir, all_line_maps)
+        Number of newly proven lines.
+
+    Raises:
+        InstrumentationLockError: If another run holds the lock too long.
     """
-    # Create .statatest/instrumented directory
-    instrumented_dir = work_dir / ".statatest" / "instrumented"
-    if instrumented_dir.exists():
-        shutil.rmtree(instrumented_dir)
-    instrumented_dir.mkdir(parents=True)
+    instrumented_dir = work_dir / STATATEST_DIR / INSTRUMENTED_DIRNAME
+    proven = 0
+    with instrumentation_lock(work_dir):
+        cache = InstrumentationCache.load(instrumented_dir, options.as_dict())
+        for instrumented in files.values():
+            file_cov = coverage.files.get(instrumented.path)
+            if file_cov is None or not instrumented.instrumented:
+                continue
+            needed = instrumented.probe_needed_lines()
+            counts = {
+                lineno: count
+                for lineno, count in file_cov.hit_counts.items()
+                if count and lineno not in needed
+            }
+            proven += cache.prove(instrumented, counts)
+        cache.save()
+    return proven
+
+
+def collect_sources(
+    source_dirs: list[Path],
+    patterns: list[str] | None = None,
+    norecursedirs: list[str] | None = None,
+) -> tuple[list[Path], dict[str, list[Path]]]:
+    """Find source files to instrument, detecting duplicate file names.
+
+    Stata resolves a program by file name along the adopath, so two files
+    with the same name (in different source directories or subfolders)
+    define the same program and only one of them can ever run. The one
+    Stata would find first is kept: earlier source directories win, and
+    within a directory shallower files win.
+
+    Args:
+        source_dirs: Directories to search recursively.
+        patterns: Glob patterns for file names (default: ["*.ado"]).
+        norecursedirs: Glob patterns for directory names not to search
+            (default: DEFAULT_NORECURSE_DIRS).
+
+    Returns:
+        Tuple of (sources to instrument, duplicates). duplicates maps a
+        file name to all paths defining it, the kept one first.
+    """
+    if norecursedirs is None:
+        norecursedirs = list(DEFAULT_NORECURSE_DIRS)
+
+    sources: dict[str, Path] = {}
+    duplicates: dict[str, list[Path]] = {}
+    for source_dir in source_dirs:
+        if not source_dir.is_dir():
+            continue
+        walked = walk_files(source_dir, patterns or ["*.ado"], norecursedirs)
+        found = sorted(
+            (path for path, _ in walked), key=lambda path: (len(path.parts), path)
+        )
+        for path in found:
+            name = path.name.lower()
+            if name in sources:
+                duplicates.setdefault(name, [sources[name]]).append(path)
+            else:
+                sources[name] = path
+
+    return list(sources.values()), duplicates
+
+
+def _plan_jobs(
+    source_dirs: list[Path],
+    dest_dir: Path,
+    root: Path,
+    patterns: list[str] | None,
+    norecursedirs: list[str] | None,
+) -> dict[str, tuple[Path, Path]]:
+    """Map report keys to (source, destination) pairs.
+
+    Program files go flat into dest_dir; duplicate program files are
+    reported as warnings and skipped. .do files go below dest_dir/do.
+    """
+    patterns = list(patterns or DEFAULT_INSTRUMENT_PATTERNS)
+    do_patterns = [p for p in patterns if p.lower().endswith(".do")]
+    program_patterns = [p for p in patterns if p not in do_patterns]
+
+    jobs: dict[str, tuple[Path, Path]] = {}
+    if program_patterns:
+        sources, duplicates = collect_sources(
+            source_dirs, program_patterns, norecursedirs
+        )
+        for paths in duplicates.values():
+            logger.warning(
+                "Duplicate program file %s; instrumenting %s and ignoring: %s",
+                paths[0].name,
+                paths[0],
+                ", ".join(str(p) for p in paths[1:]),
+            )
+        jobs.update(
+            (_relative_key(path, root), (path, dest_dir / path.name))
+            for path in sources
+        )
+
+    do_dir = dest_dir / INSTRUMENTED_DO_DIRNAME
+    for path in _collect_do_files(source_dirs, do_patterns, norecursedirs):
+        jobs[_relative_key(path, root)] = (path, do_dir / do_copy_key(path))
+    return jobs
+
 
-    all_maps: dict[str, dict[int, int]] = {}
+def _collect_do_files(
+    source_dirs: list[Path], patterns: list[str], norecursedirs: list[str] | None
+) -> list[Path]:
+    """Find the .do files to instrument; test and conftest files are not."""
+    if not patterns:
+        return []
+    if norecursedirs is None:
+        norecursedirs = list(DEFAULT_NORECURSE_DIRS)
+    tests = compile_patterns([*DEFAULT_TEST_FILE_PATTERNS, CONFTEST_FILENAME])
 
+    found: dict[str, Path] = {}
     for source_dir in source_dirs:
-        if source_dir.exists():
-            maps = instrument_directory(source_dir, instrumented_dir, patterns)
-            all_maps.update(maps)
+        if not source_dir.is_dir():
+            continue
+        for path, _ in walk_files(source_dir, patterns, norecursedirs):
+            if not tests.match(os.path.normcase(path.name)):
+                found.setdefault(do_copy_key(path), path)
+    return sorted(found.values())
 
-    return instrumented_dir, all_maps
+
+def do_copy_key(path: Path) -> str:
+    """Return where the instrumented copy of a .do file is kept.
+
+    The copy lives at the source's absolute path, without the leading slash
+    and the drive colon, below the instrumented .do directory; _stt_do
+    derives the same key from the path given to do or run.
+
+    Args:
+        path: Path to the .do file.
+
+    Returns:
+        Relative POSIX path, e.g. "home/me/project/code/clean.do".
+    """
+    return path.resolve().as_posix().replace(":", "").lstrip("/")
+
+
+def _assign_file_ids(
+    pairs: list[tuple[Path, Path]], cache: InstrumentationCache | None
+) -> list[int]:
+    """Return a file id for each (source, dest) pair, reusing cached ids."""
+    next_id = 1
+    if cache is not None:
+        next_id += max((entry.file_id for entry in cache.entries.values()), default=0)
+
+    file_ids: list[int] = []
+    for source, dest in pairs:
+        file_id = cache.file_id(source, dest) if cache else None
+        if file_id is None:
+            file_id, next_id = next_id, next_id + 1
+        file_ids.append(file_id)
+    return file_ids
+
+
+def _relative_key(path: Path, root: Path) -> str:
+    """Return path relative to root in POSIX style, or absolute if impossible."""
+    try:
+        return Path(os.path.relpath(path, root)).as_posix()
+    except ValueError:  # different drive on Windows
+        return Path(os.path.abspath(path)).as_posix()  # noqa: PTH100
+
+
+def _instrument_job(
+    job: tuple[str, str, int, InstrumentOptions, tuple[int, ...]],
+) -> tuple[array[int], array[int], list[BranchPoint], str]:
+    """Instrument one file; runs in a worker process.
+
+    Args:
+        job: (source_path, dest_path, file_id, options, unprobed lines),
+            paths as strings.
+
+    Returns:
+        Tuple of (line map flattened to [instrumented, original, ...],
+        block leaders, branch points, SHA-256 of the source).
+    """
+    source_path, dest_path = Path(job[0]), Path(job[1])
+    digest = hash_file(source_path)
+    line_map, leaders, branches = _instrument_source(
+        source_path, dest_path, job[2], job[3], job[4]
+    )
+    pairs = array("i")
+    for item in line_map.items():
+        pairs.extend(item)
+    return pairs, array("i", leaders), branches, digest
 
 
 def cleanup_instrumented_environment(work_dir: Path) -> None:
-    """Clean up the instrumented environment.
+    """Clean up the instrumented environment and the other cached state.
+
+    Removes the instrumented files (with their manifest) and the discovery
+    and source indexes. Coverage data files, which coverage combine and
+    coverage diff read, are kept. The roots of runs that are still going are
+    kept too, so clearing the cache does not break a concurrent run; roots of
+    runs that crashed are removed.
 
     Args:
         work_dir: Working directory containing .statatest folder
+
+    Raises:
+        InstrumentationLockError: If another run holds the lock too long.
     """
-    statatest_dir = work_dir / ".statatest"
-    if statatest_dir.exists():
-        shutil.rmtree(statatest_dir)
+    statatest_dir = work_dir / STATATEST_DIR
+    if not statatest_dir.exists():
+        return
+    with instrumentation_lock(work_dir):
+        for path in statatest_dir.iterdir():
+            if path.name == RUNS_DIRNAME:
+                prune_run_roots(path)
+            elif path.name not in CACHE_ENTRIES:
+                continue
+            elif path.is_dir() and not path.is_symlink():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
 
 
 def get_total_lines(source_path: Path) -> set[int]:
     """Get the set of instrumentable line numbers in a source file.
 
-    Handles Stata continuation lines (///) so that all lines of a multi-line
-    command are counted as instrumentable.
+    A statement is counted on its first line, however many lines it spans
+    (/// continuations, #delimit ; statements, /* */ comments). Files that
+    were instrumented already know these lines
+    (InstrumentedFile.executable_lines), without reading the source again.
 
     Args:
         source_path: Path to the source file
@@ -199,19 +1282,24 @@ def get_total_lines(source_path: Path) -> set[int]:
     Returns:
         Set of line numbers that are instrumentable
     """
-    content = source_path.read_text(encoding="utf-8")
-    lines = content.split("\n")
+    return executable_lines(read_file_content(source_path).split("\n"))
 
-    total_lines: set[int] = set()
 
-    # Track continuation state across lines
-    in_continuation = False
+def executable_lines(lines: list[str], lexed: LexedSource | None = None) -> set[int]:
+    """Get the instrumentable line numbers of Stata code.
 
-    for lineno, line in enumerate(lines, start=1):
-        if should_instrument_line(line, in_continuation=in_continuation):
-            total_lines.add(lineno)
-
-        # Update continuation state for next line
-        in_continuation = _ends_with_continuation(line)
+    Args:
+        lines: Source lines.
+        lexed: The lines split into statements, if already done.
 
+    Returns:
+        Set of line numbers that are instrumentable
+    """
+    lexed = lexed or lex(lines)
+    _, total_lines = mata_statements(lines, lexed.mata_blocks)
+    total_lines.update(
+        statement.line
+        for statement in lexed.statements
+        if should_instrument_line(statement.code)
+    )
     return total_lines
@@ -0,0 +1,255 @@
+"""Lexer for Stata ado and do files.
+
+Instrumentation works on statements rather than lines: a probe must go
+before a statement, never inside a comment or in the middle of a command
+that spans several lines. lex splits Stata code into statements, following
+the rules Stata uses to read a file:
+
+- /* */ comments may be nested and may span lines; a line break inside one
+  does not end the statement.
+- // starts a comment and /// continues the statement on the next line, but
+  only at the start of a line or after a blank, so URLs and paths in code are
+  left alone.
+- A statement starting with * is a comment.
+- Double-quoted and compound (`"..."') strings are kept intact, so comment
+  markers and semicolons inside them are ignored.
+- After #delimit ;, statements end at a semicolon instead of at the end of
+  the line, until #delimit cr.
+- Mata blocks (a line with just mata or mata:, up to the next end) are not
+  Stata code; they are skipped and reported separately.
+
+The lexer makes one pass over the text and looks only at the characters that
+can change its state, found with a regular expression, so long files are
+split in a few microseconds per line.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+
+from statatest.core.constants import PATTERN_DELIMIT, PATTERN_MATA_BLOCK
+
+_CODE_TOKEN_REGEX = re.compile(r'/\*|`"|"|(?:^|(?<=\s))//|;')
+_COMMENT_TOKEN_REGEX = re.compile(r"/\*|\*/")
+_COMPOUND_TOKEN_REGEX = re.compile(r'`"|"\'')
+_MATA_TOKEN_REGEX = re.compile(r'"[^"]*"|/\*|\*/|//')
+_DELIMIT_REGEX = re.compile(PATTERN_DELIMIT)
+_MATA_BLOCK_REGEX = re.compile(PATTERN_MATA_BLOCK, re.IGNORECASE)
+_END_REGEX = re.compile(r"^\s*end\b", re.IGNORECASE)
+
+
+@dataclass(frozen=True, slots=True)
+class Statement:
+    """A Stata statement.
+
+    Attributes:
+        line: Line the statement starts on.
+        column: Offset of its first character in that line.
+        end_line: Line the statement ends on.
+        end_column: Offset just after its last character in that line (after
+            the semicolon if delimited).
+        code: Text of the statement without comments, its lines joined by
+            blanks and without the delimiting semicolon.
+        delimited: Whether the statement ends with a semicolon (#delimit ;).
+    """
+
+    line: int
+    column: int
+    end_line: int
+    end_column: int
+    code: str
+    delimited: bool = False
+
+
+@dataclass(slots=True)
+class LexedSource:
+    """Statements and Mata blocks of a Stata file.
+
+    Attributes:
+        statements: Stata statements in source order; comments, #delimit
+            directives and Mata blocks are left out.
+        mata_blocks: (first, last) lines of each Mata block, from its mata
+            line to its end line.
+    """
+
+    statements: list[Statement] = field(default_factory=list)
+    mata_blocks: list[tuple[int, int]] = field(default_factory=list)
+
+
+def lex(lines: list[str]) -> LexedSource:
+    """Split Stata code into statements.
+
+    Args:
+        lines: Source lines, without line terminators.
+
+    Returns:
+        The file's statements and Mata blocks.
+    """
+    lexer = _Lexer()
+    for lineno, line in enumerate(lines, start=1):
+        lexer.feed(lineno, line)
+    lexer.close(len(lines), len(lines[-1]) if lines else 0)
+    return lexer.source
+
+
+@dataclass
+class _Lexer:
+    """State of lex between lines."""
+
+    source: LexedSource = field(default_factory=LexedSource)
+    delimit: bool = False
+    depth: int = 0  # /* */ nesting
+    parts: list[str] = field(default_factory=list)
+    start: tuple[int, int] | None = None
+    mata_start: int | None = None
+    mata_comment: bool = False
+
+    def feed(self, lineno: int, line: str) -> None:
+        """Process one line."""
+        if self.mata_start is not None:
+            self._feed_mata(lineno, line)
+        elif self._scan(lineno, line) and self.start is not None:
+            if self.depth or self.delimit:
+                self.parts.append(" ")
+            else:
+                self._finish(lineno, len(line))
+
+    def _scan(self, lineno: int, line: str) -> bool:
+        """Scan the code of a line.
+
+        Returns:
+            False if the line ends with a /// continuation or is a #delimit
+            directive, True otherwise.
+        """
+        pos, length = 0, len(line)
+        while pos < length:
+            if self.depth:
+                pos = self._skip_comment(line, pos)
+            elif self.start is None:
+                pos = self._begin(lineno, line, pos)
+                if pos < 0:
+                    return False
+            elif match := _CODE_TOKEN_REGEX.search(line, pos):
+                self.parts.append(line[pos : match.start()])
+                pos = self._code_mark(lineno, line, match)
+                if pos < 0:
+                    return False
+            else:
+                self.parts.append(line[pos:])
+                break
+        return True
+
+    def _code_mark(self, lineno: int, line: str, match: re.Match[str]) -> int:
+        """Handle a comment, string or semicolon found in a statement.
+
+        Returns:
+            Offset at which to continue scanning, or -1 for a /// continuation.
+        """
+        mark, end = match.group(), match.end()
+        if mark == "/*":
+            self.depth = 1
+            return end
+        if mark == ";":
+            if self.delimit:
+                self._finish(lineno, end)
+            else:
+                self.parts.append(";")
+            return end
+        if mark.startswith("/"):
+            if line.startswith("///", match.start()):
+                self.parts.append(" ")
+                return -1
+            return len(line)
+        if mark == '"':
+            close = line.find('"', end)
+            end = len(line) if close < 0 else close + 1
+        else:
+            end = _compound_end(line, end)
+        self.parts.append(line[match.start() : end])
+        return end
+
+    def close(self, lineno: int, column: int) -> None:
+        """Finish the last statement or Mata block of the file."""
+        if self.mata_start is not None:
+            self.source.mata_blocks.append((self.mata_start, lineno))
+            self.mata_start = None
+        elif self.start is not None:
+            self._finish(lineno, column)
+
+    def _begin(self, lineno: int, line: str, pos: int) -> int:
+        """Find where the next statement starts on a line.
+
+        Returns:
+            Offset of the statement's first character (or the line length if
+            there is none), or -1 if the rest of the line is a #delimit
+            directive.
+        """
+        length = len(line)
+        while pos < length and line[pos] in " \t\r\f\v":
+            pos += 1
+        if pos >= length:
+            return length
+        if line.startswith("/*", pos):
+            self.depth = 1
+            return pos + 2
+        if line.startswith("//", pos):
+            return length
+        if line.startswith("#d", pos) and (match := _DELIMIT_REGEX.match(line, pos)):
+            self.delimit = match.group(1) is not None
+            return -1
+        self.start = (lineno, pos)
+        return pos
+
+    def _skip_comment(self, line: str, pos: int) -> int:
+        """Skip to the end of a /* */ comment, or to the end of the line."""
+        while self.depth:
+            match = _COMMENT_TOKEN_REGEX.search(line, pos)
+            if match is None:
+                return len(line)
+            self.depth += 1 if match.group() == "/*" else -1
+            pos = match.end()
+        if self.start is not None:
+            self.parts.append(" ")
+        return pos
+
+    def _finish(self, lineno: int, column: int) -> None:
+        """Record the current statement, which ends at lineno, column."""
+        code = "".join(self.parts).strip()
+        start = self.start
+        self.parts.clear()
+        self.start = None
+        if start is None or not code or code.startswith("*"):
+            return
+        if not self.delimit and _MATA_BLOCK_REGEX.match(code):
+            self.mata_start, self.mata_comment = start[0], False
+            return
+        self.source.statements.append(
+            Statement(start[0], start[1], lineno, column, code, self.delimit)
+        )
+
+    def _feed_mata(self, lineno: int, line: str) -> None:
+        """Process a line of a Mata block."""
+        if not self.mata_comment and _END_REGEX.match(line):
+            self.close(lineno, len(line))
+            return
+        for match in _MATA_TOKEN_REGEX.finditer(line):
+            mark = match.group()
+            if mark == "*/":
+                self.mata_comment = False
+            elif self.mata_comment:
+                continue
+            elif mark == "/*":
+                self.mata_comment = True
+            elif mark == "//":
+                break
+
+
+def _compound_end(line: str, pos: int) -> int:
+    """Return the offset after the compound string that opens before pos."""
+    depth = 1
+    for match in _COMPOUND_TOKEN_REGEX.finditer(line, pos):
+        depth += 1 if match.group() == '`"' else -1
+        if not depth:
+            return match.end()
+    return len(line)
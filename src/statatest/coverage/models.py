@@ -1,14 +1,255 @@
 """Data models for coverage tracking.
 
 This module defines data structures for coverage data:
+- InstrumentOptions: How source files are instrumented
+- BranchPoint: A statement with several outcomes (if chain, loop, capture)
+- InstrumentedFile: Side table entry for an instrumented source file
 - FileCoverage: Coverage data for a single source file
 - CoverageReport: Aggregated coverage across all files
 """
 
 from __future__ import annotations
 
+from collections.abc import Mapping
 from dataclasses import dataclass, field
 
+from statatest.core.constants import (
+    COVERAGE_GRANULARITIES,
+    COVERAGE_PROBE_MODES,
+    DEFAULT_COVERAGE_GRANULARITY,
+    DEFAULT_COVERAGE_PROBES,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class InstrumentOptions:
+    """How source files are instrumented.
+
+    Attributes:
+        probes: "log" (SMCL marker per probe) or "memory" (counter per probe).
+        granularity: "line" (a probe before every executable line) or
+            "block" (a probe before the first line of every basic block).
+        adaptive: Whether probes are removed from lines that earlier runs
+            recorded as run (see coverage.cache).
+    """
+
+    probes: str = DEFAULT_COVERAGE_PROBES
+    granularity: str = DEFAULT_COVERAGE_GRANULARITY
+    adaptive: bool = False
+
+    def __post_init__(self) -> None:
+        """Validate the options.
+
+        Raises:
+            ValueError: If an option has an unknown value.
+        """
+        for name, value, allowed in (
+            ("probe mode", self.probes, COVERAGE_PROBE_MODES),
+            ("granularity", self.granularity, COVERAGE_GRANULARITIES),
+        ):
+            if value not in allowed:
+                msg = (
+                    f"Unknown coverage {name} {value!r} "
+                    f"(expected one of: {', '.join(allowed)})"
+                )
+                raise ValueError(msg)
+
+    def as_dict(self) -> dict[str, str]:
+        """Return the options as recorded in the instrumentation manifest."""
+        options = {"probes": self.probes, "granularity": self.granularity}
+        if self.adaptive:
+            options["adaptive"] = "true"
+        return options
+
+
+@dataclass(slots=True)
+class BranchPoint:
+    """A statement with several possible outcomes.
+
+    Outcomes are derived from line counts where possible, so that only loops
+    and capture statements need extra probes:
+
+    - "if": one outcome per block of the if / else if / else chain, counted
+      by the block's first executable line (or, for an empty block, by a
+      branch probe before its closing brace), plus a last "no block ran"
+      outcome if the chain has no final else block.
+    - "loop": body ran at least once / loop skipped (branch probe).
+    - "capture": succeeded / failed (branch probe).
+
+    Attributes:
+        line: Line of the if, loop or capture statement.
+        kind: "if", "loop" or "capture".
+        arms: For "if", the line counting each block of the chain.
+        remainder: For "if", whether the chain has no final else block.
+    """
+
+    line: int
+    kind: str
+    arms: list[int] = field(default_factory=list)
+    remainder: bool = True
+
+    @property
+    def outcomes(self) -> int:
+        """Number of outcomes of the branch point."""
+        if self.kind == "if":
+            return len(self.arms) + self.remainder
+        return 2
+
+
+@dataclass(slots=True)
+class InstrumentedFile:
+    """An instrumented source file.
+
+    Coverage markers identify files by a short numeric id instead of a path,
+    which keeps SMCL logs small. This record maps the id back to the file.
+
+    Attributes:
+        file_id: Numeric id written in the file's coverage markers.
+        path: Source path relative to the project root (POSIX style).
+        line_map: Mapping of instrumented line numbers to original lines,
+            for every executable line. Its values are the file's executable
+            lines, found in the same pass that wrote the probes. A file that
+            was not instrumented maps each executable line to itself.
+        block_leaders: First line of each basic block, if the file was
+            instrumented with one probe per block; empty for one probe per
+            line.
+        branches: Branch points of the file, in source order.
+        proven: Execution counts of the lines that earlier runs recorded as
+            run, and that were therefore instrumented without a probe
+            (adaptive mode only).
+        instrumented: False for a source that no selected test can reach,
+            which was left out by lazy instrumentation; it is reported as
+            not loaded.
+    """
+
+    file_id: int
+    path: str
+    line_map: dict[int, int] = field(default_factory=dict)
+    block_leaders: list[int] = field(default_factory=list)
+    branches: list[BranchPoint] = field(default_factory=list)
+    proven: dict[int, int] = field(default_factory=dict)
+    instrumented: bool = True
+    _blocks: dict[int, list[int]] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _lines: frozenset[int] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def executable_lines(self) -> frozenset[int]:
+        """Original line numbers of the file's executable lines."""
+        if self._lines is None:
+            self._lines = frozenset(self.line_map.values())
+        return self._lines
+
+    @property
+    def probe_count(self) -> int:
+        """Number of coverage probes in the instrumented file."""
+        if not self.instrumented:
+            return 0
+        probed = self.block_leaders or self.line_map.values()
+        return sum(1 for lineno in probed if lineno not in self.proven)
+
+    def probe_needed_lines(self) -> set[int]:
+        """Return the lines whose probes branch outcomes are derived from.
+
+        These keep their probes in adaptive mode. With block probes, every
+        line of a block that holds such a line is included.
+
+        Returns:
+            Line numbers of branch points and of the first lines of if
+            blocks (and their blocks).
+        """
+        needed = {point.line for point in self.branches}
+        for point in self.branches:
+            needed.update(point.arms)
+        if self.block_leaders:
+            for block in self.blocks().values():
+                if needed.intersection(block):
+                    needed.update(block)
+        return needed
+
+    def blocks(self) -> dict[int, list[int]]:
+        """Return the executable lines of each basic block.
+
+        Every executable line belongs to the block of the closest leader at
+        or before it.
+
+        Returns:
+            Mapping of block leader lines to the lines in the block.
+        """
+        if self._blocks is None:
+            leaders = set(self.block_leaders)
+            blocks: dict[int, list[int]] = {}
+            current: list[int] | None = None
+            for lineno in sorted(self.line_map.values()):
+                if lineno in leaders:
+                    current = blocks[lineno] = []
+                if current is not None:
+                    current.append(lineno)
+            self._blocks = blocks
+        return self._blocks
+
+    def line_counts(self, counts: Mapping[int, int]) -> Mapping[int, int]:
+        """Convert probe hit counts to line execution counts.
+
+        With block probes, every line of a block is counted as often as its
+        leader's probe ran.
+
+        Args:
+            counts: Hit counts keyed by probe line.
+
+        Returns:
+            Execution counts keyed by line.
+        """
+        if not self.block_leaders:
+            return counts
+        blocks = self.blocks()
+        lines: dict[int, int] = {}
+        for leader, count in counts.items():
+            for lineno in blocks.get(leader, (leader,)):
+                lines[lineno] = lines.get(lineno, 0) + count
+        return lines
+
+    def branch_counts(
+        self, line_counts: Mapping[int, int], probe_counts: Mapping[int, int]
+    ) -> dict[int, list[int]]:
+        """Derive branch outcome counts from line and branch probe counts.
+
+        Args:
+            line_counts: Execution counts keyed by line (see line_counts).
+            probe_counts: Branch probe hit counts keyed by line.
+
+        Returns:
+            Mapping of the lines of reached branch points to the number of
+            times each outcome was taken.
+        """
+        executable = self.executable_lines
+        outcomes: dict[int, list[int]] = {}
+        for point in self.branches:
+            reached = line_counts.get(point.line, 0)
+            if not reached:
+                continue
+            if point.kind != "if":
+                failed = min(reached, probe_counts.get(point.line, 0))
+                outcomes[point.line] = [reached - failed, failed]
+                continue
+            taken = [
+                line_counts.get(arm, 0)
+                if arm in executable
+                else probe_counts.get(arm, 0)
+                for arm in point.arms
+            ]
+            if point.remainder:
+                taken.append(max(0, reached - sum(taken)))
+            outcomes[point.line] = taken
+        return outcomes
+
+
+FileTable = dict[int, InstrumentedFile]
+"""Mapping of coverage file ids to instrumented files."""
+
 
 @dataclass
 class FileCoverage:
@@ -18,11 +259,45 @@ class FileCoverage:
         filepath: Path to the source file.
         lines_hit: Set of line numbers that were executed.
         lines_total: Set of all instrumentable line numbers.
+        hit_counts: Number of times each executed line ran.
+        branch_points: Number of outcomes of each branch point, by line.
+        branch_hits: Number of times each outcome of a reached branch point
+            was taken, by line.
     """
 
     filepath: str
     lines_hit: set[int] = field(default_factory=set)
     lines_total: set[int] = field(default_factory=set)
+    hit_counts: dict[int, int] = field(default_factory=dict)
+    branch_points: dict[int, int] = field(default_factory=dict)
+    branch_hits: dict[int, list[int]] = field(default_factory=dict)
+
+    @property
+    def branches_found(self) -> int:
+        """Number of branch outcomes in the file."""
+        return sum(self.branch_points.values())
+
+    @property
+    def branches_covered(self) -> int:
+        """Number of branch outcomes taken at least once."""
+        return sum(
+            1 for counts in self.branch_hits.values() for count in counts if count
+        )
+
+    @property
+    def total_hits(self) -> int:
+        """Total number of line executions in the file."""
+        return sum(self.hit_counts.values())
+
+    def hottest_line(self) -> tuple[int, int] | None:
+        """Return the most executed line.
+
+        Returns:
+            Tuple of (line number, count), or None if no line was hit.
+        """
+        if not self.hit_counts:
+            return None
+        return max(self.hit_counts.items(), key=lambda item: (item[1], -item[0]))
 
     @property
     def coverage_percent(self) -> float:
@@ -56,16 +331,79 @@ class CoverageReport:
 
     files: dict[str, FileCoverage] = field(default_factory=dict)
 
-    def add_hit(self, filename: str, lineno: int) -> None:
-        """Record a coverage hit for a file.
+    def add_hit(self, filename: str, lineno: int, count: int = 1) -> None:
+        """Record coverage hits for a file.
 
         Args:
             filename: Name of the source file.
             lineno: Line number that was executed.
+            count: Number of times the line was executed.
         """
         if filename not in self.files:
             self.files[filename] = FileCoverage(filepath=filename)
-        self.files[filename].lines_hit.add(lineno)
+        file_cov = self.files[filename]
+        file_cov.lines_hit.add(lineno)
+        file_cov.hit_counts[lineno] = file_cov.hit_counts.get(lineno, 0) + count
+
+    def add_branch_hits(self, filename: str, lineno: int, counts: list[int]) -> None:
+        """Record how often each outcome of a branch point was taken.
+
+        Args:
+            filename: Name of the source file.
+            lineno: Line of the branch point.
+            counts: Number of times each outcome was taken.
+        """
+        if filename not in self.files:
+            self.files[filename] = FileCoverage(filepath=filename)
+        file_cov = self.files[filename]
+        previous = file_cov.branch_hits.get(lineno)
+        if previous is None:
+            file_cov.branch_hits[lineno] = list(counts)
+        else:
+            file_cov.branch_hits[lineno] = [
+                a + b for a, b in zip(previous, counts, strict=True)
+            ]
+        file_cov.branch_points.setdefault(lineno, len(counts))
+
+    def set_branch_points(self, filename: str, points: dict[int, int]) -> None:
+        """Set the branch points of a file.
+
+        Args:
+            filename: Name of the source file.
+            points: Number of outcomes of each branch point, by line.
+        """
+        if filename not in self.files:
+            self.files[filename] = FileCoverage(filepath=filename)
+        self.files[filename].branch_points = points
+
+    def merge(self, other: FileCoverage) -> None:
+        """Add the coverage of a file from another run.
+
+        Hit counts and branch outcome counts are summed; executable lines
+        and branch points are combined. A branch point with a different
+        number of outcomes was recorded against another version of the
+        source: the other run's outcomes replace the ones merged so far.
+
+        Args:
+            other: Coverage of one file, e.g. read from a coverage data file.
+        """
+        file_cov = self.files.get(other.filepath)
+        if file_cov is None:
+            file_cov = self.files[other.filepath] = FileCoverage(other.filepath)
+        file_cov.lines_total |= other.lines_total
+        file_cov.lines_hit |= other.lines_hit
+        for lineno, count in other.hit_counts.items():
+            file_cov.hit_counts[lineno] = file_cov.hit_counts.get(lineno, 0) + count
+        for lineno, outcomes in other.branch_points.items():
+            if file_cov.branch_points.get(lineno, outcomes) != outcomes:
+                file_cov.branch_hits.pop(lineno, None)
+            file_cov.branch_points[lineno] = outcomes
+        for lineno, counts in other.branch_hits.items():
+            previous = file_cov.branch_hits.get(lineno)
+            if previous is not None and len(previous) != len(counts):
+                del file_cov.branch_hits[lineno]
+                file_cov.branch_points[lineno] = len(counts)
+            self.add_branch_hits(other.filepath, lineno, counts)
 
     def set_total_lines(self, filename: str, lines: set[int]) -> None:
         """Set the total instrumentable lines for a file.
@@ -88,6 +426,16 @@ class CoverageReport:
         """Total number of covered lines across all files."""
         return sum(f.lines_covered for f in self.files.values())
 
+    @property
+    def total_branches(self) -> int:
+        """Total number of branch outcomes across all files."""
+        return sum(f.branches_found for f in self.files.values())
+
+    @property
+    def covered_branches(self) -> int:
+        """Total number of branch outcomes taken across all files."""
+        return sum(f.branches_covered for f in self.files.values())
+
     @property
     def coverage_percent(self) -> float:
         """Overall coverage percentage.
@@ -0,0 +1,342 @@
+"""Static index of the programs that Stata files define and call.
+
+With lazy instrumentation, a coverage run instruments only the sources that
+the selected tests can reach; the others are reported as not loaded. The
+index records, for each source, test and conftest file:
+
+- programs: the programs it defines
+- calls: every name its code uses, not only command names, since a command
+  may be named long before it runs (local cmd myreg ... `cmd' x)
+- do_files: the file names it passes to do or run
+- lines: its executable lines, to report a source without instrumenting it
+
+A program file is reached when one of its names is called: its file name
+(Stata loads myreg.ado for the command myreg) or a program it defines. A .do
+file is reached when a reached file runs it. Fixtures requested with
+use_fixture or @uses_fixture call their fixture_<name> program. Names are
+taken from the code, comments left out, so the reachable set errs on the side
+of too many files; only a program whose name is assembled at run time (e.g.
+`prefix'_run) is missed.
+
+A source that cannot be read is treated as reachable, so it is still
+instrumented (or fails there with a proper error) instead of being reported
+as not loaded.
+
+The index is kept in .statatest/source-index.json, keyed by absolute path and
+validated by file mtime and size like the discovery index, so only files that
+changed since the previous run are read.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import re
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Any
+
+from statatest.core.constants import (
+    PATTERN_DO_CALL,
+    PATTERN_PROGRAM,
+    PATTERN_USE_FIXTURE_CALL,
+    PATTERN_USES_FIXTURE,
+    SOURCE_INDEX_FILENAME,
+    SOURCE_INDEX_VERSION,
+    STATATEST_DIR,
+)
+from statatest.core.logging import get_logger
+from statatest.coverage.instrument import executable_lines
+from statatest.coverage.lexer import lex
+from statatest.discovery.parser import read_file_content
+
+logger = get_logger(__name__)
+
+_WORD_REGEX = re.compile(r"[A-Za-z_]\w*")
+_PROGRAM_REGEX = re.compile(PATTERN_PROGRAM, re.IGNORECASE)
+_DO_CALL_REGEX = re.compile(PATTERN_DO_CALL)
+_DO_TARGET_REGEX = re.compile(r'\s*(?:`"([^"]*)"\'|"([^"]*)"|([^\s,]+))')
+_USE_FIXTURE_REGEX = re.compile(PATTERN_USE_FIXTURE_CALL)
+_USES_FIXTURE_REGEX = re.compile(PATTERN_USES_FIXTURE)
+
+
+@dataclass(slots=True)
+class SourceEntry:
+    """Index record for one file.
+
+    Attributes:
+        mtime_ns: File modification time (nanoseconds) when it was read.
+        size: File size in bytes when it was read.
+        programs: Names of the programs the file defines (lowercase).
+        calls: Names the file's code uses (lowercase), including the
+            fixture programs it requests.
+        do_files: File names passed to do or run (lowercase, with the .do
+            extension Stata would add).
+        lines: Executable lines of the file.
+    """
+
+    mtime_ns: int
+    size: int
+    programs: list[str] = field(default_factory=list)
+    calls: list[str] = field(default_factory=list)
+    do_files: list[str] = field(default_factory=list)
+    lines: list[int] = field(default_factory=list)
+
+
+@dataclass
+class SourceIndex:
+    """Index of program definitions and calls, persisted between runs.
+
+    Attributes:
+        path: Location of the index file. None keeps the index in memory only.
+        entries: Mapping of absolute file paths to index records.
+    """
+
+    path: Path | None = None
+    entries: dict[str, SourceEntry] = field(default_factory=dict)
+    _dirty: bool = field(default=False, repr=False)
+
+    @classmethod
+    def for_project(cls, project_root: Path) -> SourceIndex:
+        """Load the index stored under a project's .statatest directory.
+
+        Args:
+            project_root: Root directory of the project.
+
+        Returns:
+            SourceIndex bound to <project_root>/.statatest/source-index.json.
+        """
+        return cls.load(project_root / STATATEST_DIR / SOURCE_INDEX_FILENAME)
+
+    @classmethod
+    def load(cls, path: Path) -> SourceIndex:
+        """Load an index from disk.
+
+        A missing, unreadable or outdated index file yields an empty index.
+
+        Args:
+            path: Path to the index file.
+
+        Returns:
+            SourceIndex populated from the file, or empty.
+        """
+        index = cls(path=path)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return index
+
+        if not isinstance(data, dict) or data.get("version") != SOURCE_INDEX_VERSION:
+            logger.debug("Ignoring source index with unknown version: %s", path)
+            return index
+
+        for key, raw in data.get("files", {}).items():
+            with contextlib.suppress(KeyError, TypeError):
+                index.entries[key] = SourceEntry(
+                    mtime_ns=raw["mtime_ns"],
+                    size=raw["size"],
+                    programs=list(raw["programs"]),
+                    calls=list(raw["calls"]),
+                    do_files=list(raw["do_files"]),
+                    lines=list(raw["lines"]),
+                )
+        return index
+
+    def entry(self, path: Path) -> SourceEntry:
+        """Return the index record of a file, reading the file if it changed.
+
+        Args:
+            path: Path to a Stata file.
+
+        Returns:
+            Up-to-date index record.
+
+        Raises:
+            OSError: If the file cannot be read.
+        """
+        key = os.path.abspath(path)  # noqa: PTH100 - avoids resolve() syscalls
+        stat = path.stat()
+        entry = self.entries.get(key)
+        if (
+            entry is None
+            or entry.mtime_ns != stat.st_mtime_ns
+            or entry.size != stat.st_size
+        ):
+            entry = scan_source(path, stat)
+            self.entries[key] = entry
+            self._dirty = True
+        return entry
+
+    def save(self) -> None:
+        """Write the index to disk if it changed.
+
+        The file is replaced atomically. Write errors are logged and ignored,
+        since the index is only a cache.
+        """
+        if self.path is None or not self._dirty:
+            return
+
+        data: dict[str, Any] = {
+            "version": SOURCE_INDEX_VERSION,
+            "files": {
+                key: {
+                    "mtime_ns": entry.mtime_ns,
+                    "size": entry.size,
+                    "programs": entry.programs,
+                    "calls": entry.calls,
+                    "do_files": entry.do_files,
+                    "lines": entry.lines,
+                }
+                for key, entry in self.entries.items()
+            },
+        }
+
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(json.dumps(data, separators=(",", ":")), "utf-8")
+            tmp_path.replace(self.path)
+        except OSError as e:
+            logger.debug("Could not write source index %s: %s", self.path, e)
+            with contextlib.suppress(OSError):
+                tmp_path.unlink()
+            return
+        self._dirty = False
+
+
+def scan_source(path: Path, stat: os.stat_result | None = None) -> SourceEntry:
+    """Read the program definitions and calls of a Stata file.
+
+    Args:
+        path: Path to the file.
+        stat: Stat result taken before the file is read (default: taken
+            here).
+
+    Files that are not UTF-8 are read as Latin-1, like in discovery.
+
+    Returns:
+        Index record for the file.
+    """
+    stat = stat or path.stat()
+    text = read_file_content(path)
+    lines = text.split("\n")
+    lexed = lex(lines)
+
+    programs: set[str] = set()
+    calls: set[str] = set()
+    do_files: set[str] = set()
+    for statement in lexed.statements:
+        code = statement.code
+        if match := _PROGRAM_REGEX.match(code):
+            programs.add(match.group(1).lower())
+            continue
+        calls.update(word.lower() for word in _WORD_REGEX.findall(code))
+        if match := _DO_CALL_REGEX.match(code):
+            target = _do_target(code[match.end() :])
+            if target:
+                do_files.add(target)
+        elif match := _USE_FIXTURE_REGEX.search(code):
+            calls.add(f"fixture_{match.group(1).lower()}")
+    for first, last in lexed.mata_blocks:
+        for line in lines[first - 1 : last]:
+            calls.update(word.lower() for word in _WORD_REGEX.findall(line))
+    for match in _USES_FIXTURE_REGEX.finditer(text):
+        calls.update(
+            f"fixture_{name.strip().lower()}" for name in match.group(1).split(",")
+        )
+
+    return SourceEntry(
+        mtime_ns=stat.st_mtime_ns,
+        size=stat.st_size,
+        programs=sorted(programs),
+        calls=sorted(calls - programs),
+        do_files=sorted(do_files),
+        lines=sorted(executable_lines(lines, lexed)),
+    )
+
+
+def reachable_sources(
+    sources: Mapping[str, Path], entry_points: Iterable[Path], index: SourceIndex
+) -> set[str]:
+    """Find the sources that code run from the entry points can reach.
+
+    Args:
+        sources: Source files by report key.
+        entry_points: Files the run starts from: test files, their
+            conftest.do files and the setup do-file. Missing or unreadable
+            files are ignored.
+        index: Source index, updated with files that changed.
+
+    Returns:
+        Report keys of the reachable sources, including the sources that
+        cannot be read.
+    """
+    reached: set[str] = set()
+    by_name: dict[str, list[str]] = {}
+    by_do_file: dict[str, list[str]] = {}
+    for key, path in sources.items():
+        try:
+            names = list(index.entry(path).programs)
+        except (OSError, ValueError) as e:
+            logger.debug("Treating unreadable source as reachable: %s: %s", path, e)
+            reached.add(key)
+            continue
+        if path.suffix.lower() == ".do":
+            by_do_file.setdefault(path.name.lower(), []).append(key)
+        else:
+            names.append(path.stem.lower())
+        for name in names:
+            by_name.setdefault(name, []).append(key)
+
+    pending: list[SourceEntry] = []
+    for path in entry_points:
+        with contextlib.suppress(OSError, ValueError):
+            pending.append(index.entry(path))
+
+    while pending:
+        entry = pending.pop()
+        keys = [key for name in entry.calls for key in by_name.get(name, ())]
+        keys.extend(key for name in entry.do_files for key in by_do_file.get(name, ()))
+        for key in keys:
+            if key not in reached:
+                reached.add(key)
+                pending.append(index.entry(sources[key]))
+    return reached
+
+
+def unreachable_sources(
+    sources: Mapping[str, Path], entry_points: Iterable[Path], index: SourceIndex
+) -> dict[str, list[int]]:
+    """Find the sources that code run from the entry points cannot reach.
+
+    Meant as the lazy argument of setup_instrumented_environment, with the
+    entry points and index bound.
+
+    Args:
+        sources: Source files by report key.
+        entry_points: Files the run starts from (see reachable_sources).
+        index: Source index, updated with files that changed.
+
+    Returns:
+        Executable lines of each unreachable source, by report key.
+    """
+    reached = reachable_sources(sources, entry_points, index)
+    return {
+        key: index.entry(path).lines
+        for key, path in sources.items()
+        if key not in reached
+    }
+
+
+def _do_target(arguments: str) -> str | None:
+    """Return the file name a do or run statement runs, as Stata resolves it."""
+    match = _DO_TARGET_REGEX.match(arguments)
+    if match is None:
+        return None
+    target = next(group for group in match.groups() if group is not None)
+    name = PurePosixPath(target.replace("\\", "/")).name.lower()
+    if not name:
+        return None
+    return name if "." in name else f"{name}.do"
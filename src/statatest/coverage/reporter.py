@@ -8,43 +8,56 @@ from __future__ import annotations
 
 from pathlib import Path
 
-from statatest.core.constants import COVERAGE_HIGH_THRESHOLD, COVERAGE_MEDIUM_THRESHOLD
 from statatest.core.models import TestResult
 from statatest.coverage.aggregator import aggregate_coverage
-from statatest.coverage.models import CoverageReport
+from statatest.coverage.html_report import write_html
+from statatest.coverage.models import CoverageReport, FileCoverage, FileTable
 
 
-def generate_lcov(results: list[TestResult], output_path: Path) -> None:
+def generate_lcov(
+    results: list[TestResult], output_path: Path, files: FileTable | None = None
+) -> None:
     """Generate LCOV coverage report.
 
-    LCOV format is widely supported by CI tools like Codecov.
+    LCOV format is widely supported by CI tools like Codecov. Source files
+    are written as paths relative to the project root so that CI tools can
+    map them to the repository.
 
     Args:
         results: List of TestResult objects with coverage data.
         output_path: Path to write the LCOV file.
+        files: Instrumented files by coverage file id.
     """
-    coverage = aggregate_coverage(results)
-    lines = _build_lcov_content(coverage)
-
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text("\n".join(lines), encoding="utf-8")
+    write_lcov(aggregate_coverage(results, files), output_path)
 
 
-def generate_html(results: list[TestResult], output_dir: Path) -> None:
+def generate_html(
+    results: list[TestResult], output_dir: Path, files: FileTable | None = None
+) -> None:
     """Generate HTML coverage report.
 
-    Creates an index.html with coverage summary table.
+    Creates an index.html with a coverage summary table and a page per
+    source file (see write_html).
 
     Args:
         results: List of TestResult objects with coverage data.
         output_dir: Directory to write HTML files.
+        files: Instrumented files by coverage file id.
     """
-    coverage = aggregate_coverage(results)
-    html_content = _build_html_content(coverage)
+    write_html(aggregate_coverage(results, files), output_dir)
 
-    output_dir.mkdir(parents=True, exist_ok=True)
-    index_path = output_dir / "index.html"
-    index_path.write_text("\n".join(html_content), encoding="utf-8")
+
+def write_lcov(coverage: CoverageReport, output_path: Path) -> None:
+    """Write an aggregated coverage report as an LCOV file.
+
+    Args:
+        coverage: CoverageReport with aggregated data.
+        output_path: Path to write the LCOV file.
+    """
+    lines = _build_lcov_content(coverage)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text("\n".join(lines), encoding="utf-8")
 
 
 def _build_lcov_content(coverage: CoverageReport) -> list[str]:
@@ -61,8 +74,16 @@ def _build_lcov_content(coverage: CoverageReport) -> list[str]:
     for filename, file_cov in sorted(coverage.files.items()):
         lines.append(f"SF:{filename}")
 
-        # Write all hit lines
-        lines.extend(f"DA:{lineno},1" for lineno in sorted(file_cov.lines_hit))
+        # Branch outcomes ("-" for branch points that were never reached)
+        if file_cov.branch_points:
+            lines.extend(_build_lcov_branches(file_cov))
+
+        # Execution count of every known line (0 for missed lines)
+        counts = file_cov.hit_counts
+        lines.extend(
+            f"DA:{lineno},{counts.get(lineno, 0)}"
+            for lineno in sorted(file_cov.lines_hit | file_cov.lines_total)
+        )
 
         # Summary
         total = len(file_cov.lines_total) or len(file_cov.lines_hit)
@@ -73,63 +94,21 @@ def _build_lcov_content(coverage: CoverageReport) -> list[str]:
     return lines
 
 
-def _build_html_content(coverage: CoverageReport) -> list[str]:
-    """Build HTML coverage report content.
+def _build_lcov_branches(file_cov: FileCoverage) -> list[str]:
+    """Build the BRDA, BRF and BRH records of a file.
 
     Args:
-        coverage: CoverageReport with aggregated data.
+        file_cov: Coverage data of the file.
 
     Returns:
-        List of lines for HTML file.
+        List of LCOV lines.
     """
-    lines = [
-        "<!DOCTYPE html>",
-        "<html>",
-        "<head>",
-        "<title>statatest Coverage Report</title>",
-        "<style>",
-        "body { font-family: sans-serif; margin: 20px; }",
-        "table { border-collapse: collapse; width: 100%; }",
-        "th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }",
-        "th { background-color: #4CAF50; color: white; }",
-        "tr:nth-child(even) { background-color: #f2f2f2; }",
-        ".high { color: green; }",
-        ".medium { color: orange; }",
-        ".low { color: red; }",
-        "</style>",
-        "</head>",
-        "<body>",
-        "<h1>statatest Coverage Report</h1>",
-        f"<p>Overall coverage: <strong>{coverage.coverage_percent:.1f}%</strong></p>",
-        "<table>",
-        "<tr><th>File</th><th>Lines</th><th>Covered</th><th>Coverage</th></tr>",
-    ]
-
-    for filename, file_cov in sorted(coverage.files.items()):
-        pct = file_cov.coverage_percent
-        css_class = _get_coverage_class(pct)
-        total = len(file_cov.lines_total) or len(file_cov.lines_hit)
-        covered = len(file_cov.lines_hit)
-        lines.append(
-            f"<tr><td>{filename}</td><td>{total}</td><td>{covered}</td>"
-            f"<td class='{css_class}'>{pct:.1f}%</td></tr>"
-        )
-
-    lines.extend(["</table>", "</body>", "</html>"])
+    lines: list[str] = []
+    for lineno, outcomes in sorted(file_cov.branch_points.items()):
+        taken = file_cov.branch_hits.get(lineno)
+        for branch in range(outcomes):
+            count = str(taken[branch]) if taken else "-"
+            lines.append(f"BRDA:{lineno},0,{branch},{count}")
+    lines.append(f"BRF:{file_cov.branches_found}")
+    lines.append(f"BRH:{file_cov.branches_covered}")
     return lines
-
-
-def _get_coverage_class(percent: float) -> str:
-    """Get CSS class for coverage percentage.
-
-    Args:
-        percent: Coverage percentage (0-100).
-
-    Returns:
-        CSS class name ("high", "medium", or "low").
-    """
-    if percent >= COVERAGE_HIGH_THRESHOLD:
-        return "high"
-    if percent >= COVERAGE_MEDIUM_THRESHOLD:
-        return "medium"
-    return "low"
@@ -0,0 +1,228 @@
+"""Isolated instrumentation roots for concurrent coverage runs.
+
+The instrumented files in .statatest/instrumented are a cache shared by every
+run in a checkout (see coverage.cache). They are only built, updated and
+deleted under an exclusive lock (.statatest/instrumented.lock), so two runs
+never instrument into the same directory at once.
+
+Tests do not read the shared directory itself. Each run gets a root of its
+own, .statatest/runs/<id>/, holding hard links to the instrumented files it
+uses, created while the lock is held. Instrumented files are replaced, never
+rewritten in place, so another run re-instrumenting (or clearing) the shared
+directory leaves the files of a running session untouched. All Stata
+workers of a run only read its root, so they share it.
+
+A run holds a lock on its root's lock file until it ends; roots whose lock
+is free belong to runs that crashed and are removed by the next run.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import os
+import secrets
+import shutil
+import sys
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Self
+
+from statatest.core.constants import (
+    INSTRUMENT_LOCK_FILENAME,
+    INSTRUMENT_LOCK_TIMEOUT,
+    RUNS_DIRNAME,
+    STATATEST_DIR,
+)
+from statatest.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+_LOCK_POLL_INTERVAL = 0.05
+
+
+class InstrumentationLockError(ValueError):
+    """Raised when the shared instrumented files stay locked too long."""
+
+
+@dataclass
+class RunRoot:
+    """Instrumentation root of one coverage run.
+
+    Attributes:
+        path: Directory holding the run's instrumented files.
+    """
+
+    path: Path
+    _lock: IO[bytes] | None = field(default=None, repr=False)
+
+    @classmethod
+    def create(cls, work_dir: Path) -> RunRoot:
+        """Create a new, locked run root and remove those of crashed runs.
+
+        Args:
+            work_dir: Working directory (usually project root).
+
+        Returns:
+            RunRoot at .statatest/runs/<id>, held until release().
+        """
+        runs_dir = work_dir / STATATEST_DIR / RUNS_DIRNAME
+        runs_dir.mkdir(parents=True, exist_ok=True)
+        prune_run_roots(runs_dir)
+
+        while True:
+            run_id = f"{os.getpid()}-{secrets.token_hex(4)}"
+            lock_path = runs_dir / f"{run_id}.lock"
+            lock = lock_path.open("wb")
+            while not _try_lock(lock):  # held for a moment by prune_run_roots
+                time.sleep(_LOCK_POLL_INTERVAL)
+            # A prune_run_roots in another process may have locked and
+            # unlinked the new file before this run locked it; the lock
+            # then guards an orphaned file, so start again with a new id.
+            if _same_file(lock, lock_path):
+                break
+            lock.close()
+        path = runs_dir / run_id
+        path.mkdir()
+        return cls(path=path, _lock=lock)
+
+    def __enter__(self) -> Self:
+        """Return the run root for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Release the run root."""
+        self.release()
+
+    def link(self, source_dir: Path, files: Iterable[Path]) -> None:
+        """Add instrumented files to the run root.
+
+        Files are hard-linked, so N runs share one copy on disk; where hard
+        links are not supported they are copied.
+
+        Args:
+            source_dir: Shared instrumented directory.
+            files: Instrumented files inside source_dir.
+        """
+        for source in files:
+            _link_file(source, self.path / source.relative_to(source_dir))
+
+    def link_sources(self, files: Iterable[Path]) -> None:
+        """Add program files that were not instrumented to the run root.
+
+        Lazy instrumentation leaves out the sources no selected test can
+        reach. Linking the originals keeps them callable, without coverage,
+        should a test run them anyway.
+
+        Args:
+            files: Original program files.
+        """
+        for source in files:
+            _link_file(source, self.path / source.name)
+
+    def release(self) -> None:
+        """Delete the run root and release its lock."""
+        shutil.rmtree(self.path, ignore_errors=True)
+        if self._lock is not None:
+            lock_path = Path(self._lock.name)
+            self._lock.close()
+            self._lock = None
+            with contextlib.suppress(OSError):
+                lock_path.unlink()
+
+
+@contextlib.contextmanager
+def instrumentation_lock(
+    work_dir: Path, timeout: float = INSTRUMENT_LOCK_TIMEOUT
+) -> Iterator[None]:
+    """Hold the exclusive lock on a project's shared instrumented files.
+
+    Args:
+        work_dir: Working directory (usually project root).
+        timeout: Seconds to wait for another run to release the lock.
+
+    Yields:
+        Nothing; the lock is held inside the with block.
+
+    Raises:
+        InstrumentationLockError: If the lock is not free within timeout.
+    """
+    path = work_dir / STATATEST_DIR / INSTRUMENT_LOCK_FILENAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    deadline = time.monotonic() + timeout
+    with path.open("wb") as lock:
+        while not _try_lock(lock):
+            if time.monotonic() > deadline:
+                msg = (
+                    f"Timed out after {timeout:.0f}s waiting for another "
+                    f"statatest run to release {path}"
+                )
+                raise InstrumentationLockError(msg)
+            time.sleep(_LOCK_POLL_INTERVAL)
+        yield
+
+
+def prune_run_roots(runs_dir: Path) -> None:
+    """Remove the roots of runs that ended without releasing them.
+
+    Args:
+        runs_dir: Directory holding run roots and their lock files.
+    """
+    for lock_path in runs_dir.glob("*.lock"):
+        try:
+            lock = lock_path.open("ab")
+        except OSError:
+            continue
+        with lock:
+            if not _try_lock(lock):
+                continue  # the run is still going
+            logger.debug("Removing stale instrumentation root %s", lock_path.stem)
+            shutil.rmtree(runs_dir / lock_path.stem, ignore_errors=True)
+            with contextlib.suppress(OSError):
+                lock_path.unlink()
+
+
+def _same_file(lock: IO[bytes], path: Path) -> bool:
+    """Return whether an open file is still the one found at path."""
+    try:
+        current = path.stat()
+    except OSError:
+        return False
+    opened = os.fstat(lock.fileno())
+    return (opened.st_dev, opened.st_ino) == (current.st_dev, current.st_ino)
+
+
+def _try_lock(lock: IO[bytes]) -> bool:
+    """Take an exclusive lock on an open file without waiting.
+
+    The operating system releases the lock when the file is closed or the
+    process ends, so a crashed run never leaves a lock behind.
+    """
+    if sys.platform == "win32":
+        import msvcrt  # noqa: PLC0415
+
+        try:
+            msvcrt.locking(lock.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    import fcntl  # noqa: PLC0415
+
+    try:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _link_file(source: Path, dest: Path) -> None:
+    """Hard-link a file to dest, or copy it where links are not supported."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with contextlib.suppress(FileNotFoundError):
+        dest.unlink()
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copy2(source, dest)
@@ -3,12 +3,28 @@
 This module provides test file discovery functionality:
 - finder: Locate test files matching patterns
 - parser: Parse test files to extract markers and programs
+- index: Persistent cache of parsed test files
+- expression: Boolean marker/keyword expressions
+- selection: Marker index for selecting tests by expression
 """
 
-from statatest.discovery.finder import discover_tests
+from statatest.discovery.expression import (
+    Expression,
+    ExpressionError,
+    compile_expression,
+)
+from statatest.discovery.finder import dedupe_roots, discover_tests
+from statatest.discovery.index import DiscoveryIndex
 from statatest.discovery.parser import parse_test_file
+from statatest.discovery.selection import MarkerIndex
 
 __all__ = [
+    "DiscoveryIndex",
+    "Expression",
+    "ExpressionError",
+    "MarkerIndex",
+    "compile_expression",
+    "dedupe_roots",
     "discover_tests",
     "parse_test_file",
 ]
@@ -0,0 +1,198 @@
+"""Boolean selection expressions for -m and -k.
+
+Expressions combine names with ``and``, ``or``, ``not`` and parentheses,
+e.g. ``panel and not slow`` or ``merge or reshape``. They are compiled once
+into a small syntax tree that is evaluated either as a predicate for a single
+item or, against an inverted index, with set operations over all items.
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Callable
+from collections.abc import Set as AbstractSet
+from dataclasses import dataclass
+from typing import NoReturn
+
+_TOKEN_PATTERN = re.compile(r"\(|\)|[^\s()]+")
+_KEYWORDS = frozenset({"and", "or", "not"})
+
+Lookup = Callable[[str], AbstractSet[int]]
+Matcher = Callable[[str], bool]
+
+
+class ExpressionError(ValueError):
+    """Raised when a selection expression cannot be parsed."""
+
+
+@dataclass(frozen=True, slots=True)
+class Name:
+    """A name leaf, e.g. a marker or keyword."""
+
+    value: str
+
+    def evaluate(self, matches: Matcher) -> bool:
+        return matches(self.value)
+
+    def select(
+        self,
+        lookup: Lookup,
+        universe: AbstractSet[int],  # noqa: ARG002 - same signature as other nodes
+    ) -> AbstractSet[int]:
+        return lookup(self.value)
+
+
+@dataclass(frozen=True, slots=True)
+class Not:
+    """Negation of an operand."""
+
+    operand: Node
+
+    def evaluate(self, matches: Matcher) -> bool:
+        return not self.operand.evaluate(matches)
+
+    def select(self, lookup: Lookup, universe: AbstractSet[int]) -> AbstractSet[int]:
+        return universe - self.operand.select(lookup, universe)
+
+
+@dataclass(frozen=True, slots=True)
+class And:
+    """Conjunction of two operands."""
+
+    left: Node
+    right: Node
+
+    def evaluate(self, matches: Matcher) -> bool:
+        return self.left.evaluate(matches) and self.right.evaluate(matches)
+
+    def select(self, lookup: Lookup, universe: AbstractSet[int]) -> AbstractSet[int]:
+        return self.left.select(lookup, universe) & self.right.select(lookup, universe)
+
+
+@dataclass(frozen=True, slots=True)
+class Or:
+    """Disjunction of two operands."""
+
+    left: Node
+    right: Node
+
+    def evaluate(self, matches: Matcher) -> bool:
+        return self.left.evaluate(matches) or self.right.evaluate(matches)
+
+    def select(self, lookup: Lookup, universe: AbstractSet[int]) -> AbstractSet[int]:
+        return self.left.select(lookup, universe) | self.right.select(lookup, universe)
+
+
+Node = Name | Not | And | Or
+
+
+@dataclass(frozen=True, slots=True)
+class Expression:
+    """A compiled selection expression.
+
+    Attributes:
+        text: The original expression text.
+        tree: Root node of the parsed syntax tree.
+    """
+
+    text: str
+    tree: Node
+
+    def evaluate(self, matches: Matcher) -> bool:
+        """Evaluate the expression for a single item.
+
+        Args:
+            matches: Returns whether the item matches a name.
+
+        Returns:
+            True if the item is selected.
+        """
+        return self.tree.evaluate(matches)
+
+    def select(self, lookup: Lookup, universe: AbstractSet[int]) -> AbstractSet[int]:
+        """Evaluate the expression for all items at once with set operations.
+
+        Args:
+            lookup: Returns the ids of all items matching a name.
+            universe: Ids of all items, used to complement ``not`` operands.
+
+        Returns:
+            Ids of the selected items.
+        """
+        return self.tree.select(lookup, universe)
+
+
+def compile_expression(text: str) -> Expression:
+    """Parse a selection expression.
+
+    ``not`` binds tighter than ``and``, which binds tighter than ``or``::
+
+        expr     := and_expr ("or" and_expr)*
+        and_expr := not_expr ("and" not_expr)*
+        not_expr := "not" not_expr | "(" expr ")" | NAME
+
+    Args:
+        text: Expression text, e.g. "panel and not slow".
+
+    Returns:
+        Compiled Expression.
+
+    Raises:
+        ExpressionError: If the expression is empty or malformed.
+    """
+    return Expression(text=text, tree=_Parser(text).parse())
+
+
+class _Parser:
+    """Recursive-descent parser over expression tokens."""
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.tokens = _TOKEN_PATTERN.findall(text)
+        self.pos = 0
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            self._fail("empty expression")
+        tree = self._or_expr()
+        if self.pos < len(self.tokens):
+            self._fail(f"unexpected {self.tokens[self.pos]!r}")
+        return tree
+
+    def _accept(self, token: str) -> bool:
+        if self.pos < len(self.tokens) and self.tokens[self.pos] == token:
+            self.pos += 1
+            return True
+        return False
+
+    def _or_expr(self) -> Node:
+        node = self._and_expr()
+        while self._accept("or"):
+            node = Or(node, self._and_expr())
+        return node
+
+    def _and_expr(self) -> Node:
+        node = self._not_expr()
+        while self._accept("and"):
+            node = And(node, self._not_expr())
+        return node
+
+    def _not_expr(self) -> Node:
+        if self._accept("not"):
+            return Not(self._not_expr())
+        if self._accept("("):
+            node = self._or_expr()
+            if not self._accept(")"):
+                self._fail("missing ')'")
+            return node
+        if self.pos >= len(self.tokens):
+            self._fail("unexpected end of expression")
+        word: str = self.tokens[self.pos]
+        if word in _KEYWORDS or word == ")":
+            self._fail(f"unexpected {word!r}")
+        self.pos += 1
+        return Name(word)
+
+    def _fail(self, reason: str) -> NoReturn:
+        msg = f"Invalid expression {self.text!r}: {reason}"
+        raise ExpressionError(msg)
@@ -5,127 +5,185 @@ This module provides functionality to locate test files in a project.
 
 from __future__ import annotations
 
+import os
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from fnmatch import fnmatch
 from pathlib import Path
 
 from statatest.core.config import Config
 from statatest.core.models import TestFile
+from statatest.discovery.expression import compile_expression
+from statatest.discovery.index import DiscoveryIndex
 from statatest.discovery.parser import parse_test_file
+from statatest.discovery.selection import MarkerIndex
+from statatest.discovery.walker import file_key, walk_files
 
 
 def discover_tests(
-    path: Path,
+    path: Path | Sequence[Path],
     config: Config,
     marker: str | None = None,
     keyword: str | None = None,
+    index: DiscoveryIndex | None = None,
 ) -> list[TestFile]:
     """Discover test files matching configuration patterns.
 
     Args:
-        path: Path to search for tests (file or directory).
+        path: Path to search for tests (file or directory), or several such
+            paths. Roots nested inside another root are collected once, and
+            the roots are walked concurrently.
         config: Configuration object with test file patterns.
-        marker: Optional marker to filter tests (e.g., "unit", "integration").
-        keyword: Optional keyword to filter test files by name.
+        marker: Optional marker expression to filter tests (e.g., "unit",
+            "panel and not slow").
+        keyword: Optional keyword expression matched against file names
+            (e.g., "merge or reshape").
+        index: Optional discovery index. Files whose mtime and size match the
+            index are not parsed again; newly parsed files are added to it.
+            The caller is responsible for saving the index.
 
     Returns:
         List of TestFile objects representing discovered tests, sorted by path.
+
+    Raises:
+        ExpressionError: If marker or keyword is not a valid expression.
     """
-    test_files: list[TestFile] = []
+    # Compile filters first so that malformed expressions fail before walking
+    marker_expr = compile_expression(marker) if marker else None
+    keyword_expr = compile_expression(keyword) if keyword else None
 
-    if path.is_file():
-        test_files = _discover_single_file(path, config, marker, keyword)
-    else:
-        test_files = _discover_directory(path, config, marker, keyword)
+    if index is None:
+        index = DiscoveryIndex()
+
+    roots = [path] if isinstance(path, Path) else dedupe_roots(path)
+    test_files = _parse_many(_collect_candidates(roots, config), index)
 
     # Sort by path for consistent ordering
     test_files.sort(key=lambda t: t.path)
-    return test_files
+    if marker_expr is None and keyword_expr is None:
+        return test_files
+    return MarkerIndex.build(test_files).select(marker_expr, keyword_expr)
 
 
-def _discover_single_file(
-    path: Path,
-    config: Config,
-    marker: str | None,
-    keyword: str | None,
-) -> list[TestFile]:
-    """Discover tests from a single file.
+def dedupe_roots(paths: Sequence[Path]) -> list[Path]:
+    """Remove duplicate roots and roots nested inside another root.
 
     Args:
-        path: Path to the test file.
-        config: Configuration object.
-        marker: Optional marker filter.
-        keyword: Optional keyword filter.
+        paths: Test paths (files or directories), in priority order.
 
     Returns:
-        List containing the TestFile if it matches filters, empty otherwise.
+        Paths that are neither duplicates of nor nested inside another path,
+        in input order.
     """
-    if not _is_test_file(path, config.test_files):
-        return []
+    kept: list[tuple[Path, str]] = []
+    for path in paths:
+        abs_path = os.path.abspath(path)  # noqa: PTH100
+        if any(_is_within(abs_path, other) for _, other in kept):
+            continue
+        kept = [(p, a) for p, a in kept if not _is_within(a, abs_path)]
+        kept.append((path, abs_path))
+    return [path for path, _ in kept]
+
 
-    test_file = parse_test_file(path)
-    if _matches_filters(test_file, marker, keyword):
-        return [test_file]
-    return []
+def _is_within(path: str, root: str) -> bool:
+    """Check whether an absolute path equals or lies inside another."""
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
 
 
-def _discover_directory(
-    path: Path,
+def _collect_candidates(
+    roots: list[Path],
     config: Config,
-    marker: str | None,
-    keyword: str | None,
-) -> list[TestFile]:
-    """Discover tests from a directory recursively.
+) -> list[tuple[Path, os.stat_result]]:
+    """Find candidate test files under all roots.
+
+    Directory roots are walked concurrently. Files reachable from several
+    roots are returned once.
 
     Args:
-        path: Path to the directory.
+        roots: Non-overlapping test paths (files or directories).
         config: Configuration object.
-        marker: Optional marker filter.
-        keyword: Optional keyword filter.
 
     Returns:
-        List of TestFile objects found in the directory.
+        List of (path, stat) tuples.
     """
-    test_files: list[TestFile] = []
+    if len(roots) > 1:
+        with ThreadPoolExecutor() as pool:
+            per_root = list(pool.map(lambda r: _candidates_in(r, config), roots))
+    else:
+        per_root = [_candidates_in(root, config) for root in roots]
 
-    for pattern in config.test_files:
-        for file_path in path.rglob(pattern):
-            if file_path.is_file():
-                test_file = parse_test_file(file_path)
-                if _matches_filters(test_file, marker, keyword):
-                    test_files.append(test_file)
+    seen: set[tuple[int, int] | str] = set()
+    candidates: list[tuple[Path, os.stat_result]] = []
+    for found in per_root:
+        for file_path, stat in found:
+            key = file_key(file_path, stat)
+            if key not in seen:
+                seen.add(key)
+                candidates.append((file_path, stat))
+    return candidates
 
-    return test_files
 
-
-def _is_test_file(path: Path, patterns: list[str]) -> bool:
-    """Check if path matches any test file pattern.
+def _candidates_in(root: Path, config: Config) -> list[tuple[Path, os.stat_result]]:
+    """Find candidate test files under a single root.
 
     Args:
-        path: Path to check.
-        patterns: List of glob patterns (e.g., ["test_*.do"]).
+        root: Test file or directory.
+        config: Configuration object.
 
     Returns:
-        True if the path matches any pattern.
+        List of (path, stat) tuples. A file root is included only if it
+        matches the test file patterns.
     """
-    return any(fnmatch(path.name, pattern) for pattern in patterns)
+    if root.is_file():
+        if not _is_test_file(root, config.test_files):
+            return []
+        return [(root, root.stat())]
+    return walk_files(root, config.test_files, config.norecursedirs)
 
 
-def _matches_filters(
-    test_file: TestFile,
-    marker: str | None,
-    keyword: str | None,
-) -> bool:
-    """Check if test file matches the specified filters.
+def _parse_many(
+    candidates: list[tuple[Path, os.stat_result]],
+    index: DiscoveryIndex,
+) -> list[TestFile]:
+    """Parse candidate files, using the index and a thread pool.
+
+    Index lookups and updates happen on the calling thread; only files that
+    are missing from the index or stale are read, in parallel, since parsing
+    is dominated by file I/O.
 
     Args:
-        test_file: TestFile to check.
-        marker: Marker that must be present (case-insensitive).
-        keyword: Keyword that must be in the filename (case-insensitive).
+        candidates: (path, stat) tuples of files to parse.
+        index: Discovery index to consult and update.
 
     Returns:
-        True if the test file matches all specified filters.
+        TestFile objects in the same order as candidates.
     """
-    if marker and marker.lower() not in test_file.markers:
-        return False
+    test_files: list[TestFile | None] = [
+        index.lookup(file_path, stat) for file_path, stat in candidates
+    ]
+    stale = [i for i, test_file in enumerate(test_files) if test_file is None]
+
+    if len(stale) > 1:
+        with ThreadPoolExecutor() as pool:
+            parsed = list(pool.map(parse_test_file, (candidates[i][0] for i in stale)))
+    else:
+        parsed = [parse_test_file(candidates[i][0]) for i in stale]
+
+    for i, test_file in zip(stale, parsed, strict=True):
+        index.store(test_file, candidates[i][1])
+        test_files[i] = test_file
+
+    return [t for t in test_files if t is not None]
+
+
+def _is_test_file(path: Path, patterns: list[str]) -> bool:
+    """Check if path matches any test file pattern.
 
-    return not (keyword and keyword.lower() not in test_file.name.lower())
+    Args:
+        path: Path to check.
+        patterns: List of glob patterns (e.g., ["test_*.do"]).
+
+    Returns:
+        True if the path matches any pattern.
+    """
+    return any(fnmatch(path.name, pattern) for pattern in patterns)
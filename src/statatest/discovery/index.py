@@ -0,0 +1,247 @@
+"""Persistent discovery index for statatest.
+
+Parsing a test file means reading it in full and regex-scanning it, which is
+slow on network-mounted projects with thousands of test files. This module
+keeps the parsed TestFile metadata in .statatest/discovery-index.json, keyed
+by absolute path and validated by file mtime and size, so that only files that
+changed since the previous run are parsed again. Entries of files that were
+deleted or renamed are dropped when the index is saved.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from statatest.core.constants import (
+    DISCOVERY_INDEX_FILENAME,
+    DISCOVERY_INDEX_VERSION,
+    STATATEST_DIR,
+)
+from statatest.core.logging import get_logger
+from statatest.core.models import TestFile
+
+logger = get_logger(__name__)
+
+
+@dataclass(slots=True)
+class IndexEntry:
+    """Cached metadata for a single test file.
+
+    Attributes:
+        mtime_ns: File modification time (nanoseconds) when it was parsed.
+        size: File size in bytes when it was parsed.
+        markers: Markers extracted from the file.
+        programs: Test program names defined in the file.
+        fixtures: Fixture names the file requests.
+    """
+
+    mtime_ns: int
+    size: int
+    markers: list[str] = field(default_factory=list)
+    programs: list[str] = field(default_factory=list)
+    fixtures: list[str] = field(default_factory=list)
+
+
+@dataclass
+class DiscoveryIndex:
+    """Index of parsed test files, persisted between runs.
+
+    Attributes:
+        path: Location of the index file. None keeps the index in memory only.
+        entries: Mapping of absolute file paths to cached metadata.
+        durations: Mapping of absolute file paths to the duration (seconds)
+            of their most recent run. Kept separately from entries so that
+            editing a test does not discard its timing history.
+    """
+
+    path: Path | None = None
+    entries: dict[str, IndexEntry] = field(default_factory=dict)
+    durations: dict[str, float] = field(default_factory=dict)
+    _dirty: bool = field(default=False, repr=False)
+    _seen: set[str] = field(default_factory=set, repr=False)
+
+    @classmethod
+    def for_project(cls, project_root: Path) -> DiscoveryIndex:
+        """Load the index stored under a project's .statatest directory.
+
+        Args:
+            project_root: Root directory of the project.
+
+        Returns:
+            DiscoveryIndex bound to <project_root>/.statatest/discovery-index.json.
+        """
+        return cls.load(project_root / STATATEST_DIR / DISCOVERY_INDEX_FILENAME)
+
+    @classmethod
+    def load(cls, path: Path) -> DiscoveryIndex:
+        """Load an index from disk.
+
+        A missing, unreadable or outdated index file yields an empty index;
+        the cache is rebuilt transparently on the next save.
+
+        Args:
+            path: Path to the index file.
+
+        Returns:
+            DiscoveryIndex populated from the file, or empty.
+        """
+        index = cls(path=path)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return index
+
+        if not isinstance(data, dict) or data.get("version") != DISCOVERY_INDEX_VERSION:
+            logger.debug("Ignoring discovery index with unknown version: %s", path)
+            return index
+
+        for key, raw in data.get("files", {}).items():
+            with contextlib.suppress(KeyError, TypeError):
+                index.entries[key] = IndexEntry(
+                    mtime_ns=raw["mtime_ns"],
+                    size=raw["size"],
+                    markers=list(raw["markers"]),
+                    programs=list(raw["programs"]),
+                    fixtures=list(raw["fixtures"]),
+                )
+        for key, duration in data.get("durations", {}).items():
+            if isinstance(duration, int | float):
+                index.durations[key] = float(duration)
+        return index
+
+    def lookup(self, path: Path, stat: os.stat_result) -> TestFile | None:
+        """Return the cached TestFile for a path if it is still up to date.
+
+        Args:
+            path: Path to the test file.
+            stat: Current stat result of the file.
+
+        Returns:
+            TestFile rebuilt from the index, or None if missing or stale.
+        """
+        key = _index_key(path)
+        self._seen.add(key)
+        entry = self.entries.get(key)
+        if entry is None or entry.mtime_ns != stat.st_mtime_ns:
+            return None
+        if entry.size != stat.st_size:
+            return None
+        return TestFile(
+            path=path,
+            markers=list(entry.markers),
+            programs=list(entry.programs),
+            fixtures=list(entry.fixtures),
+        )
+
+    def store(self, test_file: TestFile, stat: os.stat_result) -> None:
+        """Record parsed metadata for a test file.
+
+        Args:
+            test_file: Freshly parsed TestFile.
+            stat: Stat result taken before the file was parsed.
+        """
+        key = _index_key(test_file.path)
+        self._seen.add(key)
+        self.entries[key] = IndexEntry(
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            markers=list(test_file.markers),
+            programs=list(test_file.programs),
+            fixtures=list(test_file.fixtures),
+        )
+        self._dirty = True
+
+    def record_duration(self, path: Path, duration: float) -> None:
+        """Record how long a test file took to run.
+
+        Args:
+            path: Path to the test file.
+            duration: Execution time in seconds.
+        """
+        self.durations[_index_key(path)] = round(duration, 3)
+        self._dirty = True
+
+    def predicted_duration(self, path: Path) -> float | None:
+        """Predict how long a test file will take to run.
+
+        Args:
+            path: Path to the test file.
+
+        Returns:
+            Duration of the most recent run in seconds, or None if unknown.
+        """
+        return self.durations.get(_index_key(path))
+
+    def save(self) -> None:
+        """Write the index to disk if it changed.
+
+        Entries and durations of files that were not looked up or stored in
+        this session, and no longer exist, are dropped first. The file is
+        replaced atomically so that concurrent readers never see a partially
+        written index. Write errors are logged and ignored, since the index
+        is only a cache.
+        """
+        if self.path is None:
+            return
+        self._prune()
+        if not self._dirty:
+            return
+
+        data: dict[str, Any] = {
+            "version": DISCOVERY_INDEX_VERSION,
+            "files": {
+                key: {
+                    "mtime_ns": entry.mtime_ns,
+                    "size": entry.size,
+                    "markers": entry.markers,
+                    "programs": entry.programs,
+                    "fixtures": entry.fixtures,
+                }
+                for key, entry in self.entries.items()
+            },
+            "durations": self.durations,
+        }
+
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(json.dumps(data, separators=(",", ":")), "utf-8")
+            tmp_path.replace(self.path)
+        except OSError as e:
+            logger.debug("Could not write discovery index %s: %s", self.path, e)
+            with contextlib.suppress(OSError):
+                tmp_path.unlink()
+            return
+        self._dirty = False
+
+    def _prune(self) -> None:
+        """Drop the records of files that no longer exist.
+
+        Files looked up or stored in this session are known to exist; only
+        the others (outside the session's test paths, or deleted) are
+        checked.
+        """
+        unseen = (set(self.entries) | set(self.durations)) - self._seen
+        stale = [key for key in unseen if not os.path.exists(key)]  # noqa: PTH110
+        for key in stale:
+            self.entries.pop(key, None)
+            self.durations.pop(key, None)
+        if stale:
+            self._dirty = True
+
+
+def _index_key(path: Path) -> str:
+    """Build the index key for a path without touching the filesystem.
+
+    Args:
+        path: Path to a test file.
+
+    Returns:
+        Absolute, normalized path string.
+    """
+    return os.path.abspath(path)  # noqa: PTH100 - avoids resolve() syscalls
@@ -3,6 +3,7 @@
 This module provides functionality to parse test files and extract metadata:
 - Markers (e.g., @marker: unit)
 - Program definitions (e.g., program define test_something)
+- Fixture uses (e.g., @uses_fixture: sample_panel, use_fixture sample_panel)
 """
 
 from __future__ import annotations
@@ -10,16 +11,24 @@ from __future__ import annotations
 import re
 from pathlib import Path
 
-from statatest.core.constants import PATTERN_MARKER, PATTERN_PROGRAM
+from statatest.core.constants import (
+    PATTERN_MARKER,
+    PATTERN_PROGRAM,
+    PATTERN_USE_FIXTURE_CALL,
+    PATTERN_USES_FIXTURE,
+)
 from statatest.core.models import TestFile
 
 # Compiled regex patterns for performance
 _MARKER_PATTERN = re.compile(PATTERN_MARKER, re.IGNORECASE)
 _PROGRAM_PATTERN = re.compile(PATTERN_PROGRAM, re.MULTILINE | re.IGNORECASE)
+_USES_FIXTURE_PATTERN = re.compile(PATTERN_USES_FIXTURE, re.IGNORECASE)
+_USE_FIXTURE_CALL_PATTERN = re.compile(PATTERN_USE_FIXTURE_CALL, re.IGNORECASE)
+_FIXTURE_LIST_SEPARATOR = re.compile(r"\s*,\s*")
 
 
 def parse_test_file(path: Path) -> TestFile:
-    """Parse a test file to extract markers and program definitions.
+    """Parse a test file to extract markers, program definitions and fixtures.
 
     Markers are extracted from comments like:
         // @marker: unit
@@ -29,20 +38,25 @@ def parse_test_file(path: Path) -> TestFile:
         program define test_something
         program test_something
 
+    Fixtures are extracted from:
+        // @uses_fixture: sample_panel, seed
+        use_fixture sample_panel
+
     Args:
         path: Path to the test file.
 
     Returns:
-        TestFile with extracted markers and programs.
+        TestFile with extracted markers, programs and fixtures.
     """
-    content = _read_file_content(path)
+    content = read_file_content(path)
     markers = _extract_markers(content)
     programs = _extract_programs(content)
+    fixtures = extract_fixture_uses(content)
 
-    return TestFile(path=path, markers=markers, programs=programs)
+    return TestFile(path=path, markers=markers, programs=programs, fixtures=fixtures)
 
 
-def _read_file_content(path: Path) -> str:
+def read_file_content(path: Path) -> str:
     """Read file content, handling encoding issues.
 
     Tries UTF-8 first, falls back to Latin-1 for legacy Stata files.
@@ -53,10 +67,48 @@ def _read_file_content(path: Path) -> str:
     Returns:
         File content as string.
     """
+    return read_file_with_encoding(path)[0]
+
+
+def read_file_with_encoding(path: Path) -> tuple[str, str]:
+    """Read file content and report the encoding it was decoded with.
+
+    Like read_file_content; for callers that write a modified copy of the
+    file and must keep its encoding.
+
+    Args:
+        path: Path to the file.
+
+    Returns:
+        Tuple of (content, encoding), the encoding being "utf-8" or "latin-1".
+    """
     try:
-        return path.read_text(encoding="utf-8")
+        return path.read_text(encoding="utf-8"), "utf-8"
     except UnicodeDecodeError:
-        return path.read_text(encoding="latin-1")
+        return path.read_text(encoding="latin-1"), "latin-1"
+
+
+def extract_fixture_uses(content: str) -> list[str]:
+    """Extract fixture requirements from test file content.
+
+    Looks for @uses_fixture comments and use_fixture calls.
+
+    Args:
+        content: File content string.
+
+    Returns:
+        List of fixture names in order of first appearance, without duplicates.
+    """
+    fixtures: dict[str, None] = {}
+
+    for match in _USES_FIXTURE_PATTERN.finditer(content):
+        for name in _FIXTURE_LIST_SEPARATOR.split(match.group(1)):
+            fixtures[name.strip()] = None
+
+    for match in _USE_FIXTURE_CALL_PATTERN.finditer(content):
+        fixtures[match.group(1)] = None
+
+    return list(fixtures)
 
 
 def _extract_markers(content: str) -> list[str]:
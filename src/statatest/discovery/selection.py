@@ -0,0 +1,79 @@
+"""Test selection by marker and keyword expressions.
+
+Collected tests are indexed once by marker (marker -> test ids). Marker
+expressions are then evaluated with set operations on that index instead of
+checking every test file, so selecting subsets of large suites is cheap and
+the same index can be queried repeatedly.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Set as AbstractSet
+from dataclasses import dataclass, field
+
+from statatest.core.models import TestFile
+from statatest.discovery.expression import Expression
+
+
+@dataclass
+class MarkerIndex:
+    """Inverted index of collected tests.
+
+    Attributes:
+        tests: Collected tests; a test's id is its position in this list.
+        by_marker: Mapping of lowercase marker names to test ids.
+    """
+
+    tests: list[TestFile]
+    by_marker: dict[str, frozenset[int]] = field(default_factory=dict)
+    _names: list[str] = field(default_factory=list, repr=False)
+
+    @classmethod
+    def build(cls, tests: list[TestFile]) -> MarkerIndex:
+        """Index tests by marker.
+
+        Args:
+            tests: Collected tests.
+
+        Returns:
+            MarkerIndex over the tests.
+        """
+        by_marker: dict[str, set[int]] = {}
+        for test_id, test in enumerate(tests):
+            for marker in test.markers:
+                by_marker.setdefault(marker.lower(), set()).add(test_id)
+        return cls(
+            tests=tests,
+            by_marker={m: frozenset(ids) for m, ids in by_marker.items()},
+            _names=[t.name.lower() for t in tests],
+        )
+
+    def select(
+        self,
+        marker: Expression | None = None,
+        keyword: Expression | None = None,
+    ) -> list[TestFile]:
+        """Select the tests matching both expressions.
+
+        Args:
+            marker: Marker expression (names are case-insensitive markers).
+            keyword: Keyword expression (names are case-insensitive
+                substrings of the test file name).
+
+        Returns:
+            Selected tests, in index order.
+        """
+        universe = frozenset(range(len(self.tests)))
+        selected: AbstractSet[int] = universe
+        if marker is not None:
+            selected = marker.select(self._marker_ids, universe)
+        if keyword is not None:
+            selected = selected & keyword.select(self._keyword_ids, universe)
+        return [self.tests[i] for i in sorted(selected)]
+
+    def _marker_ids(self, marker: str) -> frozenset[int]:
+        return self.by_marker.get(marker.lower(), frozenset())
+
+    def _keyword_ids(self, keyword: str) -> frozenset[int]:
+        keyword = keyword.lower()
+        return frozenset(i for i, name in enumerate(self._names) if keyword in name)
@@ -0,0 +1,97 @@
+"""Directory walking for test collection and instrumentation.
+
+This module walks a directory tree once with os.scandir, matching every file
+pattern in a single pass and pruning directories listed in norecursedirs
+(e.g. .git, .statatest, large data folders) before entering them.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from fnmatch import translate
+from pathlib import Path
+
+from statatest.core.constants import STATATEST_DIR
+
+
+def compile_patterns(patterns: list[str]) -> re.Pattern[str]:
+    """Compile glob patterns into a single regex matched against names.
+
+    Args:
+        patterns: Glob patterns (e.g., ["test_*.do", "*_test.do"]).
+
+    Returns:
+        Compiled regex that matches a name if any pattern matches it.
+        Matches nothing when no patterns are given.
+    """
+    if not patterns:
+        return re.compile(r"(?!)")
+    return re.compile(
+        "|".join(f"(?:{translate(os.path.normcase(p))})" for p in patterns)
+    )
+
+
+def walk_files(
+    root: Path,
+    patterns: list[str],
+    norecursedirs: list[str],
+) -> list[tuple[Path, os.stat_result]]:
+    """Find files under root whose names match any of the patterns.
+
+    The tree is walked once, regardless of the number of patterns. Directory
+    symlinks are not followed, and files reachable through several names
+    (hard links, file symlinks) are returned once.
+
+    Args:
+        root: Directory to walk.
+        patterns: Glob patterns for file names (e.g., test files, .ado files).
+        norecursedirs: Glob patterns for directory names to skip. The root
+            itself is always walked.
+
+    Returns:
+        List of (path, stat) tuples in walk order.
+    """
+    file_regex = compile_patterns(patterns)
+    skip_regex = compile_patterns([*norecursedirs, STATATEST_DIR])
+
+    found: list[tuple[Path, os.stat_result]] = []
+    seen: set[tuple[int, int] | str] = set()
+    stack: list[str] = [os.fspath(root)]
+
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = os.path.normcase(entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        if not skip_regex.match(name):
+                            stack.append(entry.path)
+                    elif file_regex.match(name) and entry.is_file():
+                        stat = entry.stat()
+                        file_id = file_key(entry.path, stat)
+                        if file_id not in seen:
+                            seen.add(file_id)
+                            found.append((Path(entry.path), stat))
+        except OSError:
+            # Unreadable or vanished directory: skip it like rglob would.
+            continue
+
+    return found
+
+
+def file_key(path: str | Path, stat: os.stat_result) -> tuple[int, int] | str:
+    """Identify a file independently of the name it was reached through.
+
+    Args:
+        path: Path to the file.
+        stat: Stat result of the file.
+
+    Returns:
+        (device, inode) tuple, or the absolute path on filesystems that do
+        not provide inode numbers (st_ino == 0).
+    """
+    if stat.st_ino:
+        return (stat.st_dev, stat.st_ino)
+    return os.path.abspath(path)  # noqa: PTH100
@@ -6,7 +6,7 @@ This module provides test execution functionality:
 - parser: Parse Stata output and logs
 """
 
-from statatest.execution.executor import run_tests
+from statatest.execution.executor import create_conftest_graph, run_tests
 from statatest.execution.models import StataOutput, TestEnvironment
 from statatest.execution.parser import parse_test_output
 from statatest.execution.wrapper import create_wrapper_do
@@ -14,6 +14,7 @@ from statatest.execution.wrapper import create_wrapper_do
 __all__ = [
     "StataOutput",
     "TestEnvironment",
+    "create_conftest_graph",
     "create_wrapper_do",
     "parse_test_output",
     "run_tests",
@@ -13,15 +13,18 @@ import subprocess
 import sys
 import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 from statatest.core.config import Config
 from statatest.core.logging import Colors, colorize
 from statatest.core.models import TestFile, TestResult
+from statatest.coverage.instrument import redirect_do_calls
+from statatest.discovery.parser import read_file_with_encoding
 from statatest.execution.models import StataOutput, TestEnvironment
 from statatest.execution.parser import parse_test_output
 from statatest.execution.wrapper import create_wrapper_do
-from statatest.fixtures import discover_conftest
+from statatest.fixtures import ConftestGraph, discover_conftest
 
 
 def run_tests(
@@ -30,30 +33,46 @@ def run_tests(
     coverage: bool = False,
     verbose: bool = False,
     instrumented_dir: Path | None = None,
+    conftest_graph: ConftestGraph | None = None,
 ) -> list[TestResult]:
     """Run all discovered tests.
 
+    Tests from every test path share one pool of config.workers Stata
+    processes. Results are printed as tests finish and returned in the
+    order of tests.
+
     Args:
         tests: List of test files to execute.
         config: Configuration object.
         coverage: Whether to collect coverage data.
         verbose: Whether to show verbose output.
         instrumented_dir: Path to instrumented source files (for coverage).
+        conftest_graph: Session conftest graph used to find conftest files.
+            Created on demand if not given.
 
     Returns:
         List of TestResult objects.
     """
-    results: list[TestResult] = []
+    if conftest_graph is None:
+        conftest_graph = create_conftest_graph(config)
 
-    for test in tests:
-        if verbose:
-            sys.stdout.write(f"Running: {test.relative_path} ")
-            sys.stdout.flush()
+    if config.workers > 1 and len(tests) > 1:
+        results = _run_parallel(
+            tests, config, coverage, verbose, instrumented_dir, conftest_graph
+        )
+    else:
+        results = []
+        for test in tests:
+            if verbose:
+                sys.stdout.write(f"Running: {test.relative_path} ")
+                sys.stdout.flush()
 
-        result = _run_single_test(test, config, coverage, instrumented_dir)
-        results.append(result)
+            result = _run_single_test(
+                test, config, coverage, instrumented_dir, conftest_graph
+            )
+            results.append(result)
 
-        _print_result(result, verbose)
+            _print_result(result, verbose)
 
     if not verbose:
         sys.stdout.write("\n")  # Newline after dots
@@ -62,11 +81,82 @@ def run_tests(
     return results
 
 
+def create_conftest_graph(config: Config) -> ConftestGraph:
+    """Create the conftest graph for a test session.
+
+    Fixtures are looked up in the directories the wrapper puts on the
+    adopath: statatest's own and the coverage source directories (which are
+    on it through their instrumented copies).
+
+    Args:
+        config: Configuration object (setup_do fixtures are included).
+
+    Returns:
+        ConftestGraph aware of the fixtures known before Stata starts.
+    """
+    fixture_dirs = [
+        *_get_ado_paths().values(),
+        *(Path(p) for p in config.coverage_source),
+    ]
+    return ConftestGraph.build(
+        fixture_dirs=fixture_dirs,
+        setup_do=Path(config.setup_do) if config.setup_do else None,
+    )
+
+
+def _run_parallel(
+    tests: list[TestFile],
+    config: Config,
+    coverage: bool,
+    verbose: bool,
+    instrumented_dir: Path | None,
+    conftest_graph: ConftestGraph,
+) -> list[TestResult]:
+    """Run tests concurrently in a shared pool of Stata processes.
+
+    Each test runs in its own Stata subprocess, so threads only wait on I/O.
+
+    Args:
+        tests: List of test files to execute.
+        config: Configuration object (workers sets the pool size).
+        coverage: Whether to collect coverage data.
+        verbose: Whether to show verbose output.
+        instrumented_dir: Path to instrumented source files (for coverage).
+        conftest_graph: Session conftest graph.
+
+    Returns:
+        List of TestResult objects in the order of tests.
+    """
+    results: dict[int, TestResult] = {}
+
+    with ThreadPoolExecutor(max_workers=config.workers) as pool:
+        futures = {
+            pool.submit(
+                _run_single_test,
+                test,
+                config,
+                coverage,
+                instrumented_dir,
+                conftest_graph,
+            ): position
+            for position, test in enumerate(tests)
+        }
+        for future in as_completed(futures):
+            position = futures[future]
+            results[position] = future.result()
+            if verbose:
+                sys.stdout.write(f"Running: {tests[position].relative_path} ")
+            _print_result(results[position], verbose)
+
+    return [results[position] for position in range(len(tests))]
+
+
 def _run_single_test(
     test: TestFile,
     config: Config,
     coverage: bool = False,
     instrumented_dir: Path | None = None,
+    conftest_graph: ConftestGraph | None = None,
 ) -> TestResult:
     """Execute a single test file.
 
@@ -80,11 +170,13 @@ def _run_single_test(
         config: Configuration object.
         coverage: Whether to collect coverage data.
         instrumented_dir: Path to instrumented source files (for coverage).
+        conftest_graph: Session conftest graph. Without one, conftest files
+            are looked up from scratch.
 
     Returns:
         TestResult with execution details.
     """
-    env = _prepare_environment(test, config, coverage, instrumented_dir)
+    env = _prepare_environment(test, config, coverage, instrumented_dir, conftest_graph)
 
     try:
         output = _execute_stata(test, config, env, coverage)
@@ -117,6 +209,7 @@ def _prepare_environment(
     config: Config,
     coverage: bool,
     instrumented_dir: Path | None,
+    conftest_graph: ConftestGraph | None = None,
 ) -> TestEnvironment:
     """Prepare temporary files for test execution.
 
@@ -125,12 +218,16 @@ def _prepare_environment(
         config: Configuration object.
         coverage: Whether coverage collection is enabled.
         instrumented_dir: Path to instrumented source files.
+        conftest_graph: Session conftest graph, if any.
 
     Returns:
         TestEnvironment with paths to temporary files.
     """
     ado_paths = _get_ado_paths()
-    conftest_files = discover_conftest(test.path.parent)
+    if conftest_graph is not None:
+        conftest_files = conftest_graph.conftest_files(test.path.parent)
+    else:
+        conftest_files = discover_conftest(test.path.parent)
 
     # Create log file first (needed for wrapper when coverage is enabled)
     log_suffix = ".smcl" if coverage else ".log"
@@ -139,15 +236,29 @@ def _prepare_environment(
     ) as log_file:
         log_path = Path(log_file.name)
 
+    # In-memory probes are written to their own file once, after the test
+    counts_path: Path | None = None
+    if coverage and config.coverage_probes == "memory":
+        counts_path = log_path.with_suffix(".cov")
+
     # Use relative path for test file (we run from test.path.parent)
+    test_path = Path(test.path.name)
+    redirected: list[Path] = []
+    if instrumented_dir is not None:
+        test_path = _redirect_do_calls(test.path, redirected) or test_path
+        conftest_files = [
+            _redirect_do_calls(path, redirected) or path for path in conftest_files
+        ]
+
     # Pass log_path when coverage is enabled so wrapper uses `log using`
     wrapper_content = create_wrapper_do(
-        test_path=Path(test.path.name),
+        test_path=test_path,
         ado_paths=ado_paths,
         conftest_files=conftest_files,
         instrumented_dir=instrumented_dir,
         setup_do=config.setup_do,
         log_path=log_path if coverage else None,
+        counts_path=counts_path,
     )
 
     with tempfile.NamedTemporaryFile(
@@ -156,7 +267,40 @@ def _prepare_environment(
         wrapper_file.write(wrapper_content)
         wrapper_path = Path(wrapper_file.name)
 
-    return TestEnvironment(wrapper_path=wrapper_path, log_path=log_path)
+    return TestEnvironment(
+        wrapper_path=wrapper_path,
+        log_path=log_path,
+        counts_path=counts_path,
+        redirected_paths=redirected,
+    )
+
+
+def _redirect_do_calls(path: Path, created: list[Path]) -> Path | None:
+    """Write a copy of a Stata file that runs instrumented .do files.
+
+    The copy keeps the line numbers of the original. Relative paths in it
+    still work, since do and run resolve them against the working directory.
+
+    Like discovery, legacy files that are not UTF-8 are read as Latin-1; the
+    copy is written in the encoding the original was read with.
+
+    Args:
+        path: Test or conftest file.
+        created: List the copy's path is appended to, for cleanup.
+
+    Returns:
+        Path of the copy, or None if the file has no do or run statements.
+    """
+    source, encoding = read_file_with_encoding(path)
+    redirected = redirect_do_calls(source)
+    if redirected == source:
+        return None
+    with tempfile.NamedTemporaryFile(
+        mode="w", suffix=".do", delete=False, encoding=encoding
+    ) as copy:
+        copy.write(redirected)
+    created.append(Path(copy.name))
+    return Path(copy.name)
 
 
 def _execute_stata(
@@ -208,11 +352,17 @@ def _execute_stata(
     except FileNotFoundError:
         log_content = ""
 
+    coverage_counts = ""
+    if env.counts_path is not None:
+        with contextlib.suppress(FileNotFoundError):
+            coverage_counts = env.counts_path.read_text(encoding="utf-8")
+
     return StataOutput(
         returncode=process.returncode,
         log_content=log_content,
         stderr=process.stderr,
         duration=duration,
+        coverage_counts=coverage_counts,
     )
 
 
@@ -222,7 +372,14 @@ def _cleanup_environment(env: TestEnvironment) -> None:
     Args:
         env: Test environment with paths to clean up.
     """
-    for path in [env.log_path, env.wrapper_path]:
+    for path in [
+        env.log_path,
+        env.wrapper_path,
+        env.counts_path,
+        *env.redirected_paths,
+    ]:
+        if path is None:
+            continue
         with contextlib.suppress(FileNotFoundError):
             path.unlink()
 
@@ -231,7 +388,7 @@ def _get_ado_paths() -> dict[str, Path]:
     """Get paths to statatest's built-in .ado files.
 
     Returns:
-        Dictionary with 'assertions' and 'fixtures' paths.
+        Dictionary with 'assertions', 'fixtures' and 'coverage' paths.
     """
     paths: dict[str, Path] = {}
 
@@ -239,7 +396,7 @@ def _get_ado_paths() -> dict[str, Path]:
         files = importlib.resources.files("statatest")
         ado_base = Path(str(files.joinpath("ado")))
         if ado_base.exists():
-            for subdir in ["assertions", "fixtures"]:
+            for subdir in ["assertions", "fixtures", "coverage"]:
                 subpath = ado_base / subdir
                 if subpath.exists():
                     paths[subdir] = subpath
@@ -252,7 +409,7 @@ def _get_ado_paths() -> dict[str, Path]:
     module_dir = Path(__file__).parent.parent
     ado_base = module_dir / "ado"
     if ado_base.exists():
-        for subdir in ["assertions", "fixtures"]:
+        for subdir in ["assertions", "fixtures", "coverage"]:
             subpath = ado_base / subdir
             if subpath.exists():
                 paths[subdir] = subpath
@@ -6,7 +6,7 @@ intermediate state during test execution.
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 
 
@@ -17,10 +17,16 @@ class TestEnvironment:
     Attributes:
         wrapper_path: Path to the generated wrapper .do file.
         log_path: Path to the Stata log file.
+        counts_path: Path of the in-memory coverage counters file, if the
+            "memory" probe mode is used.
+        redirected_paths: Copies of the test and conftest files whose do and
+            run statements were routed to instrumented .do files.
     """
 
     wrapper_path: Path
     log_path: Path
+    counts_path: Path | None = None
+    redirected_paths: list[Path] = field(default_factory=list)
 
 
 @dataclass
@@ -32,9 +38,11 @@ class StataOutput:
         log_content: Content of the log file.
         stderr: Standard error output.
         duration: Execution time in seconds.
+        coverage_counts: Content of the in-memory coverage counters file.
     """
 
     returncode: int
     log_content: str
     stderr: str
     duration: float
+    coverage_counts: str = ""
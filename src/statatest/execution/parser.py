@@ -3,17 +3,19 @@
 This module parses Stata log output to extract:
 - Assertion pass/fail counts
 - Error messages
-- Coverage markers
+- Coverage markers and in-memory coverage counters
 """
 
 from __future__ import annotations
 
 import re
+from collections import Counter
 
 from statatest.core.constants import (
     ERROR_MESSAGE_MAX_LENGTH,
     PATTERN_ASSERTION_FAILED,
     PATTERN_ASSERTION_PASSED,
+    PATTERN_COVERAGE_COUNTER,
     PATTERN_COVERAGE_MARKER,
 )
 from statatest.core.models import TestFile, TestResult
@@ -23,6 +25,7 @@ from statatest.execution.models import StataOutput
 _PASS_PATTERN = re.compile(PATTERN_ASSERTION_PASSED)
 _FAIL_PATTERN = re.compile(PATTERN_ASSERTION_FAILED)
 _COVERAGE_PATTERN = re.compile(PATTERN_COVERAGE_MARKER)
+_COUNTER_PATTERN = re.compile(PATTERN_COVERAGE_COUNTER, re.MULTILINE)
 
 # Error patterns for message extraction
 _ERROR_PATTERNS = (
@@ -59,9 +62,11 @@ def parse_test_output(
     if not passed:
         error_message = extract_error_message(output.log_content, output.stderr)
 
-    coverage_hits: dict[str, set[int]] = {}
+    coverage_hits: dict[str, Counter[int]] = {}
     if coverage:
         coverage_hits = parse_coverage_markers(output.log_content)
+        for file_id, counts in parse_coverage_counts(output.coverage_counts).items():
+            coverage_hits.setdefault(file_id, Counter()).update(counts)
 
     return TestResult(
         test_file=test.relative_path,
@@ -117,24 +122,50 @@ def extract_error_message(log_content: str, stderr: str) -> str:
     return "Test failed (check log for details)"
 
 
-def parse_coverage_markers(smcl_content: str) -> dict[str, set[int]]:
-    """Extract coverage hits from SMCL log file.
+def parse_coverage_markers(smcl_content: str) -> dict[str, Counter[int]]:
+    """Extract coverage hit counts from SMCL log file.
 
     Coverage markers are invisible SMCL comments in the format:
-        {* COV:filename.ado:lineno }
+        {* COV:file_id:lineno }
+
+    A line inside a loop writes one marker per iteration, so the same marker
+    can occur millions of times. Markers are counted as raw (file, line)
+    pairs first, which happens in C, and only the distinct pairs are then
+    grouped by file in Python.
 
     Args:
         smcl_content: Raw SMCL log content.
 
     Returns:
-        Dictionary mapping filenames to sets of line numbers hit.
+        Dictionary mapping file ids (as written in the markers) to counts of
+        how often each line was executed.
     """
-    hits: dict[str, set[int]] = {}
+    pairs = Counter(_COVERAGE_PATTERN.findall(smcl_content))
+
+    hits: dict[str, Counter[int]] = {}
+    for (file_id, lineno), count in pairs.items():
+        counts = hits.get(file_id)
+        if counts is None:
+            counts = hits[file_id] = Counter()
+        counts[int(lineno)] += count
+
+    return hits
+
 
-    for match in _COVERAGE_PATTERN.finditer(smcl_content):
-        filename, lineno = match.group(1), int(match.group(2))
-        if filename not in hits:
-            hits[filename] = set()
-        hits[filename].add(lineno)
+def parse_coverage_counts(content: str) -> dict[str, Counter[int]]:
+    """Parse in-memory coverage counters written after a test.
 
+    Each line holds a counter name and its value, e.g. ``_stc_3_12 57`` for
+    line 12 of file 3 executed 57 times.
+
+    Args:
+        content: Content of the counters file.
+
+    Returns:
+        Dictionary mapping file ids to counts of how often each line was
+        executed.
+    """
+    hits: dict[str, Counter[int]] = {}
+    for file_id, lineno, count in _COUNTER_PATTERN.findall(content):
+        hits.setdefault(file_id, Counter())[int(lineno)] += int(count)
     return hits
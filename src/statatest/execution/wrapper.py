@@ -8,6 +8,12 @@ from __future__ import annotations
 
 from pathlib import Path
 
+from statatest.core.constants import (
+    COVERAGE_COUNTER_PREFIX,
+    DO_REDIRECT_GLOBAL,
+    INSTRUMENTED_DO_DIRNAME,
+)
+
 
 def create_wrapper_do(
     test_path: Path,
@@ -16,6 +22,7 @@ def create_wrapper_do(
     instrumented_dir: Path | None = None,
     setup_do: str | None = None,
     log_path: Path | None = None,
+    counts_path: Path | None = None,
 ) -> str:
     """Create a wrapper .do file for test execution.
 
@@ -27,7 +34,8 @@ def create_wrapper_do(
     5. Run setup_do (if configured)
     6. Load conftest.do files (fixtures and shared setup)
     7. Run the actual test
-    8. Close log
+    8. Write in-memory coverage counters (if counts_path is given)
+    9. Close log
 
     Args:
         test_path: Path to the test file.
@@ -36,6 +44,8 @@ def create_wrapper_do(
         instrumented_dir: Path to instrumented source files (for coverage).
         setup_do: Optional path to a setup.do file for custom initialization.
         log_path: Path to save SMCL log (for coverage marker parsing).
+        counts_path: Path to write in-memory coverage counters to after the
+            test (for the "memory" probe mode).
 
     Returns:
         Contents of the wrapper .do file.
@@ -66,7 +76,10 @@ def create_wrapper_do(
         lines.extend(_generate_conftest_section(conftest_files))
 
     # Test execution
-    lines.extend(_generate_test_section(test_path))
+    if counts_path:
+        lines.extend(_generate_counted_test_section(test_path, counts_path))
+    else:
+        lines.extend(_generate_test_section(test_path))
 
     # Close log
     if log_path:
@@ -112,12 +125,15 @@ def _generate_instrumented_section(instrumented_dir: Path) -> list[str]:
     ensuring instrumented files are found before any user-added paths.
 
     Also uses 'discard' to clear any cached .ado programs, forcing Stata
-    to reload them from the new adopath (instrumented versions).
+    to reload them from the new adopath (instrumented versions), and tells
+    _stt_do where the instrumented .do files are.
     """
+    do_dir = instrumented_dir / INSTRUMENTED_DO_DIRNAME
     return [
         "// Instrumented source files for coverage (highest priority)",
         f'adopath ++ "{instrumented_dir}"',
         "discard  // Clear cached programs to force reload from instrumented path",
+        f'global {DO_REDIRECT_GLOBAL} "{do_dir}"',
         "",
     ]
 
@@ -158,3 +174,27 @@ def _generate_test_section(test_path: Path) -> list[str]:
         f'do "{test_path}"',
         "",
     ]
+
+
+def _generate_counted_test_section(test_path: Path, counts_path: Path) -> list[str]:
+    """Generate section running the test and then writing coverage counters.
+
+    The test runs under capture so that counters are written even when it
+    fails; its return code is then re-raised.
+    """
+    return [
+        "// Execute test",
+        f'capture noisily do "{test_path}"',
+        "local _stt_rc = _rc",
+        "",
+        "// Write in-memory coverage counters",
+        f'local _stt_counters : all globals "{COVERAGE_COUNTER_PREFIX}*"',
+        "tempname _stt_fh",
+        f'file open `_stt_fh\' using "{counts_path}", write text replace',
+        "foreach _stt_c of local _stt_counters {",
+        "    file write `_stt_fh' \"`_stt_c' ${`_stt_c'}\" _n",
+        "}",
+        "file close `_stt_fh'",
+        "if `_stt_rc' exit `_stt_rc'",
+        "",
+    ]
@@ -6,8 +6,10 @@ This module provides:
 - discover_conftest: Find conftest.do files in directory hierarchy
 - parse_conftest: Parse conftest.do to extract fixtures
 - get_test_fixtures: Extract fixture requirements from test files
+- ConftestGraph: Session-wide, memoized conftest tree for fixture lookup
 """
 
+from statatest.fixtures.graph import ConftestGraph
 from statatest.fixtures.manager import (
     Fixture,
     FixtureManager,
@@ -17,6 +19,7 @@ from statatest.fixtures.manager import (
 )
 
 __all__ = [
+    "ConftestGraph",
     "Fixture",
     "FixtureManager",
     "discover_conftest",
@@ -0,0 +1,168 @@
+"""Session-wide conftest tree and fixture lookup.
+
+discover_conftest walks every ancestor directory with an exists() check and
+is called once per test. ConftestGraph instead resolves each directory once
+per session, reusing its parent's chain, and parses each conftest.do once, so
+fixture references can be checked at collection time before Stata starts.
+
+use_fixture resolves fixtures at run time with `capture which`, so a fixture
+may also come from a fixture_<name>.ado on the adopath: statatest's and the
+configured directories are known, and so is the test's own directory (tests
+run from it), but not the user's personal or PLUS directories. Unknown
+fixtures are therefore only reported, not rejected.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from statatest.core.constants import CONFTEST_FILENAME
+from statatest.core.models import TestFile
+from statatest.fixtures.manager import Fixture, parse_conftest
+
+
+@dataclass
+class ConftestGraph:
+    """Conftest files and the fixtures they define, memoized per directory.
+
+    Attributes:
+        builtin_fixtures: Fixtures available to every test (statatest's
+            fixture_*.ado files and fixtures defined in setup_do).
+    """
+
+    builtin_fixtures: dict[str, Fixture] = field(default_factory=dict)
+    _resolved: dict[Path, Path] = field(default_factory=dict, repr=False)
+    _chains: dict[Path, tuple[Path, ...]] = field(default_factory=dict, repr=False)
+    _parsed: dict[Path, list[Fixture]] = field(default_factory=dict, repr=False)
+    _available: dict[Path, dict[str, Fixture]] = field(default_factory=dict, repr=False)
+    _ado_files: dict[Path, frozenset[str]] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def build(
+        cls,
+        fixture_dirs: list[Path] | None = None,
+        setup_do: Path | None = None,
+    ) -> ConftestGraph:
+        """Create a graph with the fixtures available to every test.
+
+        Args:
+            fixture_dirs: Directories on the adopath that may contain
+                fixture_*.ado files. Missing directories are skipped.
+            setup_do: Optional setup script run before each test; fixture_*
+                programs it defines are available everywhere.
+
+        Returns:
+            ConftestGraph with no directories resolved yet.
+        """
+        builtin: dict[str, Fixture] = {}
+        for directory in fixture_dirs or []:
+            for ado_file in sorted(directory.glob("fixture_*.ado")):
+                name = ado_file.stem.removeprefix("fixture_")
+                if not name.endswith("_teardown"):
+                    builtin[name] = Fixture(
+                        name=name, setup_program=ado_file.stem, source_file=ado_file
+                    )
+        if setup_do is not None and setup_do.is_file():
+            builtin.update((f.name, f) for f in parse_conftest(setup_do))
+        return cls(builtin_fixtures=builtin)
+
+    def conftest_files(self, directory: Path) -> list[Path]:
+        """Return the conftest.do files that apply to a directory.
+
+        Args:
+            directory: Directory containing tests.
+
+        Returns:
+            List of conftest.do paths, from root to directory.
+        """
+        return list(self._chain(self._resolve(directory)))
+
+    def fixtures(self, directory: Path) -> dict[str, Fixture]:
+        """Return the fixtures available to tests in a directory.
+
+        Conftest files closer to the directory override outer ones.
+
+        Args:
+            directory: Directory containing tests.
+
+        Returns:
+            Mapping of fixture names to definitions.
+        """
+        directory = self._resolve(directory)
+        available = self._available.get(directory)
+        if available is None:
+            available = dict(self.builtin_fixtures)
+            for conftest in self._chain(directory):
+                available.update((f.name, f) for f in self._parse(conftest))
+            self._available[directory] = available
+        return available
+
+    def missing_fixtures(self, test: TestFile) -> list[str]:
+        """Return the fixtures a test uses that are not defined anywhere known.
+
+        Fixtures defined in the test file itself, or in a fixture_<name>.ado
+        next to it, are accepted; the file is only read again when some name
+        is not otherwise known.
+
+        Args:
+            test: Collected test file.
+
+        Returns:
+            Unknown fixture names, in the order the test uses them.
+        """
+        used = list(test.fixtures)
+        if not used:
+            return []
+        available = self.fixtures(test.path.parent)
+        missing = [name for name in used if name not in available]
+        if missing:
+            local = self._fixture_ado_files(self._resolve(test.path.parent))
+            missing = [name for name in missing if name not in local]
+        if missing:
+            local = frozenset(f.name for f in parse_conftest(test.path))
+            missing = [name for name in missing if name not in local]
+        return missing
+
+    def _resolve(self, directory: Path) -> Path:
+        """Resolve a directory once per session."""
+        resolved = self._resolved.get(directory)
+        if resolved is None:
+            resolved = directory.resolve()
+            self._resolved[directory] = resolved
+        return resolved
+
+    def _chain(self, directory: Path) -> tuple[Path, ...]:
+        """Resolve conftest files for an absolute directory, reusing parents."""
+        chain = self._chains.get(directory)
+        if chain is not None:
+            return chain
+
+        if directory == directory.parent:
+            chain = ()
+        else:
+            chain = self._chain(directory.parent)
+            conftest = directory / CONFTEST_FILENAME
+            if conftest.is_file():
+                chain = (*chain, conftest)
+        self._chains[directory] = chain
+        return chain
+
+    def _fixture_ado_files(self, directory: Path) -> frozenset[str]:
+        """Return the fixture names of a directory's fixture_*.ado files."""
+        names = self._ado_files.get(directory)
+        if names is None:
+            names = frozenset(
+                path.stem.removeprefix("fixture_")
+                for path in directory.glob("fixture_*.ado")
+            )
+            self._ado_files[directory] = names
+        return names
+
+    def _parse(self, conftest: Path) -> list[Fixture]:
+        """Parse a conftest file once per session."""
+        fixtures = self._parsed.get(conftest)
+        if fixtures is None:
+            fixtures = parse_conftest(conftest)
+            self._parsed[conftest] = fixtures
+        return fixtures
@@ -7,9 +7,16 @@ from dataclasses import dataclass, field
 from pathlib import Path
 from typing import TYPE_CHECKING
 
+from statatest.core.constants import CONFTEST_FILENAME, PATTERN_FIXTURE_PROGRAM
+from statatest.discovery.parser import extract_fixture_uses, read_file_content
+
 if TYPE_CHECKING:
     from statatest.core.models import TestFile
 
+_FIXTURE_PROGRAM_PATTERN = re.compile(
+    PATTERN_FIXTURE_PROGRAM, re.IGNORECASE | re.MULTILINE
+)
+
 
 @dataclass(slots=True)
 class Fixture:
@@ -82,7 +89,7 @@ def discover_conftest(test_dir: Path) -> list[Path]:
     # Walk up from test_dir to root
     current = test_dir.resolve()
     while current != current.parent:
-        conftest = current / "conftest.do"
+        conftest = current / CONFTEST_FILENAME
         if conftest.exists():
             conftest_files.append(conftest)
         current = current.parent
@@ -103,16 +110,10 @@ def parse_conftest(conftest_path: Path) -> list[Fixture]:
     Returns:
         List of Fixture objects found
     """
-    content = conftest_path.read_text(encoding="utf-8")
-
-    # Find all fixture_* programs
-    fixture_pattern = re.compile(
-        r"program\s+define\s+fixture_(\w+)",
-        re.IGNORECASE | re.MULTILINE,
-    )
+    content = read_file_content(conftest_path)
 
     # Collect all fixture names (including teardown)
-    all_names = [match.group(1) for match in fixture_pattern.finditer(content)]
+    all_names = [m.group(1) for m in _FIXTURE_PROGRAM_PATTERN.finditer(content)]
 
     # Filter out teardown programs and create fixtures
     fixtures: list[Fixture] = []
@@ -150,26 +151,4 @@ def get_test_fixtures(test: TestFile) -> list[str]:
     Returns:
         List of fixture names required by the test
     """
-    content = test.path.read_text(encoding="utf-8")
-
-    fixtures: set[str] = set()
-
-    # Pattern: // @uses_fixture: name or // @uses_fixture: name1, name2
-    comment_pattern = re.compile(
-        r"//\s*@uses_fixture:\s*(\w+(?:\s*,\s*\w+)*)",
-        re.IGNORECASE,
-    )
-    for match in comment_pattern.finditer(content):
-        names = match.group(1)
-        for name in re.split(r"\s*,\s*", names):
-            fixtures.add(name.strip())
-
-    # Pattern: use_fixture name
-    call_pattern = re.compile(
-        r"use_fixture\s+(\w+)",
-        re.IGNORECASE,
-    )
-    for match in call_pattern.finditer(content):
-        fixtures.add(match.group(1))
-
-    return list(fixtures)
+    return extract_fixture_uses(read_file_content(test.path))
@@ -2,10 +2,33 @@
 
 This module provides report generation functionality:
 - junit: JUnit XML reports for CI systems
+- collection: --collect-only output (text and JSON)
+- timings: --timings phase durations
+- contexts: `statatest coverage who-covers` output
+- coverage: `statatest coverage report` and `coverage diff` output
 """
 
+from statatest.reporting.collection import (
+    CollectedTest,
+    format_collection_json,
+    format_collection_text,
+)
+from statatest.reporting.contexts import format_context_hits
+from statatest.reporting.coverage import (
+    format_coverage_summary,
+    format_patch_coverage,
+)
 from statatest.reporting.junit import write_junit_xml
+from statatest.reporting.timings import Timings, format_timings
 
 __all__ = [
+    "CollectedTest",
+    "Timings",
+    "format_collection_json",
+    "format_collection_text",
+    "format_context_hits",
+    "format_coverage_summary",
+    "format_patch_coverage",
+    "format_timings",
     "write_junit_xml",
 ]
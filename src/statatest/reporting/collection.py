@@ -0,0 +1,111 @@
+"""Collection report generation for --collect-only.
+
+This module renders the planned test session (tests, markers, programs,
+fixture requirements, conftest files and predicted durations) either as
+human-readable lines or as JSON for CI tooling that splits work into shards.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from statatest.core.constants import COLLECTION_FORMAT_VERSION
+from statatest.core.models import TestFile
+
+
+@dataclass
+class CollectedTest:
+    """A test file planned for execution.
+
+    Attributes:
+        test: The discovered test file.
+        conftest_files: conftest.do files that will be loaded, root first.
+        predicted_duration: Expected run time in seconds, or None if unknown.
+    """
+
+    test: TestFile
+    conftest_files: list[Path] = field(default_factory=list)
+    predicted_duration: float | None = None
+
+
+def format_collection_json(
+    collected: list[CollectedTest],
+    collection_time: float,
+) -> str:
+    """Render the collection as a JSON document.
+
+    Args:
+        collected: Planned tests in execution order.
+        collection_time: Time spent collecting, in seconds.
+
+    Returns:
+        JSON string.
+    """
+    data: dict[str, Any] = {
+        "version": COLLECTION_FORMAT_VERSION,
+        "collection_time": round(collection_time, 6),
+        "count": len(collected),
+        "predicted_duration": round(_total_predicted(collected), 3),
+        "tests": [
+            {
+                "path": item.test.relative_path,
+                "markers": item.test.markers,
+                "programs": item.test.programs,
+                "fixtures": item.test.fixtures,
+                "conftest": [_display_path(p) for p in item.conftest_files],
+                "predicted_duration": item.predicted_duration,
+            }
+            for item in collected
+        ],
+    }
+    return json.dumps(data, indent=2)
+
+
+def format_collection_text(
+    collected: list[CollectedTest],
+    collection_time: float,
+) -> list[str]:
+    """Render the collection as human-readable lines.
+
+    Args:
+        collected: Planned tests in execution order.
+        collection_time: Time spent collecting, in seconds.
+
+    Returns:
+        List of output lines.
+    """
+    lines: list[str] = []
+    for item in collected:
+        parts = [item.test.relative_path]
+        if item.test.markers:
+            parts.append(f"[{', '.join(item.test.markers)}]")
+        if item.test.programs:
+            parts.append(f"programs: {', '.join(item.test.programs)}")
+        if item.test.fixtures:
+            parts.append(f"fixtures: {', '.join(item.test.fixtures)}")
+        if item.predicted_duration is not None:
+            parts.append(f"~{item.predicted_duration:.2f}s")
+        lines.append("  ".join(parts))
+
+    lines.append("")
+    lines.append(
+        f"Collected {len(collected)} test file(s) in {collection_time:.3f}s "
+        f"(predicted run time {_total_predicted(collected):.2f}s)"
+    )
+    return lines
+
+
+def _total_predicted(collected: list[CollectedTest]) -> float:
+    """Sum the known predicted durations."""
+    return sum(item.predicted_duration or 0.0 for item in collected)
+
+
+def _display_path(path: Path) -> str:
+    """Return path relative to cwd when possible."""
+    try:
+        return str(path.relative_to(Path.cwd()))
+    except ValueError:
+        return str(path)
@@ -0,0 +1,45 @@
+"""Output of `statatest coverage who-covers`.
+
+This module renders the tests recorded in the coverage context database as
+running a line, or any line of a file.
+"""
+
+from __future__ import annotations
+
+from statatest.coverage.contexts import ContextHit
+
+
+def format_context_hits(hits: list[ContextHit], by_line: bool) -> list[str]:
+    """Render the tests that ran a line or a file.
+
+    Args:
+        hits: Hits sorted by context (see ContextDatabase.who_covers).
+        by_line: Whether a single line was queried. Otherwise hits are
+            summarised per test and file.
+
+    Returns:
+        List of output lines.
+    """
+    rows: list[tuple[str, str, str]] = []
+    if by_line:
+        rows = [
+            (hit.context, f"{hit.path}:{hit.lineno}", f"{hit.count:,} hits")
+            for hit in hits
+        ]
+    else:
+        totals: dict[tuple[str, str], tuple[int, int]] = {}
+        for hit in hits:
+            lines, count = totals.get((hit.context, hit.path), (0, 0))
+            totals[hit.context, hit.path] = (lines + 1, count + hit.count)
+        rows = [
+            (context, path, f"{lines} lines, {count:,} hits")
+            for (context, path), (lines, count) in totals.items()
+        ]
+
+    tests = len({row[0] for row in rows})
+    width = max(len(row[0]) for row in rows)
+    lines_out = [f"Covered by {tests} test(s):"]
+    lines_out.extend(
+        f"  {context:<{width}}  {where}  ({detail})" for context, where, detail in rows
+    )
+    return lines_out
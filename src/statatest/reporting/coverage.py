@@ -0,0 +1,111 @@
+"""Output of `statatest coverage report` and `statatest coverage diff`.
+
+This module renders an aggregated coverage report as a table of files with
+their line (and, when recorded, branch) coverage, and the coverage of changed
+lines with the lines that were missed.
+"""
+
+from __future__ import annotations
+
+from statatest.coverage.diff import PatchCoverage
+from statatest.coverage.models import CoverageReport
+
+
+def format_coverage_summary(coverage: CoverageReport) -> list[str]:
+    """Render per-file and total coverage as a table.
+
+    Args:
+        coverage: Aggregated coverage.
+
+    Returns:
+        List of output lines.
+    """
+    show_branches = coverage.total_branches > 0
+    rows: list[tuple[str, int, int, float, str]] = []
+    for filename, file_cov in sorted(coverage.files.items()):
+        branches = ""
+        if file_cov.branches_found:
+            branches = f"{file_cov.branches_covered}/{file_cov.branches_found}"
+        rows.append(
+            (
+                filename,
+                len(file_cov.lines_total),
+                file_cov.lines_covered,
+                file_cov.coverage_percent,
+                branches,
+            )
+        )
+    total = (
+        "TOTAL",
+        coverage.total_lines,
+        coverage.covered_lines,
+        coverage.coverage_percent,
+        f"{coverage.covered_branches}/{coverage.total_branches}",
+    )
+
+    width = max(len(row[0]) for row in [*rows, total])
+    header = f"{'Name':<{width}}  {'Lines':>7}  {'Hit':>7}  {'Cover':>6}"
+    if show_branches:
+        header += f"  {'Branches':>9}"
+    lines = [header, "-" * len(header)]
+    for i, (name, found, hit, pct, branches) in enumerate([*rows, total]):
+        if i == len(rows):
+            lines.append("-" * len(header))
+        line = f"{name:<{width}}  {found:>7}  {hit:>7}  {pct:>5.1f}%"
+        if show_branches:
+            line += f"  {branches:>9}"
+        lines.append(line)
+    return lines
+
+
+def format_patch_coverage(
+    patch: PatchCoverage,
+    coverage: CoverageReport,
+    baseline: CoverageReport | None = None,
+) -> list[str]:
+    """Render the coverage of changed lines and of the whole project.
+
+    Args:
+        patch: Coverage of changed executable lines.
+        coverage: Coverage of the working tree.
+        baseline: Coverage to compare the total with, if known.
+
+    Returns:
+        List of output lines.
+    """
+    if not patch.total_lines:
+        lines = ["Patch coverage: no executable lines changed"]
+    else:
+        summary = (
+            f"Patch coverage: {patch.covered_lines}/{patch.total_lines} changed "
+            f"lines ({patch.coverage_percent:.1f}%)"
+        )
+        lines = [summary]
+        width = max(len(path) for path in patch.changed)
+        for path, changed in patch.changed.items():
+            covered = len(patch.covered.get(path, ()))
+            line = f"  {path:<{width}}  {covered}/{len(changed)}"
+            missed = patch.missed(path)
+            if missed:
+                line += f"  missed: {_line_ranges(missed)}"
+            lines.append(line)
+
+    total = f"Total coverage: {coverage.coverage_percent:.1f}%"
+    if baseline is not None:
+        delta = coverage.coverage_percent - baseline.coverage_percent
+        total += f" (baseline {baseline.coverage_percent:.1f}%, {delta:+.1f})"
+    lines.append(total)
+    return lines
+
+
+def _line_ranges(linenos: list[int]) -> str:
+    """Format sorted line numbers compactly, e.g. "3, 7-9, 12"."""
+    ranges: list[list[int]] = []
+    for lineno in linenos:
+        if ranges and ranges[-1][1] + 1 == lineno:
+            ranges[-1][1] = lineno
+        else:
+            ranges.append([lineno, lineno])
+    return ", ".join(
+        str(first) if first == last else f"{first}-{last}" for first, last in ranges
+    )
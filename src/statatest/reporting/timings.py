@@ -0,0 +1,74 @@
+"""Session phase timings for --timings.
+
+This module records how long each phase of a test session took (collection,
+instrumentation, execution, reporting) and renders them as a short table.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Timings:
+    """Wall-clock durations of session phases.
+
+    Attributes:
+        phases: Mapping of phase names to seconds, in the order measured.
+        details: Optional extra information per phase (e.g. file counts).
+    """
+
+    phases: dict[str, float] = field(default_factory=dict)
+    details: dict[str, str] = field(default_factory=dict)
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        """Measure the duration of a block and add it to a phase.
+
+        Args:
+            phase: Name of the phase.
+
+        Yields:
+            None.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[phase] = self.phases.get(phase, 0.0) + elapsed
+
+    def note(self, phase: str, detail: str) -> None:
+        """Attach extra information to a phase.
+
+        Args:
+            phase: Name of the phase.
+            detail: Short description, e.g. "312 files, 10532 probes".
+        """
+        self.details[phase] = detail
+
+
+def format_timings(timings: Timings) -> list[str]:
+    """Render phase timings as human-readable lines.
+
+    Args:
+        timings: Recorded timings.
+
+    Returns:
+        List of output lines.
+    """
+    if not timings.phases:
+        return []
+
+    width = max(len(phase) for phase in timings.phases)
+    lines = ["Timings:"]
+    for phase, seconds in timings.phases.items():
+        line = f"  {phase:<{width}}  {seconds:8.3f}s"
+        if phase in timings.details:
+            line += f"  ({timings.details[phase]})"
+        lines.append(line)
+    lines.append(f"  {'total':<{width}}  {sum(timings.phases.values()):8.3f}s")
+    return lines
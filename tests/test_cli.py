@@ -1,5 +1,7 @@
 """Tests for CLI module."""
 
+import json
+import subprocess
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
@@ -7,6 +9,9 @@ from click.testing import CliRunner
 
 from statatest import __version__
 from statatest.cli import main
+from statatest.core.models import TestResult
+from statatest.coverage.data import write_coverage_data
+from statatest.coverage.models import CoverageReport, InstrumentedFile
 
 
 class TestCLIVersion:
@@ -57,17 +62,80 @@ class TestCLIInit:
             assert Path("statatest.toml").read_text() == "existing content"
 
 
+class TestCLICommands:
+    """Tests for routing between running tests and subcommands."""
+
+    def test_help_lists_subcommands(self):
+        """Test that the main help shows both forms and the subcommands."""
+        result = CliRunner().invoke(main, ["--help"], prog_name="statatest")
+
+        assert result.exit_code == 0
+        assert "Usage: statatest [OPTIONS] [PATHS]..." in result.output
+        assert "or: statatest COMMAND [ARGS]..." in result.output
+        assert "coverage  Inspect stored coverage data." in result.output
+
+    @patch("statatest.cli.discover_tests")
+    def test_directory_named_like_subcommand_is_a_path(self, mock_discover):
+        """Test that an existing coverage/ directory is collected as tests."""
+        runner = CliRunner()
+        mock_discover.return_value = []
+
+        with runner.isolated_filesystem():
+            Path("coverage").mkdir()
+
+            result = runner.invoke(main, ["coverage"])
+            assert result.exit_code == 0
+            assert mock_discover.call_args.args[0] == [Path("coverage")]
+
+            result = runner.invoke(main, ["coverage", "combine", "--help"])
+            assert result.exit_code == 0
+            assert "Merge coverage data files" in result.output
+
+
 class TestCLINoPath:
     """Tests for CLI without path argument."""
 
     def test_no_path_shows_usage(self):
-        """Test that no path shows usage message."""
+        """Test that no path and no existing testpaths shows usage message."""
         runner = CliRunner()
-        result = runner.invoke(main, [])
+
+        with runner.isolated_filesystem():
+            result = runner.invoke(main, [])
 
         assert result.exit_code == 1
         assert "Usage: statatest <path>" in result.output
 
+    @patch("statatest.cli.run_tests")
+    @patch("statatest.cli.discover_tests")
+    def test_no_path_collects_configured_testpaths(self, mock_discover, mock_run):
+        """Test that all existing configured testpaths are collected at once."""
+        runner = CliRunner()
+
+        mock_test = MagicMock()
+        mock_test.relative_path = "unit/test_example.do"
+        mock_discover.return_value = [mock_test]
+
+        mock_result = MagicMock()
+        mock_result.passed = True
+        mock_result.duration = 0.1
+        mock_run.return_value = [mock_result]
+
+        with runner.isolated_filesystem():
+            Path("statatest.toml").write_text(
+                'testpaths = ["unit", "integration", "unit/sub", "missing"]\n'
+            )
+            Path("unit/sub").mkdir(parents=True)
+            Path("integration").mkdir()
+
+            result = runner.invoke(main, [])
+
+        assert result.exit_code == 0
+        mock_discover.assert_called_once()
+        roots = mock_discover.call_args.args[0]
+        assert roots == [Path("unit"), Path("integration")]
+        # One shared execution for all roots
+        mock_run.assert_called_once()
+
 
 class TestCLINoTestsFound:
     """Tests for CLI when no tests are found."""
@@ -219,7 +287,10 @@ class TestCLICoverage:
         mock_run.return_value = [mock_result]
 
         # Mock instrumentation
-        mock_setup.return_value = (Path(".statatest/instrumented"), {"file.ado": {}})
+        mock_setup.return_value = (
+            Path(".statatest/instrumented"),
+            {1: InstrumentedFile(file_id=1, path="code/file.ado")},
+        )
 
         with runner.isolated_filesystem():
             Path("tests").mkdir()
@@ -239,7 +310,255 @@ source = ["code"]
 
             assert result.exit_code == 0
             mock_setup.assert_called_once()
-            mock_cleanup.assert_called_once()
+            # Instrumented files are kept for the next run
+            mock_cleanup.assert_not_called()
+
+    @patch("statatest.cli.setup_instrumented_environment")
+    @patch("statatest.cli.run_tests")
+    @patch("statatest.cli.discover_tests")
+    def test_timings_reports_phases(self, mock_discover, mock_run, mock_setup):
+        """Test that --timings prints per-phase durations."""
+        runner = CliRunner()
+
+        mock_test = MagicMock()
+        mock_test.relative_path = "test_example.do"
+        mock_discover.return_value = [mock_test]
+
+        mock_result = MagicMock()
+        mock_result.passed = True
+        mock_result.duration = 0.1
+        mock_run.return_value = [mock_result]
+        mock_setup.return_value = (
+            Path(".statatest/instrumented"),
+            {
+                1: InstrumentedFile(1, "code/a.ado", {2: 1, 4: 2}),
+                2: InstrumentedFile(2, "code/b.ado", {2: 1}),
+            },
+        )
+
+        with runner.isolated_filesystem():
+            Path("tests").mkdir()
+            Path("code").mkdir()
+            Path("statatest.toml").write_text(
+                '[tool.statatest.coverage]\nsource = ["code"]\n'
+            )
+
+            result = runner.invoke(main, ["--coverage", "--timings", "tests"])
+
+        assert result.exit_code == 0
+        assert "Timings:" in result.output
+        for phase in ("collection", "instrumentation", "execution", "total"):
+            assert phase in result.output
+        assert "2 files, 3 probes" in result.output
+
+    @patch("statatest.cli.run_tests")
+    @patch("statatest.cli.discover_tests")
+    def test_cache_clear_removes_cached_state(self, mock_discover, mock_run):
+        """Test that --cache-clear removes the instrumented files first."""
+        runner = CliRunner()
+        mock_discover.return_value = []
+
+        with runner.isolated_filesystem():
+            Path("tests").mkdir()
+            Path(".statatest/instrumented").mkdir(parents=True)
+            Path(".statatest/instrumented/stale.ado").write_text("stale")
+
+            result = runner.invoke(main, ["--cache-clear", "tests"])
+
+            assert result.exit_code == 0
+            assert not Path(".statatest/instrumented").exists()
+
+
+class TestCLICoverageContexts:
+    """Tests for --cov-context and `statatest coverage who-covers`."""
+
+    @patch("statatest.cli.setup_instrumented_environment")
+    @patch("statatest.cli.run_tests")
+    @patch("statatest.cli.discover_tests")
+    def test_records_and_queries_contexts(self, mock_discover, mock_run, mock_setup):
+        """Test that recorded contexts answer which tests ran a line."""
+        runner = CliRunner()
+
+        mock_test = MagicMock()
+        mock_test.relative_path = "tests/test_example.do"
+        mock_discover.return_value = [mock_test]
+        mock_run.return_value = [
+            TestResult(
+                "tests/test_example.do", True, 0.1, coverage_hits={"1": {120: 4}}
+            )
+        ]
+        mock_setup.return_value = (
+            Path(".statatest/instrumented"),
+            {1: InstrumentedFile(file_id=1, path="code/myreg.ado")},
+        )
+
+        with runner.isolated_filesystem():
+            Path("tests").mkdir()
+            Path("statatest.toml").write_text(
+                '[tool.statatest.coverage]\nsource = ["code"]\n'
+            )
+
+            result = runner.invoke(main, ["-c", "--cov-context", "test", "tests"])
+            assert result.exit_code == 0
+            assert "Coverage contexts (1 lines)" in result.output
+
+            result = runner.invoke(main, ["coverage", "who-covers", "myreg.ado:120"])
+            assert result.exit_code == 0
+            assert "tests/test_example.do  code/myreg.ado:120  (4 hits)" in (
+                result.output
+            )
+
+            result = runner.invoke(main, ["coverage", "who-covers", "myreg.ado:7"])
+            assert result.exit_code == 1
+            assert "No recorded test covers myreg.ado:7" in result.output
+
+
+class TestCLICoverageData:
+    """Tests for --cov-data and `statatest coverage combine/report`."""
+
+    @patch("statatest.cli.setup_instrumented_environment")
+    @patch("statatest.cli.run_tests")
+    @patch("statatest.cli.discover_tests")
+    def test_combine_and_report_shards(self, mock_discover, mock_run, mock_setup):
+        """Test that shard data files combine into one report."""
+        runner = CliRunner()
+
+        mock_test = MagicMock()
+        mock_test.relative_path = "tests/test_example.do"
+        mock_discover.return_value = [mock_test]
+        mock_setup.return_value = (
+            Path(".statatest/instrumented"),
+            {1: InstrumentedFile(file_id=1, path="code/myreg.ado")},
+        )
+
+        with runner.isolated_filesystem():
+            Path("tests").mkdir()
+            Path("statatest.toml").write_text(
+                '[tool.statatest.coverage]\nsource = ["code"]\n'
+            )
+            for shard, hits in (("1", {3: 1}), ("2", {3: 2, 4: 1})):
+                mock_run.return_value = [
+                    TestResult(
+                        "tests/test_example.do", True, 0.1, coverage_hits={"1": hits}
+                    )
+                ]
+                args = ["-c", "--cov-data", f"shard-{shard}.stcov", "tests"]
+                result = runner.invoke(main, args)
+                assert result.exit_code == 0
+                assert f"Coverage data written to: shard-{shard}.stcov" in (
+                    result.output
+                )
+
+            args = ["coverage", "combine", "shard-1.stcov", "shard-2.stcov"]
+            result = runner.invoke(main, [*args, "-o", "all.stcov"])
+            assert result.exit_code == 0
+
+            result = runner.invoke(main, ["coverage", "report", "all.stcov"])
+            assert result.exit_code == 0
+            assert "code/myreg.ado" in result.output
+
+            args = ["coverage", "report", "all.stcov", "-r", "lcov"]
+            result = runner.invoke(main, args)
+            assert result.exit_code == 0
+            lcov = Path("coverage.lcov").read_text()
+            assert "DA:3,3" in lcov
+            assert "DA:4,1" in lcov
+
+            args = ["coverage", "report", "all.stcov", "-r", "xml"]
+            result = runner.invoke(main, args)
+            assert result.exit_code == 0
+            assert '<line number="3" hits="3"' in Path("coverage.xml").read_text()
+
+    def test_report_without_data(self):
+        """Test that `coverage report` fails when no run wrote data."""
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            result = runner.invoke(main, ["coverage", "report"])
+            assert result.exit_code == 1
+            assert "No coverage data found" in result.output
+
+
+class TestCLICoverageDiff:
+    """Tests for `statatest coverage diff`."""
+
+    def _git(self, *args: str) -> None:
+        subprocess.run(  # noqa: S603
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],  # noqa: S607
+            check=True,
+            capture_output=True,
+        )
+
+    def _coverage(self, total: range, hit: range) -> CoverageReport:
+        report = CoverageReport()
+        report.set_total_lines("myreg.ado", set(total))
+        for lineno in hit:
+            report.add_hit("myreg.ado", lineno)
+        return report
+
+    def test_patch_coverage_of_uncommitted_lines(self):
+        """Test that changed lines are checked against the stored coverage."""
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            self._git("init", "-q")
+            Path("myreg.ado").write_text("a\nb\nc\n")
+            self._git("add", "myreg.ado")
+            self._git("commit", "-q", "-m", "init")
+            Path("myreg.ado").write_text("a\nb\nc\nd\ne\n")
+            write_coverage_data(
+                self._coverage(range(1, 4), range(1, 4)), Path("b.stcov")
+            )
+            write_coverage_data(
+                self._coverage(range(1, 6), range(1, 5)),
+                Path(".statatest/coverage.stcov"),
+            )
+
+            result = runner.invoke(main, ["coverage", "diff", "--base", "b.stcov"])
+            assert result.exit_code == 0
+            assert "Patch coverage: 1/2 changed lines (50.0%)" in result.output
+            assert "myreg.ado  1/2  missed: 5" in result.output
+            assert "Total coverage: 80.0% (baseline 100.0%, -20.0)" in result.output
+
+            args = ["coverage", "diff", "--fail-under-patch", "60"]
+            result = runner.invoke(main, args)
+            assert result.exit_code == 1
+            assert "Patch coverage is below 60%" in result.output
+
+    def test_untracked_and_quoted_files_are_changed(self):
+        """Test that new untracked files and quoted paths count as changed."""
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            self._git("init", "-q")
+            Path("dir with space").mkdir()
+            Path("dir with space/café.ado").write_text("a\n")
+            self._git("add", ".")
+            self._git("commit", "-q", "-m", "init")
+            Path("dir with space/café.ado").write_text("a\nb\n")
+            Path("new.ado").write_text("a\nb\n")
+            report = CoverageReport()
+            report.set_total_lines("dir with space/café.ado", {1, 2})
+            report.set_total_lines("new.ado", {1, 2})
+            report.add_hit("new.ado", 1)
+            write_coverage_data(report, Path(".statatest/coverage.stcov"))
+
+            result = runner.invoke(main, ["coverage", "diff"])
+
+            assert result.exit_code == 0
+            assert "Patch coverage: 1/3 changed lines (33.3%)" in result.output
+            rows = [line.split() for line in result.output.splitlines()]
+            assert ["dir", "with", "space/café.ado", "0/1", "missed:", "2"] in rows
+            assert ["new.ado", "1/2", "missed:", "2"] in rows
+
+    def test_unknown_revision(self):
+        """Test that a failing git diff is reported."""
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            self._git("init", "-q")
+            write_coverage_data(CoverageReport(), Path("c.stcov"))
+
+            args = ["coverage", "diff", "c.stcov", "--base", "no-such-ref"]
+            result = runner.invoke(main, args)
+            assert result.exit_code == 1
+            assert "git diff no-such-ref failed" in result.output
 
 
 class TestCLIVerbose:
@@ -307,3 +626,183 @@ class TestCLIFilters:
             # Check keyword was passed
             call_args = mock_discover.call_args
             assert call_args.kwargs.get("keyword") == "integration"
+
+    def test_invalid_marker_expression_fails(self):
+        """Test that a malformed -m expression exits with an error."""
+        runner = CliRunner()
+
+        with runner.isolated_filesystem():
+            Path("tests").mkdir()
+
+            result = runner.invoke(main, ["-m", "unit and (slow", "tests"])
+
+            assert result.exit_code == 1
+            assert "Invalid expression" in result.output
+
+
+class TestCLIFixtureValidation:
+    """Tests for collection-time fixture validation."""
+
+    @patch("statatest.cli.run_tests")
+    def test_unknown_fixture_is_reported(self, mock_run):
+        """Test that a misspelled fixture is reported before running Stata."""
+        runner = CliRunner()
+
+        mock_result = MagicMock()
+        mock_result.passed = False
+        mock_result.duration = 0.1
+        mock_run.return_value = [mock_result]
+
+        with runner.isolated_filesystem():
+            Path("tests").mkdir()
+            Path("tests/conftest.do").write_text(
+                "program define fixture_sample_data\nend\n"
+            )
+            Path("tests/test_a.do").write_text(
+                "program define test_a\n    use_fixture sample_dta\nend\n"
+            )
+
+            result = runner.invoke(main, ["tests"])
+
+        assert "unknown fixture(s): sample_dta" in result.output
+        assert result.output.index("sample_dta") < result.output.index("Found 1")
+        mock_run.assert_called_once()
+
+    @patch("statatest.cli.run_tests")
+    def test_adopath_fixtures_are_accepted(self, mock_run):
+        """Test that fixture_*.ado files on the adopath or next to tests pass."""
+        runner = CliRunner()
+
+        mock_result = MagicMock()
+        mock_result.passed = True
+        mock_result.duration = 0.1
+        mock_run.return_value = [mock_result]
+
+        with runner.isolated_filesystem():
+            Path("code").mkdir()
+            Path("code/fixture_foo.ado").write_text("program define fixture_foo\nend\n")
+            Path("statatest.toml").write_text(
+                '[tool.statatest.coverage]\nsource = ["code"]\n'
+            )
+            Path("tests").mkdir()
+            Path("tests/fixture_bar.ado").write_text(
+                "program define fixture_bar\nend\n"
+            )
+            Path("tests/test_a.do").write_text("// @uses_fixture: foo, bar\n")
+
+            result = runner.invoke(main, ["tests"])
+
+        assert result.exit_code == 0
+        assert "unknown fixture" not in result.output
+
+    @patch("statatest.cli.run_tests")
+    def test_known_fixtures_are_accepted(self, mock_run):
+        """Test that conftest and built-in fixtures pass validation."""
+        runner = CliRunner()
+
+        mock_result = MagicMock()
+        mock_result.passed = True
+        mock_result.duration = 0.1
+        mock_run.return_value = [mock_result]
+
+        with runner.isolated_filesystem():
+            Path("tests").mkdir()
+            Path("tests/conftest.do").write_text(
+                "program define fixture_sample_data\nend\n"
+            )
+            Path("tests/test_a.do").write_text(
+                "// @uses_fixture: sample_data, balanced_panel\n"
+            )
+
+            result = runner.invoke(main, ["tests"])
+
+        assert result.exit_code == 0
+        assert mock_run.call_args.kwargs["conftest_graph"] is not None
+
+
+class TestCLICollectOnly:
+    """Tests for --collect-only and --json options."""
+
+    def _write_tests(self):
+        Path("tests").mkdir()
+        Path("tests/conftest.do").write_text("program define fixture_seed\nend\n")
+        Path("tests/test_alpha.do").write_text(
+            "// @marker: unit\n// @uses_fixture: seed\nprogram define test_alpha\nend\n"
+        )
+        Path("tests/test_beta.do").write_text("program define test_beta\nend\n")
+
+    @patch("statatest.cli.run_tests")
+    def test_collect_only_does_not_run_tests(self, mock_run):
+        """Test that --collect-only lists tests without running Stata."""
+        runner = CliRunner()
+
+        with runner.isolated_filesystem():
+            self._write_tests()
+
+            result = runner.invoke(main, ["--collect-only", "tests"])
+
+            assert result.exit_code == 0
+            mock_run.assert_not_called()
+            assert "test_alpha.do" in result.output
+            assert "[unit]" in result.output
+            assert "fixtures: seed" in result.output
+            assert "Collected 2 test file(s)" in result.output
+
+    @patch("statatest.cli.run_tests")
+    def test_collect_only_json(self, mock_run):
+        """Test that --collect-only --json emits a parseable plan."""
+        runner = CliRunner()
+
+        with runner.isolated_filesystem():
+            self._write_tests()
+
+            result = runner.invoke(main, ["--collect-only", "--json", "tests"])
+
+            assert result.exit_code == 0
+            mock_run.assert_not_called()
+            data = json.loads(result.output)
+            assert data["count"] == 2
+            assert data["collection_time"] >= 0
+            alpha = next(t for t in data["tests"] if t["path"].endswith("alpha.do"))
+            assert alpha["markers"] == ["unit"]
+            assert alpha["programs"] == ["test_alpha"]
+            assert alpha["fixtures"] == ["seed"]
+            assert alpha["conftest"][-1].endswith("conftest.do")
+            assert alpha["predicted_duration"] is None
+
+    @patch("statatest.cli.run_tests")
+    def test_collect_only_predicts_from_previous_run(self, mock_run):
+        """Test that durations of a previous run become predictions."""
+        runner = CliRunner()
+
+        # Durations are matched to tests by file, whatever the result order
+        mock_run.return_value = [
+            TestResult(str(Path("tests/test_beta.do")), True, 0.5),
+            TestResult(str(Path("tests/test_alpha.do")), True, 1.25),
+        ]
+
+        with runner.isolated_filesystem():
+            self._write_tests()
+
+            runner.invoke(main, ["tests"])
+            result = runner.invoke(main, ["--collect-only", "--json", "tests"])
+
+            data = json.loads(result.output)
+            predicted = {t["path"]: t["predicted_duration"] for t in data["tests"]}
+            assert predicted == {
+                str(Path("tests/test_alpha.do")): 1.25,
+                str(Path("tests/test_beta.do")): 0.5,
+            }
+            assert data["predicted_duration"] == 1.75
+
+    def test_json_requires_collect_only(self):
+        """Test that --json alone is rejected."""
+        runner = CliRunner()
+
+        with runner.isolated_filesystem():
+            Path("tests").mkdir()
+
+            result = runner.invoke(main, ["--json", "tests"])
+
+            assert result.exit_code == 1
+            assert "--json requires --collect-only" in result.output
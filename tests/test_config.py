@@ -133,3 +133,64 @@ timeout = 600
 
         config = Config.from_project(tmppath)
         assert config.timeout == 600
+
+
+def test_from_project_norecursedirs() -> None:
+    """Test loading config with custom norecursedirs."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmppath = Path(tmpdir)
+
+        (tmppath / "statatest.toml").write_text(
+            """
+[tool.statatest]
+norecursedirs = ["data", "raw_*"]
+"""
+        )
+
+        config = Config.from_project(tmppath)
+        assert config.norecursedirs == ["data", "raw_*"]
+        assert ".*" in Config().norecursedirs
+
+
+def test_from_project_workers() -> None:
+    """Test loading config with a worker count."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmppath = Path(tmpdir)
+
+        (tmppath / "statatest.toml").write_text(
+            """
+[tool.statatest]
+workers = 4
+"""
+        )
+
+        config = Config.from_project(tmppath)
+        assert config.workers == 4
+        assert Config().workers == 1
+
+
+def test_from_project_coverage_probes() -> None:
+    """Test loading the coverage probe mode, granularity, adaptive and lazy modes."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmppath = Path(tmpdir)
+
+        (tmppath / "statatest.toml").write_text(
+            """
+[tool.statatest.coverage]
+source = ["code"]
+probes = "memory"
+granularity = "block"
+adaptive = true
+lazy = true
+"""
+        )
+
+        config = Config.from_project(tmppath)
+        assert config.coverage_probes == "memory"
+        assert config.coverage_granularity == "block"
+        assert Config().coverage_probes == "log"
+        assert Config().coverage_granularity == "line"
+        assert config.coverage_adaptive
+        assert not Config().coverage_adaptive
+        assert config.coverage_lazy
+        assert not Config().coverage_lazy
@@ -1,16 +1,36 @@
 """Tests for coverage collection module."""
 
+import gzip
+import sqlite3
 import tempfile
+import xml.etree.ElementTree as ET
 from pathlib import Path
 
+import pytest
+
 from statatest.core.models import TestResult
 from statatest.coverage import (
+    ContextDatabase,
+    ContextHit,
+    CoverageDataError,
     CoverageReport,
     FileCoverage,
+    InstrumentedFile,
+    PatchCoverage,
     aggregate_coverage,
+    combine_coverage_data,
     generate_html,
     generate_lcov,
+    parse_diff,
+    patch_coverage,
+    read_coverage_data,
+    write_cobertura,
+    write_coverage_data,
+    write_html,
 )
+from statatest.coverage.html_report import page_name
+from statatest.coverage.models import BranchPoint
+from statatest.coverage.reporter import _build_lcov_content
 from statatest.execution.parser import parse_coverage_markers as parse_smcl_log
 
 
@@ -110,8 +130,16 @@ class TestParseSMCLLog:
 """
         hits = parse_smcl_log(smcl)
 
-        assert hits["test.ado"] == {1, 2}
-        assert hits["other.ado"] == {10}
+        assert hits["test.ado"] == {1: 1, 2: 1}
+        assert hits["other.ado"] == {10: 1}
+
+    def test_parse_counts_repeated_markers(self):
+        """Test that a marker written on each loop iteration is counted."""
+        smcl = "{* COV:3:7 }\n" * 1000 + "{* COV:3:9 }\n"
+
+        hits = parse_smcl_log(smcl)
+
+        assert hits == {"3": {7: 1000, 9: 1}}
 
     def test_parse_no_markers(self):
         """Test parsing content without markers."""
@@ -134,7 +162,7 @@ class TestAggregateCoverage:
                 test_file="test.do",
                 passed=True,
                 duration=1.0,
-                coverage_hits={"test.ado": {1, 2, 3}},
+                coverage_hits={"test.ado": {1: 1, 2: 1, 3: 1}},
             ),
         ]
 
@@ -150,13 +178,13 @@ class TestAggregateCoverage:
                 test_file="test1.do",
                 passed=True,
                 duration=1.0,
-                coverage_hits={"test.ado": {1, 2}},
+                coverage_hits={"test.ado": {1: 1, 2: 1}},
             ),
             TestResult(
                 test_file="test2.do",
                 passed=True,
                 duration=1.0,
-                coverage_hits={"test.ado": {2, 3, 4}},
+                coverage_hits={"test.ado": {2: 1, 3: 1, 4: 1}},
             ),
         ]
 
@@ -164,6 +192,75 @@ class TestAggregateCoverage:
 
         # Union of all hits
         assert report.files["test.ado"].lines_hit == {1, 2, 3, 4}
+        assert report.files["test.ado"].hit_counts == {1: 1, 2: 2, 3: 1, 4: 1}
+
+    def test_executable_lines_and_unloaded_files(self):
+        """Test that totals come from line maps and unloaded files are 0%."""
+        files = {
+            1: InstrumentedFile(1, "ado/used.ado", {2: 1, 4: 2, 6: 5}),
+            2: InstrumentedFile(2, "ado/unused.ado", {2: 1, 4: 3}),
+        }
+        results = [TestResult("t.do", True, 1.0, coverage_hits={"1": {1: 1}})]
+
+        report = aggregate_coverage(results, files)
+
+        assert report.files["ado/used.ado"].lines_total == {1, 2, 5}
+        assert report.files["ado/used.ado"].coverage_percent == pytest.approx(100 / 3)
+        assert report.files["ado/unused.ado"].lines_total == {1, 3}
+        assert report.files["ado/unused.ado"].coverage_percent == 0.0
+        assert report.total_lines == 5
+        lcov = "\n".join(_build_lcov_content(report))
+        assert "SF:ado/unused.ado\nDA:1,0\nDA:3,0\nLF:2\nLH:0" in lcov
+
+    def test_aggregate_maps_file_ids_to_paths(self):
+        """Test that same-named files from different roots stay separate."""
+        files = {
+            1: InstrumentedFile(file_id=1, path="src/a/utils.ado"),
+            2: InstrumentedFile(file_id=2, path="vendor/utils.ado"),
+        }
+        results = [
+            TestResult(
+                test_file="test.do",
+                passed=True,
+                duration=1.0,
+                coverage_hits={"1": {1: 1, 2: 1}, "2": {7: 1}},
+            ),
+        ]
+
+        report = aggregate_coverage(results, files)
+
+        assert report.files["src/a/utils.ado"].lines_hit == {1, 2}
+        assert report.files["vendor/utils.ado"].lines_hit == {7}
+
+    def test_aggregate_branches(self):
+        """Test that branch outcomes are derived per test and summed."""
+        files = {
+            1: InstrumentedFile(
+                file_id=1,
+                path="loop.ado",
+                line_map={2: 2, 4: 3, 7: 6, 9: 7},
+                branches=[BranchPoint(2, "loop"), BranchPoint(6, "if", arms=[7])],
+            )
+        }
+        results = [
+            TestResult(
+                test_file=f"test{i}.do",
+                passed=True,
+                duration=1.0,
+                coverage_hits=hits,
+            )
+            for i, hits in enumerate(
+                [{"1": {2: 1, 3: 4}}, {"1": {2: 2, 3: 1}, "1b": {2: 1}}]
+            )
+        ]
+
+        report = aggregate_coverage(results, files)
+
+        file_cov = report.files["loop.ado"]
+        assert "1b" not in report.files
+        assert file_cov.branch_points == {2: 2, 6: 2}
+        assert file_cov.branch_hits == {2: [2, 1]}
+        assert (file_cov.branches_found, file_cov.branches_covered) == (4, 2)
 
 
 class TestGenerateLCOV:
@@ -176,7 +273,7 @@ class TestGenerateLCOV:
                 test_file="test.do",
                 passed=True,
                 duration=1.0,
-                coverage_hits={"test.ado": {1, 2, 5}},
+                coverage_hits={"test.ado": {1: 1, 2: 1, 5: 1}},
             ),
         ]
 
@@ -193,6 +290,157 @@ class TestGenerateLCOV:
             assert "DA:5,1" in content
             assert "end_of_record" in content
 
+    def test_generate_lcov_writes_execution_counts(self):
+        """Test that DA records carry real counts, with 0 for missed lines."""
+        report = CoverageReport()
+        report.add_hit("loop.ado", 4, 250)
+        report.add_hit("loop.ado", 4, 750)
+        report.add_hit("loop.ado", 2)
+        report.set_total_lines("loop.ado", {2, 4, 6})
+
+        content = _build_lcov_content(report)
+
+        assert content[1:5] == ["SF:loop.ado", "DA:2,1", "DA:4,1000", "DA:6,0"]
+
+    def test_generate_lcov_writes_branches(self):
+        """Test BRDA records, with "-" for branch points never reached."""
+        report = CoverageReport()
+        report.add_hit("branches.ado", 2, 3)
+        report.set_branch_points("branches.ado", {2: 3, 8: 2})
+        report.add_branch_hits("branches.ado", 2, [2, 0, 1])
+
+        content = _build_lcov_content(report)
+
+        assert content[2:10] == [
+            "BRDA:2,0,0,2",
+            "BRDA:2,0,1,0",
+            "BRDA:2,0,2,1",
+            "BRDA:8,0,0,-",
+            "BRDA:8,0,1,-",
+            "BRF:5",
+            "BRH:2",
+            "DA:2,3",
+        ]
+
+    def test_generate_lcov_uses_relative_paths(self):
+        """Test that SF records carry repo-relative paths for file ids."""
+        files = {3: InstrumentedFile(file_id=3, path="code/u/utils.ado")}
+        results = [
+            TestResult(
+                test_file="test.do",
+                passed=True,
+                duration=1.0,
+                coverage_hits={"3": {4: 1}},
+            ),
+        ]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = Path(tmpdir) / "coverage.lcov"
+            generate_lcov(results, output_path, files)
+
+            content = output_path.read_text()
+
+            assert "SF:code/u/utils.ado" in content
+            assert "SF:3" not in content
+
+
+class TestWriteCobertura:
+    """Tests for the Cobertura XML report."""
+
+    def test_packages_lines_and_branches(self):
+        """Test that files are grouped by directory with line and branch data."""
+        report = CoverageReport()
+        report.set_total_lines("ado/m/myreg.ado", {1, 2, 3, 4})
+        report.add_hit("ado/m/myreg.ado", 1, 4)
+        report.add_hit("ado/m/myreg.ado", 2, 4)
+        report.set_branch_points("ado/m/myreg.ado", {2: 2})
+        report.add_branch_hits("ado/m/myreg.ado", 2, [4, 0])
+        report.set_total_lines("top.ado", {1})
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = Path(tmpdir) / "coverage.xml"
+            write_cobertura(report, output_path, source_root=Path(tmpdir))
+            root = ET.parse(output_path).getroot()
+
+        assert root.get("line-rate") == "0.4"
+        assert root.get("lines-valid") == "5"
+        assert root.get("branch-rate") == "0.5"
+        packages = {p.get("name"): p for p in root.iter("package")}
+        assert sorted(packages) == [".", "ado.m"]
+        (cls,) = packages["ado.m"].iter("class")
+        assert cls.get("filename") == "ado/m/myreg.ado"
+        assert cls.get("line-rate") == "0.5"
+        lines = {line.get("number"): line.attrib for line in cls.iter("line")}
+        assert lines["1"] == {"number": "1", "hits": "4", "branch": "false"}
+        assert lines["2"]["condition-coverage"] == "50% (1/2)"
+        assert lines["3"]["hits"] == "0"
+
+
+class TestPatchCoverage:
+    """Tests for coverage of changed lines."""
+
+    DIFF = """\
+diff --git a/ado/m/myreg.ado b/ado/m/myreg.ado
+index 1111111..2222222 100644
+--- a/ado/m/myreg.ado
++++ b/ado/m/myreg.ado
+@@ -3,0 +4,3 @@ program myreg
++    local a 1
++    * comment
++    local b 2
+@@ -10 +13 @@ program myreg
+-    old
++    new
+diff --git a/old.ado b/old.ado
+deleted file mode 100644
+--- a/old.ado
++++ /dev/null
+@@ -1,2 +0,0 @@
+-a
+-b
+diff --git a/tests/test_myreg.do b/tests/test_myreg.do
+--- a/tests/test_myreg.do
++++ b/tests/test_myreg.do
+@@ -1,0 +2 @@
++myreg
+"""
+
+    def test_parse_diff(self):
+        """Test that added and modified lines are taken from hunk headers."""
+        assert parse_diff(self.DIFF) == {
+            "ado/m/myreg.ado": {4, 5, 6, 13},
+            "tests/test_myreg.do": {2},
+        }
+
+    def test_parse_diff_quoted_paths(self):
+        """Test that C-quoted paths and paths with spaces are kept."""
+        diff = (
+            '+++ "b/dir with space/caf\\303\\251 \\"x\\".ado"\n'
+            "@@ -0,0 +1,2 @@\n"
+            "+++ b/other dir/y.ado\t\n"
+            "@@ -1 +1 @@\n"
+        )
+
+        assert parse_diff(diff) == {
+            'dir with space/café "x".ado': {1, 2},
+            "other dir/y.ado": {1},
+        }
+
+    def test_only_executable_lines_of_instrumented_files_count(self):
+        """Test that comments and uninstrumented files are left out."""
+        report = CoverageReport()
+        report.set_total_lines("ado/m/myreg.ado", {4, 6, 13, 20})
+        report.add_hit("ado/m/myreg.ado", 4)
+
+        patch = patch_coverage(report, parse_diff(self.DIFF))
+
+        assert patch == PatchCoverage(
+            changed={"ado/m/myreg.ado": {4, 6, 13}},
+            covered={"ado/m/myreg.ado": {4}},
+        )
+        assert patch.missed("ado/m/myreg.ado") == [6, 13]
+        assert round(patch.coverage_percent, 1) == 33.3
+
 
 class TestGenerateHTML:
     """Tests for generate_html function."""
@@ -204,7 +452,7 @@ class TestGenerateHTML:
                 test_file="test.do",
                 passed=True,
                 duration=1.0,
-                coverage_hits={"test.ado": {1, 2, 3}},
+                coverage_hits={"test.ado": {1: 1, 2: 1, 3: 1}},
             ),
         ]
 
@@ -218,3 +466,212 @@ class TestGenerateHTML:
             content = index_path.read_text()
             assert "statatest Coverage Report" in content
             assert "test.ado" in content
+
+    def _report(self) -> CoverageReport:
+        report = CoverageReport()
+        report.set_total_lines("ado/m/myreg.ado", {2, 3, 4})
+        report.add_hit("ado/m/myreg.ado", 2, 7)
+        report.add_hit("ado/m/myreg.ado", 3, 1)
+        report.set_branch_points("ado/m/myreg.ado", {3: 2})
+        report.add_branch_hits("ado/m/myreg.ado", 3, [1, 0])
+        return report
+
+    def test_annotated_source_page(self):
+        """Test that each file gets a page with hit and missed lines."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            source = root / "ado" / "m" / "myreg.ado"
+            source.parent.mkdir(parents=True)
+            source.write_text("program myreg\n  a <b>\n  b\n  c\nend\n")
+            output_dir = root / "htmlcov"
+
+            assert write_html(self._report(), output_dir, source_root=root) == 1
+
+            page = output_dir / page_name("ado/m/myreg.ado")
+            content = page.read_text()
+            assert "<tr id='L1'><td class='n'>" in content
+            assert "<tr id='L2' class='hit'>" in content
+            assert "<td class='c'>7</td><td>  a &lt;b&gt;</td>" in content
+            assert "<tr id='L3' class='partial'" in content
+            assert "<tr id='L4' class='miss'>" in content
+            index = (output_dir / "index.html").read_text()
+            assert f"<a href='{page.name}'>ado/m/myreg.ado</a>" in index
+
+    def test_unchanged_pages_are_skipped(self):
+        """Test that only pages whose source or coverage changed are rendered."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            (root / "ado" / "m").mkdir(parents=True)
+            (root / "ado" / "m" / "myreg.ado").write_text("a\nb\nc\nd\n")
+            (root / "other.ado").write_text("x\n")
+            output_dir = root / "htmlcov"
+            report = self._report()
+            report.add_hit("other.ado", 1)
+
+            assert write_html(report, output_dir, source_root=root) == 2
+            assert write_html(report, output_dir, source_root=root) == 0
+
+            report.add_hit("other.ado", 1)
+            assert write_html(report, output_dir, source_root=root) == 1
+
+            del report.files["other.ado"]
+            write_html(report, output_dir, source_root=root)
+            assert not (output_dir / page_name("other.ado")).exists()
+
+
+class TestContextDatabase:
+    """Tests for the per-test coverage context database."""
+
+    def test_records_each_test_as_a_context(self):
+        """Test that line counts are stored per test and queryable by line."""
+        files = {1: InstrumentedFile(file_id=1, path="ado/m/myreg.ado")}
+        results = [
+            TestResult("tests/test_a.do", True, 1.0, coverage_hits={"1": {5: 2}}),
+            TestResult("tests/test_b.do", True, 1.0, coverage_hits={"1": {5: 1, 6: 3}}),
+        ]
+
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            ContextDatabase.for_project(Path(tmpdir)) as db,
+        ):
+            assert db.record_results(results, files) == 3
+            assert db.contexts() == ["tests/test_a.do", "tests/test_b.do"]
+            assert db.who_covers("myreg.ado", 5) == [
+                ContextHit("tests/test_a.do", "ado/m/myreg.ado", 5, 2),
+                ContextHit("tests/test_b.do", "ado/m/myreg.ado", 5, 1),
+            ]
+            assert len(db.who_covers("ado/m/myreg.ado")) == 3
+            assert db.who_covers("reg.ado") == []
+
+    def test_only_files_a_test_ran_are_expanded(self):
+        """Test that block hits are expanded and untouched files are skipped."""
+        files = {
+            1: InstrumentedFile(
+                file_id=1,
+                path="block.ado",
+                line_map={3: 2, 4: 3, 5: 4},
+                block_leaders=[2],
+            ),
+            2: InstrumentedFile(file_id=2, path="other.ado", proven={1: 5}),
+        }
+        result = TestResult(
+            "tests/test_a.do", True, 1.0, coverage_hits={"1": {2: 2}, "1b": {2: 1}}
+        )
+
+        with (
+            tempfile.TemporaryDirectory() as tmpdir,
+            ContextDatabase.for_project(Path(tmpdir)) as db,
+        ):
+            assert db.record_results([result], files) == 3
+            hits = db.who_covers("block.ado")
+            assert [(h.lineno, h.count) for h in hits] == [(2, 2), (3, 2), (4, 2)]
+            assert db.who_covers("other.ado") == []
+
+    def test_rerun_replaces_a_context(self):
+        """Test that recording a test again replaces its previous lines."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "coverage.db"
+            with ContextDatabase.open(path) as db:
+                db.record("tests/test_a.do", {"a.ado": {1: 1, 2: 1}})
+            with ContextDatabase.open(path) as db:
+                db.record("tests/test_a.do", {"a.ado": {3: 1}})
+                hits = db.who_covers("a.ado")
+
+            assert [hit.lineno for hit in hits] == [3]
+
+    def test_other_schema_version_is_discarded(self):
+        """Test that a database with an unknown version is rebuilt."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "coverage.db"
+            conn = sqlite3.connect(path)
+            conn.execute("CREATE TABLE line_hit (x)")
+            conn.execute("PRAGMA user_version = 999")
+            conn.close()
+
+            with ContextDatabase.open(path) as db:
+                assert db.record("t.do", {"a.ado": {1: 1}}) == 1
+
+
+class TestCoverageData:
+    """Tests for coverage data files."""
+
+    def _report(self, hits: dict[int, int]) -> CoverageReport:
+        report = CoverageReport()
+        report.set_total_lines("a.ado", set(range(1, 11)))
+        for lineno, count in hits.items():
+            report.add_hit("a.ado", lineno, count)
+        report.set_branch_points("a.ado", {4: 2, 8: 2})
+        report.add_branch_hits("a.ado", 4, [3, 0])
+        return report
+
+    def test_round_trip(self):
+        """Test that a written report reads back unchanged."""
+        report = self._report({1: 5, 2: 5, 3: 5, 7: 1})
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "cov" / "run.stcov"
+            write_coverage_data(report, path)
+            (file_cov,) = read_coverage_data(path)
+
+        original = report.files["a.ado"]
+        assert file_cov.filepath == "a.ado"
+        assert file_cov.lines_total == original.lines_total
+        assert file_cov.hit_counts == {1: 5, 2: 5, 3: 5, 7: 1}
+        assert file_cov.lines_hit == {1, 2, 3, 7}
+        assert file_cov.branch_points == {4: 2, 8: 2}
+        assert file_cov.branch_hits == {4: [3, 0]}
+
+    def test_lines_are_run_length_encoded(self):
+        """Test that consecutive lines with equal counts share one record."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "run.stcov"
+            write_coverage_data(self._report({1: 5, 2: 5, 3: 5, 7: 1}), path)
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                record = f.read().splitlines()[1]
+
+        assert '"lines":[[1,10]]' in record
+        assert '"hits":[[1,3,5],[7,1,1]]' in record
+
+    def test_combine_sums_counts(self):
+        """Test that combining shards sums line and branch counts."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            first = Path(tmpdir) / "a.stcov"
+            second = Path(tmpdir) / "b.stcov"
+            write_coverage_data(self._report({1: 2, 5: 1}), first)
+            write_coverage_data(self._report({1: 3, 9: 1}), second)
+            combined = combine_coverage_data([first, second])
+
+        file_cov = combined.files["a.ado"]
+        assert file_cov.hit_counts == {1: 5, 5: 1, 9: 1}
+        assert file_cov.branch_hits == {4: [6, 0]}
+        assert combined.covered_lines == 3
+        assert combined.total_lines == 10
+
+    def test_combine_mismatched_branch_points(self):
+        """Test that a branch point changed by an edit keeps the later data."""
+        edited = self._report({1: 1})
+        edited.set_branch_points("a.ado", {4: 3, 8: 2})
+        edited.files["a.ado"].branch_hits = {4: [0, 1, 1]}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            first = Path(tmpdir) / "a.stcov"
+            second = Path(tmpdir) / "b.stcov"
+            write_coverage_data(self._report({1: 2}), first)
+            write_coverage_data(edited, second)
+            combined = combine_coverage_data([first, second])
+            reverse = combine_coverage_data([second, first])
+
+        file_cov = combined.files["a.ado"]
+        assert file_cov.branch_points == {4: 3, 8: 2}
+        assert file_cov.branch_hits == {4: [0, 1, 1]}
+        assert file_cov.hit_counts == {1: 3}
+        assert reverse.files["a.ado"].branch_points == {4: 2, 8: 2}
+        assert reverse.files["a.ado"].branch_hits == {4: [3, 0]}
+
+    def test_other_version_is_rejected(self):
+        """Test that data files of another format version are not read."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "old.stcov"
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                f.write('{"format": "statatest-coverage", "version": 999}\n')
+
+            with pytest.raises(CoverageDataError, match="version 999"):
+                list(read_coverage_data(path))
@@ -1,12 +1,22 @@
 """Tests for test discovery module."""
 
+import os
 import tempfile
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
 from statatest.core.config import Config
-from statatest.discovery import discover_tests
+from statatest.core.models import TestFile
+from statatest.discovery import (
+    DiscoveryIndex,
+    ExpressionError,
+    MarkerIndex,
+    compile_expression,
+    dedupe_roots,
+    discover_tests,
+)
 from statatest.discovery.parser import parse_test_file as _parse_test_file
 
 
@@ -94,3 +104,234 @@ def test_parse_test_file_extracts_programs(temp_test_dir: Path):
     test_file = _parse_test_file(temp_test_dir / "test_foo.do")
 
     assert "test_something" in test_file.programs
+
+
+def test_parse_test_file_extracts_fixtures(temp_test_dir: Path):
+    """Test that fixture uses are extracted in the same pass."""
+    (temp_test_dir / "test_fix.do").write_text(
+        """
+// @uses_fixture: sample_panel, seed
+program define test_fix
+    use_fixture empty_dataset
+    use_fixture sample_panel
+end
+"""
+    )
+
+    test_file = _parse_test_file(temp_test_dir / "test_fix.do")
+
+    assert test_file.fixtures == ["sample_panel", "seed", "empty_dataset"]
+
+
+class TestDiscoveryIndex:
+    """Tests for the persistent discovery index."""
+
+    def test_unchanged_files_are_not_reparsed(self, temp_test_dir: Path):
+        """Test that a warm index skips parsing unchanged files."""
+        config = Config()
+        index = DiscoveryIndex()
+        discover_tests(temp_test_dir, config, index=index)
+
+        with patch("statatest.discovery.finder.parse_test_file") as mock_parse:
+            tests = discover_tests(temp_test_dir, config, index=index)
+
+        mock_parse.assert_not_called()
+        assert {t.name for t in tests} == {"test_foo", "test_bar"}
+        foo = next(t for t in tests if t.name == "test_foo")
+        assert foo.markers == ["unit", "fast"]
+        assert foo.programs == ["test_something"]
+
+    def test_changed_file_is_reparsed(self, temp_test_dir: Path):
+        """Test that a file with a new mtime/size is parsed again."""
+        config = Config()
+        index = DiscoveryIndex()
+        discover_tests(temp_test_dir, config, index=index)
+
+        foo = temp_test_dir / "test_foo.do"
+        foo.write_text("// @marker: slow\n")
+        stat = foo.stat()
+        os.utime(foo, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        tests = discover_tests(temp_test_dir, config, marker="slow", index=index)
+
+        assert [t.name for t in tests] == ["test_foo"]
+
+    def test_save_and_load_roundtrip(self, temp_test_dir: Path):
+        """Test that the index survives a save/load cycle."""
+        config = Config()
+        index_path = temp_test_dir / ".statatest" / "discovery-index.json"
+        index = DiscoveryIndex(path=index_path)
+        discover_tests(temp_test_dir, config, index=index)
+        index.save()
+
+        assert index_path.exists()
+
+        reloaded = DiscoveryIndex.load(index_path)
+        with patch("statatest.discovery.finder.parse_test_file") as mock_parse:
+            tests = discover_tests(temp_test_dir, config, index=reloaded)
+
+        mock_parse.assert_not_called()
+        assert len(tests) == 2
+
+    def test_save_drops_deleted_files(self, temp_test_dir: Path):
+        """Test that records of deleted files are pruned, others are kept."""
+        config = Config()
+        index_path = temp_test_dir / ".statatest" / "discovery-index.json"
+        index = DiscoveryIndex(path=index_path)
+        discover_tests(temp_test_dir, config, index=index)
+        for test in discover_tests(temp_test_dir, config, index=index):
+            index.record_duration(test.path, 1.0)
+        index.save()
+
+        (temp_test_dir / "test_foo.do").unlink()
+        other = temp_test_dir / "other"
+        other.mkdir()
+        (other / "test_other.do").write_text("// other\n")
+        reloaded = DiscoveryIndex.load(index_path)
+        discover_tests(other, config, index=reloaded)
+        reloaded.save()
+
+        saved = DiscoveryIndex.load(index_path)
+        assert {Path(key).name for key in saved.entries} == {
+            "test_bar.do",
+            "test_other.do",
+        }
+        assert {Path(key).name for key in saved.durations} == {"test_bar.do"}
+
+    def test_load_ignores_corrupt_file(self, temp_test_dir: Path):
+        """Test that an unreadable index is treated as empty."""
+        index_path = temp_test_dir / "discovery-index.json"
+        index_path.write_text("{not json")
+
+        index = DiscoveryIndex.load(index_path)
+
+        assert index.entries == {}
+
+
+def test_discover_tests_skips_norecursedirs(temp_test_dir: Path):
+    """Test that directories matching norecursedirs are not entered."""
+    for dirname in ("data", ".git", ".statatest", "unit"):
+        (temp_test_dir / dirname).mkdir()
+        (temp_test_dir / dirname / "test_nested.do").write_text("// nested")
+
+    config = Config(norecursedirs=[".*", "data"])
+    tests = discover_tests(temp_test_dir, config)
+
+    nested = [t for t in tests if t.name == "test_nested"]
+    assert [t.path.parent.name for t in nested] == ["unit"]
+
+
+def test_discover_tests_deduplicates_overlapping_patterns(temp_test_dir: Path):
+    """Test that a file matching several patterns is returned once."""
+    config = Config(test_files=["test_*.do", "*_foo.do", "test_foo.*"])
+    tests = discover_tests(temp_test_dir, config)
+
+    assert sorted(t.name for t in tests) == ["test_bar", "test_foo"]
+
+
+def test_dedupe_roots_removes_nested_and_duplicate_paths():
+    """Test that overlapping roots are collapsed to their outermost path."""
+    roots = [
+        Path("tests/unit"),
+        Path("tests/integration"),
+        Path("tests"),
+        Path("tests"),
+        Path("other"),
+    ]
+
+    assert dedupe_roots(roots) == [Path("tests"), Path("other")]
+
+
+def test_discover_tests_from_multiple_roots(temp_test_dir: Path):
+    """Test that several (overlapping) roots are collected once each."""
+    (temp_test_dir / "unit").mkdir()
+    (temp_test_dir / "unit" / "test_unit.do").write_text("// unit")
+    other = temp_test_dir / "other"
+    other.mkdir()
+    (other / "test_other.do").write_text("// other")
+
+    config = Config()
+    tests = discover_tests(
+        [temp_test_dir / "unit", temp_test_dir, other, temp_test_dir / "test_foo.do"],
+        config,
+    )
+
+    names = [t.name for t in tests]
+    assert sorted(names) == ["test_bar", "test_foo", "test_other", "test_unit"]
+
+
+class TestSelectionExpressions:
+    """Tests for -m/-k boolean expressions and the marker index."""
+
+    @pytest.fixture
+    def index(self) -> MarkerIndex:
+        return MarkerIndex.build(
+            [
+                TestFile(path=Path("test_merge.do"), markers=["panel"]),
+                TestFile(path=Path("test_reshape.do"), markers=["panel", "slow"]),
+                TestFile(path=Path("test_io.do"), markers=["unit"]),
+                TestFile(path=Path("test_misc.do")),
+            ]
+        )
+
+    @staticmethod
+    def _names(tests: list[TestFile]) -> list[str]:
+        return [t.name for t in tests]
+
+    def test_single_marker(self, index: MarkerIndex):
+        """Test that a bare marker behaves like the old single-marker filter."""
+        selected = index.select(marker=compile_expression("PANEL"))
+        assert self._names(selected) == ["test_merge", "test_reshape"]
+
+    def test_marker_and_not(self, index: MarkerIndex):
+        """Test and/not combinations of markers."""
+        selected = index.select(marker=compile_expression("panel and not slow"))
+        assert self._names(selected) == ["test_merge"]
+
+    def test_not_binds_tighter_than_and_or(self, index: MarkerIndex):
+        """Test operator precedence and parentheses."""
+        expr = compile_expression("not panel or slow")
+        assert self._names(index.select(marker=expr)) == [
+            "test_reshape",
+            "test_io",
+            "test_misc",
+        ]
+        expr = compile_expression("not (panel or unit)")
+        assert self._names(index.select(marker=expr)) == ["test_misc"]
+
+    def test_keyword_expression(self, index: MarkerIndex):
+        """Test that keyword names are substrings of the test name."""
+        selected = index.select(keyword=compile_expression("merge or reshape"))
+        assert self._names(selected) == ["test_merge", "test_reshape"]
+
+    def test_marker_and_keyword_combined(self, index: MarkerIndex):
+        """Test that marker and keyword expressions must both match."""
+        selected = index.select(
+            marker=compile_expression("panel"),
+            keyword=compile_expression("not merge"),
+        )
+        assert self._names(selected) == ["test_reshape"]
+
+    def test_evaluate_predicate(self):
+        """Test evaluating an expression for a single item."""
+        expr = compile_expression("a and (b or not c)")
+        assert expr.evaluate(lambda name: name in {"a", "b", "c"})
+        assert not expr.evaluate(lambda name: name in {"a", "c"})
+
+    @pytest.mark.parametrize(
+        "text", ["", "and", "unit and", "(unit", "unit)", "unit slow", "not"]
+    )
+    def test_invalid_expressions(self, text: str):
+        """Test that malformed expressions raise ExpressionError."""
+        with pytest.raises(ExpressionError):
+            compile_expression(text)
+
+    def test_discover_tests_with_expression(self, temp_test_dir: Path):
+        """Test that discover_tests accepts marker expressions."""
+        config = Config()
+
+        tests = discover_tests(temp_test_dir, config, marker="unit and not fast")
+        assert tests == []
+
+        tests = discover_tests(temp_test_dir, config, marker="fast or integration")
+        assert sorted(t.name for t in tests) == ["test_bar", "test_foo"]
@@ -2,9 +2,11 @@
 
 import tempfile
 from pathlib import Path
+from unittest.mock import patch
 
 from statatest.core.models import TestFile
 from statatest.fixtures import (
+    ConftestGraph,
     Fixture,
     FixtureManager,
     discover_conftest,
@@ -187,3 +189,92 @@ end
         fixtures = get_test_fixtures(test_file)
 
         assert set(fixtures) == {"sample_panel", "empty_dataset"}
+
+
+def _make_conftest_tree(root: Path) -> Path:
+    """Create root/conftest.do and root/tests/unit/conftest.do."""
+    unit = root / "tests" / "unit"
+    unit.mkdir(parents=True)
+    (root / "conftest.do").write_text(
+        "program define fixture_shared\nend\nprogram define fixture_data\nend\n"
+    )
+    (unit / "conftest.do").write_text("program fixture_data\n    sysuse auto\nend\n")
+    return unit
+
+
+def test_conftest_graph_matches_discover_conftest():
+    """Test that the graph finds the same conftest files, root first."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmppath = Path(tmpdir).resolve()
+        unit = _make_conftest_tree(tmppath)
+        graph = ConftestGraph.build()
+
+        assert graph.conftest_files(unit) == discover_conftest(unit)
+        assert graph.conftest_files(tmppath / "tests") == [tmppath / "conftest.do"]
+
+
+def test_conftest_graph_parses_each_conftest_once():
+    """Test that conftest files are parsed once per session."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmppath = Path(tmpdir).resolve()
+        unit = _make_conftest_tree(tmppath)
+        (tmppath / "tests" / "other").mkdir()
+        graph = ConftestGraph.build()
+
+        with patch(
+            "statatest.fixtures.graph.parse_conftest", wraps=parse_conftest
+        ) as mock_parse:
+            graph.fixtures(unit)
+            graph.fixtures(unit)
+            graph.fixtures(tmppath / "tests" / "other")
+
+        assert mock_parse.call_count == 2
+
+
+def test_conftest_graph_nearest_fixture_wins():
+    """Test that inner conftest files override outer ones."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmppath = Path(tmpdir).resolve()
+        unit = _make_conftest_tree(tmppath)
+        graph = ConftestGraph.build()
+
+        fixtures = graph.fixtures(unit)
+
+        assert set(fixtures) == {"shared", "data"}
+        assert fixtures["data"].source_file == unit / "conftest.do"
+
+
+def test_conftest_graph_missing_fixtures():
+    """Test validation of fixture references against all fixture sources."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmppath = Path(tmpdir).resolve()
+        unit = _make_conftest_tree(tmppath)
+
+        ado_dir = tmppath / "ado"
+        ado_dir.mkdir()
+        (ado_dir / "fixture_seed.ado").write_text("")
+        setup_do = tmppath / "setup.do"
+        setup_do.write_text("program define fixture_from_setup\nend\n")
+
+        test_path = unit / "test_example.do"
+        test_path.write_text("program define fixture_local\nend\n")
+        (unit / "fixture_beside.ado").write_text("")
+
+        graph = ConftestGraph.build(
+            fixture_dirs=[ado_dir, tmppath / "missing"], setup_do=setup_do
+        )
+        test = TestFile(
+            path=test_path,
+            fixtures=[
+                "seed",
+                "from_setup",
+                "shared",
+                "local",
+                "beside",
+                "sahred",
+                "nope",
+            ],
+        )
+
+        assert graph.missing_fixtures(test) == ["sahred", "nope"]
+        assert graph.missing_fixtures(TestFile(path=test_path)) == []
@@ -1,17 +1,36 @@
 """Tests for source code instrumentation module."""
 
+import os
+import subprocess
+import sys
 import tempfile
 from pathlib import Path
+from unittest.mock import patch
 
+import pytest
+
+from statatest.core.models import TestResult
+from statatest.coverage.aggregator import aggregate_coverage
 from statatest.coverage.instrument import (
     _ends_with_continuation,
+    _instrument_source,
+    basic_blocks,
+    branch_points,
     cleanup_instrumented_environment,
+    collect_sources,
+    coverage_probe,
     get_total_lines,
     instrument_directory,
     instrument_file,
+    mata_coverage_probe,
+    mata_statements,
+    record_proven_lines,
+    redirect_do_calls,
     setup_instrumented_environment,
     should_instrument_line,
 )
+from statatest.coverage.models import BranchPoint, InstrumentedFile, InstrumentOptions
+from statatest.coverage.workspace import RunRoot, _try_lock, instrumentation_lock
 
 
 class TestShouldInstrumentLine:
@@ -87,15 +106,15 @@ end
             source_path.write_text(source_content)
 
             dest_path = tmppath / "instrumented" / "myfunction.ado"
-            line_map = instrument_file(source_path, dest_path)
+            line_map = instrument_file(source_path, dest_path, 7)
 
             # Check file was created
             assert dest_path.exists()
 
             # Check instrumented content
             instrumented = dest_path.read_text()
-            assert "{* COV:myfunction.ado:5 }" in instrumented
-            assert "{* COV:myfunction.ado:6 }" in instrumented
+            assert "{* COV:7:5 }" in instrumented
+            assert "{* COV:7:6 }" in instrumented
 
             # Check line map
             assert 5 in line_map.values()
@@ -119,7 +138,7 @@ end
             source_path.write_text(source_content)
 
             dest_path = tmppath / "instrumented" / "test.ado"
-            instrument_file(source_path, dest_path)
+            instrument_file(source_path, dest_path, 1)
 
             instrumented = dest_path.read_text()
 
@@ -128,6 +147,397 @@ end
             assert "version 16" in instrumented
             assert "end" in instrumented
 
+    def test_instrument_memory_probes(self):
+        """Test that memory probes increment counters instead of logging."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmppath = Path(tmpdir)
+            source_path = tmppath / "loop.ado"
+            source_path.write_text(
+                "program define loop\n    forvalues i = 1/10 {\n"
+                "        display `i'\n    }\nend\n"
+            )
+            dest_path = tmppath / "instrumented" / "loop.ado"
+
+            line_map = instrument_file(
+                source_path, dest_path, 4, InstrumentOptions(probes="memory")
+            )
+
+            instrumented = dest_path.read_text()
+            assert "COV:" not in instrumented
+            assert "global _stc_4_3 = ${_stc_4_3} + 1" in instrumented
+            assert 3 in line_map.values()
+
+    def test_unknown_probe_mode_raises(self):
+        """Test that an unknown probe mode is rejected."""
+        with pytest.raises(ValueError, match="probe mode"):
+            coverage_probe(1, 1, "trace")
+
+    def test_unknown_options_raise(self):
+        """Test that unknown instrumentation options are rejected."""
+        with pytest.raises(ValueError, match="granularity"):
+            InstrumentOptions(granularity="statement")
+
+    def test_instrument_block_probes(self):
+        """Test that block granularity puts one probe per basic block."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmppath = Path(tmpdir)
+            source_path = tmppath / "blocks.ado"
+            source_path.write_text(BLOCK_SOURCE)
+            dest_path = tmppath / "instrumented" / "blocks.ado"
+
+            line_map, leaders, _ = _instrument_source(
+                source_path, dest_path, 2, InstrumentOptions(granularity="block")
+            )
+
+            instrumented = dest_path.read_text()
+            assert leaders == [2, 6, 8, 9]
+            assert instrumented.count("COV:2:") == len(leaders)
+            # Every executable line is still mapped
+            assert sorted(line_map.values()) == [2, 3, 5, 6, 8, 9, 10]
+
+
+BLOCK_SOURCE = """\
+program define blocks
+    local a = 1
+    local b = 2 ///
+        + 3
+    if `a' == 1 {
+        display "yes"
+    }
+    capture confirm variable x
+    display "after"
+    display "done"
+end
+"""
+
+
+class TestBasicBlocks:
+    """Tests for basic_blocks function."""
+
+    def test_splits_at_branches_capture_and_braces(self):
+        """Test block boundaries for straight-line code, if and capture."""
+        blocks = basic_blocks(BLOCK_SOURCE.split("\n"))
+
+        assert blocks == {
+            2: [2, 3, 5],  # ends with the if condition
+            6: [6],  # if body
+            8: [8],  # capture ends a block
+            9: [9, 10],
+        }
+
+    def test_loop_body_is_its_own_block(self):
+        """Test that a loop header and its body are separate blocks."""
+        lines = [
+            "program define loop",
+            "    foreach v of varlist x y {  // each variable",
+            "        summarize `v'",
+            "        display r(mean)",
+            "    }",
+            "end",
+        ]
+
+        assert basic_blocks(lines) == {2: [2], 3: [3, 4]}
+
+    def test_line_counts_expand_block_hits(self):
+        """Test that block probe hits are reported for every block line."""
+        instrumented = InstrumentedFile(
+            file_id=1,
+            path="code/loop.ado",
+            line_map={3: 2, 5: 3, 6: 4},
+            block_leaders=[2, 3],
+        )
+
+        assert instrumented.probe_count == 2
+        assert instrumented.line_counts({2: 1, 3: 10}) == {2: 1, 3: 10, 4: 10}
+
+
+BRANCH_SOURCE = """\
+program define branches
+    if `x' > 0 {
+        display "positive"
+    }
+    else if `x' < 0 {
+        // nothing to do
+    }
+    else {
+        display "zero"
+    }
+    foreach v of local vars {
+        display "`v'"
+    }
+    capture {
+        confirm variable x
+    }
+    cap noisily confirm variable y
+    if `x' {
+        display "x"
+    } else display "no x"
+end
+"""
+
+
+class TestBranchPoints:
+    """Tests for branch point detection and branch probes."""
+
+    def test_finds_if_chains_loops_and_captures(self):
+        """Test that each branch point records how its outcomes are counted."""
+        points = branch_points(BRANCH_SOURCE.split("\n"))
+
+        assert points == [
+            # else if block is empty: counted by a probe at its closing brace
+            BranchPoint(2, "if", arms=[3, 7, 9], remainder=False),
+            BranchPoint(11, "loop"),
+            BranchPoint(14, "capture"),
+            BranchPoint(17, "capture"),
+            # single-line else is the remaining outcome
+            BranchPoint(18, "if", arms=[19]),
+        ]
+        assert [p.outcomes for p in points] == [3, 2, 2, 2, 2]
+
+    def test_skips_single_line_if_and_mata(self):
+        """Test that if without a block and Mata code are not branch points."""
+        lines = [
+            "program define f",
+            "    if `x' display 1",
+            "    mata:",
+            "    if (x) {",
+            "    }",
+            "    end",
+            "end",
+        ]
+
+        assert branch_points(lines) == []
+
+    def test_instrument_branch_probes(self):
+        """Test the probes recording empty blocks, skipped loops and failures."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmppath = Path(tmpdir)
+            source_path = tmppath / "branches.ado"
+            source_path.write_text(BRANCH_SOURCE)
+            dest_path = tmppath / "instrumented" / "branches.ado"
+
+            _, _, branches = _instrument_source(source_path, dest_path, 4)
+
+            instrumented = dest_path.read_text().split("\n")
+            assert len(branches) == 5
+            # A probe in the empty else if block
+            assert instrumented[instrumented.index("    }", 10) - 1] == (
+                'display `"{* COV:4b:7 }"\''
+            )
+            # The loop flag is cleared before the loop and set in its body
+            loop = instrumented.index("    foreach v of local vars {")
+            assert instrumented[loop - 2] == "local _stb_11 0"
+            assert instrumented[loop + 1] == "local _stb_11 1"
+            assert "if !`_stb_11' display `\"{* COV:4b:11 }\"'" in instrumented
+            assert 'if _rc display `"{* COV:4b:14 }"\'' in instrumented
+            # A probe never separates else from its if block
+            else_line = instrumented.index("    else {")
+            assert instrumented[else_line - 1] == "    }"
+
+    def test_branch_counts(self):
+        """Test deriving branch outcomes from line and branch probe counts."""
+        instrumented = InstrumentedFile(
+            file_id=4,
+            path="branches.ado",
+            line_map={i: i for i in (2, 3, 9, 11, 12, 15, 17, 18, 19)},
+            branches=branch_points(BRANCH_SOURCE.split("\n")),
+        )
+        lines = {2: 10, 3: 6, 9: 3, 11: 5, 12: 12, 15: 1, 17: 2, 18: 4, 19: 1}
+        probes = {7: 1, 11: 2, 17: 2}
+
+        assert instrumented.branch_counts(lines, probes) == {
+            2: [6, 1, 3],
+            11: [3, 2],
+            17: [0, 2],
+            18: [1, 3],
+        }
+
+
+class TestRunRoots:
+    """Tests for per-run instrumentation roots."""
+
+    def test_run_root_links_instrumented_files(self, tmp_path):
+        """A run sees its own files even when the shared copy is replaced."""
+        source_dir = tmp_path / "source"
+        source_dir.mkdir()
+        (source_dir / "a.ado").write_text("program define a\n    gen x = 1\nend\n")
+
+        with RunRoot.create(tmp_path) as run_root:
+            instrumented_dir, _ = setup_instrumented_environment(
+                [source_dir], tmp_path, run_root=run_root
+            )
+            assert instrumented_dir == run_root.path
+            shared = tmp_path / ".statatest" / "instrumented" / "a.ado"
+            assert (run_root.path / "a.ado").stat().st_ino == shared.stat().st_ino
+
+            # Another run re-instruments with other options meanwhile
+            setup_instrumented_environment(
+                [source_dir], tmp_path, options=InstrumentOptions(probes="memory")
+            )
+            assert "{* COV:" in (run_root.path / "a.ado").read_text()
+            assert "{* COV:" not in shared.read_text()
+
+        assert not run_root.path.exists()
+
+    def test_lock_file_pruned_before_locking_is_replaced(self, tmp_path):
+        """A run whose new lock file another run pruned takes a new id."""
+        pruned: list[Path] = []
+
+        def try_lock(lock):
+            path = Path(lock.name)
+            if not pruned and path.parent.name == "runs":
+                pruned.append(path)  # pruned by another process first
+                path.unlink()
+            return _try_lock(lock)
+
+        with (
+            patch("statatest.coverage.workspace._try_lock", side_effect=try_lock),
+            RunRoot.create(tmp_path) as run_root,
+        ):
+            lock_path = run_root.path.with_name(f"{run_root.path.name}.lock")
+            assert pruned
+            assert pruned[0] != lock_path
+            assert lock_path.exists()
+
+    def test_lock_times_out(self, tmp_path):
+        """A second holder of the instrumentation lock gives up eventually."""
+        script = (
+            "import sys; from pathlib import Path;"
+            "from statatest.coverage.workspace import instrumentation_lock;"
+            "lock = instrumentation_lock(Path(sys.argv[1]), timeout=0.2);"
+            "lock.__enter__()"
+        )
+        with instrumentation_lock(tmp_path):
+            other = subprocess.run(  # noqa: S603
+                [sys.executable, "-c", script, str(tmp_path)],
+                capture_output=True,
+                text=True,
+                check=False,
+                env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+            )
+        assert "InstrumentationLockError" in other.stderr
+
+
+class TestMataInstrumentation:
+    """Tests for statement-level probes in Mata blocks."""
+
+    SOURCE = """\
+program define myreg
+    mata: myreg_work(1)
+end
+
+mata:
+// Sum of 1..n
+real scalar myreg_work(real scalar n)
+{
+    real scalar y, i
+
+    y = 0 + ///
+        0
+    for (i = 1; i <= n; i++) {
+        y = y + i  /* running total */
+    }
+    if (y > 10)
+        y = 10
+    else y = y - 1
+    /* a
+       comment */
+    return(y)
+}
+end
+"""
+
+    def test_statements(self):
+        """Declarations, braces, comments and brace-less bodies get no probe."""
+        region, statements = mata_statements(self.SOURCE.split("\n"))
+
+        assert region == set(range(5, 24))
+        assert statements == {11, 13, 14, 16, 21}
+
+    def test_instrumented_probes(self, tmp_path):
+        """Mata lines get Mata probes, Stata lines Stata probes."""
+        source = tmp_path / "myreg.ado"
+        source.write_text(self.SOURCE)
+        dest = tmp_path / "out" / "myreg.ado"
+
+        line_map = instrument_file(source, dest, 7)
+
+        instrumented = dest.read_text()
+        assert 'display `"{* COV:7:2 }"\'' in instrumented
+        assert 'printf("{* COV:7:14 }\\n")\n        y = y + i' in instrumented
+        assert "{* COV:7:17 }" not in instrumented
+        assert sorted(line_map.values()) == [2, 11, 13, 14, 16, 21]
+
+    def test_memory_probe(self):
+        """Memory probes update the same global macro as Stata probes."""
+        probe = mata_coverage_probe(3, 12, "memory")
+
+        assert probe.startswith('st_global("_stc_3_12", ')
+        assert 'strtoreal("0" + st_global("_stc_3_12")) + 1' in probe
+
+    def test_block_granularity(self):
+        """Each Mata statement is a basic block of its own."""
+        blocks = basic_blocks(self.SOURCE.split("\n"))
+
+        assert blocks[11] == [11]
+        assert blocks[13] == [13]
+
+
+class TestDoFiles:
+    """Tests for instrumenting .do files and redirecting do and run."""
+
+    def test_redirect_do_calls(self):
+        """do and run statements go through _stt_do, keeping their prefixes."""
+        source = (
+            'do "code/clean.do", nostop\n'
+            "capture noisily run helpers\n"
+            "* do nothing\n"
+            "display 1 ///\n"
+            "    do\n"
+            "mata:\n"
+            "do {\n"
+            "} while (0)\n"
+            "end"
+        )
+
+        lines = redirect_do_calls(source).split("\n")
+
+        assert lines[0] == '_stt_do do "code/clean.do", nostop'
+        assert lines[1] == "capture noisily _stt_do run helpers"
+        assert lines[2:] == source.split("\n")[2:]
+
+    def test_setup_instruments_latin1_do_files(self, tmp_path):
+        """A Latin-1 .do source is instrumented and kept in Latin-1."""
+        source_dir = tmp_path / "code"
+        source_dir.mkdir()
+        (source_dir / "clean.do").write_bytes('* café\ngen x = "é"\n'.encode("latin-1"))
+
+        instrumented_dir, files = setup_instrumented_environment([source_dir], tmp_path)
+
+        (instrumented,) = files.values()
+        assert instrumented.executable_lines == {2}
+        key = (source_dir / "clean.do").resolve().as_posix().lstrip("/")
+        copy = (instrumented_dir / "do" / key).read_bytes()
+        assert "* café\n".encode("latin-1") in copy
+        assert 'gen x = "é"'.encode("latin-1") in copy
+        assert get_total_lines(source_dir / "clean.do") == {2}
+
+    def test_setup_instruments_do_files(self, tmp_path):
+        """.do files are instrumented at their absolute path; tests are not."""
+        source_dir = tmp_path / "code"
+        source_dir.mkdir()
+        (source_dir / "clean.do").write_text('gen x = 1\ndo "more.do"\n')
+        (source_dir / "test_clean.do").write_text("assert_true 1\n")
+        (source_dir / "conftest.do").write_text("set seed 1\n")
+
+        instrumented_dir, files = setup_instrumented_environment([source_dir], tmp_path)
+
+        assert [f.path for f in files.values()] == ["code/clean.do"]
+        key = (source_dir / "clean.do").resolve().as_posix().lstrip("/")
+        copy = instrumented_dir / "do" / key.replace(":", "")
+        assert '_stt_do do "more.do"' in copy.read_text()
+        assert not (instrumented_dir / "clean.do").exists()
+
 
 class TestInstrumentDirectory:
     """Tests for instrument_directory function."""
@@ -149,15 +559,74 @@ class TestInstrumentDirectory:
             (source_dir / "notado.txt").write_text("not an ado file")
 
             dest_dir = tmppath / "instrumented"
-            all_maps = instrument_directory(source_dir, dest_dir)
+            files = instrument_directory(source_dir, dest_dir)
 
             # Check both .ado files were instrumented
-            assert "func1.ado" in all_maps
-            assert "func2.ado" in all_maps
+            assert {f.path for f in files.values()} == {"func1.ado", "func2.ado"}
 
             # Check .txt file was not instrumented
             assert not (dest_dir / "notado.txt").exists()
 
+    def test_instrument_nested_letter_folders(self):
+        """Test that adopath-style subfolders are instrumented recursively."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmppath = Path(tmpdir)
+            source_dir = tmppath / "source"
+            (source_dir / "a").mkdir(parents=True)
+            (source_dir / "b").mkdir()
+            (source_dir / "a" / "alpha.ado").write_text("program define alpha\nend\n")
+            (source_dir / "b" / "beta.ado").write_text("program define beta\nend\n")
+
+            dest_dir = tmppath / "instrumented"
+            files = instrument_directory(source_dir, dest_dir)
+
+            assert {f.path for f in files.values()} == {"a/alpha.ado", "b/beta.ado"}
+            # Flat output so a single adopath entry finds every program
+            assert (dest_dir / "alpha.ado").exists()
+            assert (dest_dir / "beta.ado").exists()
+
+
+class TestCollectSources:
+    """Tests for collect_sources function."""
+
+    def test_duplicate_program_files_keep_first_on_adopath(self):
+        """Test that duplicate file names are detected; the first one wins."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmppath = Path(tmpdir)
+            first = tmppath / "first"
+            second = tmppath / "second"
+            (first / "u").mkdir(parents=True)
+            second.mkdir()
+            (first / "u" / "utils.ado").write_text("")
+            (first / "utils.ado").write_text("")
+            (second / "utils.ado").write_text("")
+            (second / "other.ado").write_text("")
+
+            sources, duplicates = collect_sources([first, second])
+
+            assert sources == [first / "utils.ado", second / "other.ado"]
+            assert duplicates == {
+                "utils.ado": [
+                    first / "utils.ado",
+                    first / "u" / "utils.ado",
+                    second / "utils.ado",
+                ]
+            }
+
+    def test_skips_statatest_and_norecursedirs(self):
+        """Test that the instrumented copy and pruned dirs are never sources."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmppath = Path(tmpdir)
+            (tmppath / ".statatest" / "instrumented").mkdir(parents=True)
+            (tmppath / ".statatest" / "instrumented" / "a.ado").write_text("")
+            (tmppath / "vendor").mkdir()
+            (tmppath / "vendor" / "b.ado").write_text("")
+            (tmppath / "c.ado").write_text("")
+
+            sources, _ = collect_sources([tmppath], norecursedirs=["vendor"])
+
+            assert sources == [tmppath / "c.ado"]
+
 
 class TestSetupInstrumentedEnvironment:
     """Tests for setup_instrumented_environment function."""
@@ -172,13 +641,203 @@ class TestSetupInstrumentedEnvironment:
                 "program define test\n    gen x = 1\nend\n"
             )
 
-            instrumented_dir, _maps = setup_instrumented_environment(
+            instrumented_dir, files = setup_instrumented_environment(
                 [source_dir], tmppath
             )
 
             assert instrumented_dir.exists()
             assert instrumented_dir == tmppath / ".statatest" / "instrumented"
             assert (instrumented_dir / "test.ado").exists()
+            assert [f.path for f in files.values()] == ["source/test.ado"]
+
+    def test_setup_reuses_unchanged_files(self):
+        """Test that only changed, new or removed sources are processed."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmppath = Path(tmpdir)
+            source_dir = tmppath / "source"
+            source_dir.mkdir()
+            (source_dir / "keep.ado").write_text("program define keep\nend\n")
+            (source_dir / "edit.ado").write_text("program define edit\nend\n")
+            (source_dir / "drop.ado").write_text("program define drop\nend\n")
+
+            instrumented_dir, before = setup_instrumented_environment(
+                [source_dir], tmppath
+            )
+            assert (instrumented_dir / "manifest.json").exists()
+
+            (source_dir / "edit.ado").write_text(
+                "program define edit\n    gen x = 1\nend\n"
+            )
+            (source_dir / "drop.ado").unlink()
+            (source_dir / "new.ado").write_text("program define new\nend\n")
+
+            with patch(
+                "statatest.coverage.instrument._instrument_source",
+                wraps=_instrument_source,
+            ) as mock_instrument:
+                _, files = setup_instrumented_environment([source_dir], tmppath)
+
+            instrumented = sorted(
+                c.args[0].name for c in mock_instrument.call_args_list
+            )
+            assert instrumented == ["edit.ado", "new.ado"]
+            by_path = {f.path: f for f in files.values()}
+            assert set(by_path) == {
+                "source/keep.ado",
+                "source/edit.ado",
+                "source/new.ado",
+            }
+            assert by_path["source/edit.ado"].line_map == {4: 2}
+
+            # Known sources keep their file id; new sources get an unused one
+            old_ids = {f.path: file_id for file_id, f in before.items()}
+            for path in ("source/keep.ado", "source/edit.ado"):
+                assert by_path[path].file_id == old_ids[path]
+            assert by_path["source/new.ado"].file_id not in old_ids.values()
+            assert not (instrumented_dir / "drop.ado").exists()
+            assert "gen x = 1" in (instrumented_dir / "edit.ado").read_text()
+
+    def test_setup_rebuilds_on_instrumenter_version_change(self):
+        """Test that a manifest from another instrumenter version is discarded."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmppath = Path(tmpdir)
+            source_dir = tmppath / "source"
+            source_dir.mkdir()
+            (source_dir / "a.ado").write_text("program define a\nend\n")
+
+            instrumented_dir, _ = setup_instrumented_environment([source_dir], tmppath)
+            (instrumented_dir / "manifest.json").write_text('{"version": -1}')
+            (instrumented_dir / "orphan.ado").write_text("")
+
+            with patch(
+                "statatest.coverage.instrument._instrument_source",
+                wraps=_instrument_source,
+            ) as mock_instrument:
+                setup_instrumented_environment([source_dir], tmppath)
+
+            assert mock_instrument.call_count == 1
+            assert not (instrumented_dir / "orphan.ado").exists()
+
+    def test_setup_rebuilds_on_probe_mode_change(self):
+        """Test that switching probe modes re-instruments every file."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmppath = Path(tmpdir)
+            source_dir = tmppath / "source"
+            source_dir.mkdir()
+            (source_dir / "a.ado").write_text("program define a\n    gen x = 1\nend\n")
+
+            instrumented_dir, _ = setup_instrumented_environment([source_dir], tmppath)
+            setup_instrumented_environment(
+                [source_dir], tmppath, options=InstrumentOptions(probes="memory")
+            )
+
+            assert "global _stc_" in (instrumented_dir / "a.ado").read_text()
+
+    def test_parallel_instrumentation_matches_sequential(self):
+        """Test that the process pool produces the same files and line maps."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmppath = Path(tmpdir)
+            source_dir = tmppath / "source"
+            source_dir.mkdir()
+            for i in range(40):
+                (source_dir / f"prog{i}.ado").write_text(
+                    f"program define prog{i}\n    gen x{i} = {i}\n"
+                    "    // comment\n    display x\nend\n"
+                )
+
+            seq_dir, seq_maps = setup_instrumented_environment(
+                [source_dir], tmppath / "seq", max_workers=1
+            )
+            par_dir, par_maps = setup_instrumented_environment(
+                [source_dir], tmppath / "par", max_workers=2
+            )
+
+            assert par_maps == seq_maps
+            assert len(par_maps) == 40
+            assert (par_dir / "prog7.ado").read_text() == (
+                seq_dir / "prog7.ado"
+            ).read_text()
+
+
+class TestAdaptiveInstrumentation:
+    """Tests for adaptive instrumentation (probes removed from covered lines)."""
+
+    ADAPTIVE = InstrumentOptions(adaptive=True)
+
+    def _run(self, tmp_path, hits):
+        """Instrument, then record a run with hits keyed by file name."""
+        source_dir = tmp_path / "source"
+        _, files = setup_instrumented_environment(
+            [source_dir], tmp_path, options=self.ADAPTIVE
+        )
+        ids = {Path(f.path).name: str(file_id) for file_id, f in files.items()}
+        result = TestResult(
+            "test_a.do",
+            passed=True,
+            duration=0.0,
+            coverage_hits={ids[name]: counts for name, counts in hits.items()},
+        )
+        report = aggregate_coverage([result], files)
+        record_proven_lines(tmp_path, files, report, self.ADAPTIVE)
+        return files
+
+    def test_covered_lines_lose_their_probes(self, tmp_path):
+        """Test that proven lines are rebuilt without probes and still reported."""
+        source_dir = tmp_path / "source"
+        source_dir.mkdir()
+        (source_dir / "a.ado").write_text(
+            "program define a\n    gen x = 1\n    display x\nend\n"
+        )
+        (source_dir / "b.ado").write_text("program define b\n    gen y = 1\nend\n")
+
+        first = self._run(tmp_path, {"a.ado": {2: 3}})
+        assert sum(f.probe_count for f in first.values()) == 3
+
+        instrumented_dir, files = setup_instrumented_environment(
+            [source_dir], tmp_path, options=self.ADAPTIVE
+        )
+        by_name = {Path(f.path).name: f for f in files.values()}
+        assert by_name["a.ado"].proven == {2: 3}
+        assert by_name["a.ado"].probe_count == 1
+        lines = (instrumented_dir / "a.ado").read_text().split("\n")
+        assert "COV:" not in lines[lines.index("    gen x = 1") - 1]
+        assert "COV:" in lines[lines.index("    display x") - 1]
+
+        report = aggregate_coverage([], files)
+        assert report.files["source/a.ado"].hit_counts == {2: 3}
+        assert report.files["source/a.ado"].lines_total == {2, 3}
+
+        # A source change brings every probe back
+        (source_dir / "b.ado").write_text("program define b\n    gen z = 1\nend\n")
+        _, files = setup_instrumented_environment(
+            [source_dir], tmp_path, options=self.ADAPTIVE
+        )
+        assert sum(f.probe_count for f in files.values()) == 3
+        assert not any(f.proven for f in files.values())
+        lines = (instrumented_dir / "a.ado").read_text().split("\n")
+        assert "COV:" in lines[lines.index("    gen x = 1") - 1]
+
+    def test_branch_lines_keep_their_probes(self, tmp_path):
+        """Test that lines branch outcomes are derived from are never proven."""
+        source_dir = tmp_path / "source"
+        source_dir.mkdir()
+        (source_dir / "a.ado").write_text(
+            "program define a\n"
+            "    gen x = 1\n"
+            "    if x {\n"
+            "        display x\n"
+            "    }\n"
+            "end\n"
+        )
+
+        self._run(tmp_path, {"a.ado": {2: 1, 3: 1, 4: 1}})
+        _, files = setup_instrumented_environment(
+            [source_dir], tmp_path, options=self.ADAPTIVE
+        )
+
+        (instrumented,) = files.values()
+        assert instrumented.proven == {2: 1}
+        assert instrumented.probe_count == 2
 
 
 class TestCleanupInstrumentedEnvironment:
@@ -197,7 +856,41 @@ class TestCleanupInstrumentedEnvironment:
 
             cleanup_instrumented_environment(tmppath)
 
-            assert not statatest_dir.exists()
+            assert not (statatest_dir / "instrumented").exists()
+
+    def test_cleanup_keeps_coverage_data(self, tmp_path):
+        """Indexes are removed; coverage data files survive a cache clear."""
+        statatest_dir = tmp_path / ".statatest"
+        statatest_dir.mkdir()
+        for name in (
+            "discovery-index.json",
+            "source-index.json",
+            "coverage.stcov",
+            "coverage.db",
+        ):
+            (statatest_dir / name).write_text("{}")
+
+        cleanup_instrumented_environment(tmp_path)
+
+        assert sorted(p.name for p in statatest_dir.iterdir()) == [
+            "coverage.db",
+            "coverage.stcov",
+            "instrumented.lock",
+        ]
+
+    def test_cleanup_keeps_running_sessions(self, tmp_path):
+        """Roots of live runs survive a cache clear; stale ones do not."""
+        live = RunRoot.create(tmp_path)
+        stale = tmp_path / ".statatest" / "runs" / "1-dead"
+        stale.mkdir()
+        (stale.parent / "1-dead.lock").touch()
+
+        cleanup_instrumented_environment(tmp_path)
+
+        assert live.path.exists()
+        assert not stale.exists()
+        live.release()
+        assert not live.path.exists()
 
 
 class TestGetTotalLines:
@@ -238,7 +931,8 @@ class TestContinuationLines:
     """Tests for Stata continuation line (///) handling.
 
     In Stata, /// at the end of a line continues the command to the next line.
-    All lines of a multi-line command should be instrumented for coverage.
+    A multi-line command gets one probe, before its first line, and is
+    reported on that line; a probe between its lines would become part of it.
     """
 
     def test_ends_with_continuation_basic(self):
@@ -254,8 +948,8 @@ class TestContinuationLines:
         assert _ends_with_continuation("reghdfe y x ///  ")
         assert _ends_with_continuation("reghdfe y x ///\t")
 
-    def test_instrument_file_continuation_all_lines(self):
-        """Test that all lines in a continuation are instrumented."""
+    def test_instrument_file_continuation_first_line(self):
+        """Test that a continued command is probed before its first line only."""
         with tempfile.TemporaryDirectory() as tmpdir:
             tmppath = Path(tmpdir)
 
@@ -273,27 +967,23 @@ end
             source_path.write_text(source_content)
 
             dest_path = tmppath / "instrumented" / "test_regression.ado"
-            line_map = instrument_file(source_path, dest_path)
+            line_map = instrument_file(source_path, dest_path, 1)
 
             instrumented = dest_path.read_text()
 
             # Line 3 (reghdfe y x ///) - starts the command
-            assert "{* COV:test_regression.ado:3 }" in instrumented
-            # Line 4 (, absorb(id) ///) - continuation
-            assert "{* COV:test_regression.ado:4 }" in instrumented
-            # Line 5 (vce(cluster id)) - final line of continuation
-            assert "{* COV:test_regression.ado:5 }" in instrumented
+            assert "{* COV:1:3 }" in instrumented
+            # Lines 4 and 5 continue it and get no probe
+            assert "{* COV:1:4 }" not in instrumented
+            assert "{* COV:1:5 }" not in instrumented
+            assert "reghdfe y x ///\n        , absorb(id) ///\n" in instrumented
             # Line 6 (display "done") - next command
-            assert "{* COV:test_regression.ado:6 }" in instrumented
+            assert "{* COV:1:6 }" in instrumented
 
-            # All 4 lines should be in the line map
-            assert 3 in line_map.values()
-            assert 4 in line_map.values()
-            assert 5 in line_map.values()
-            assert 6 in line_map.values()
+            assert sorted(line_map.values()) == [3, 6]
 
     def test_get_total_lines_continuation(self):
-        """Test that get_total_lines includes all continuation lines."""
+        """Test that get_total_lines counts a continued command once."""
         with tempfile.TemporaryDirectory() as tmpdir:
             tmppath = Path(tmpdir)
 
@@ -310,10 +1000,7 @@ end
 
             total_lines = get_total_lines(source_path)
 
-            # Lines 3, 4, 5 should all be instrumentable
-            assert 3 in total_lines  # reghdfe y x ///
-            assert 4 in total_lines  # , absorb(id) ///
-            assert 5 in total_lines  # vce(cluster id)
+            assert total_lines == {3}  # reghdfe y x ///
 
     def test_multiple_continuation_blocks(self):
         """Test multiple separate continuation blocks in one file."""
@@ -337,11 +1024,5 @@ end
 
             total_lines = get_total_lines(source_path)
 
-            # First block: lines 4, 5, 6
-            assert 4 in total_lines
-            assert 5 in total_lines
-            assert 6 in total_lines
-
-            # Second block: lines 8, 9
-            assert 8 in total_lines
-            assert 9 in total_lines
+            # One line per command; * comments are not counted
+            assert total_lines == {4, 8}
@@ -0,0 +1,143 @@
+"""Tests for the Stata lexer and statement-level instrumentation."""
+
+from pathlib import Path
+
+from statatest.coverage.instrument import _instrument_source, get_total_lines
+from statatest.coverage.lexer import Statement, lex
+from statatest.coverage.models import InstrumentOptions
+
+
+def _codes(source: str) -> list[tuple[int, str]]:
+    """Return (line, code) of each statement of a source."""
+    return [(s.line, s.code) for s in lex(source.split("\n")).statements]
+
+
+class TestLex:
+    """Tests for splitting Stata code into statements."""
+
+    def test_statements_and_positions(self):
+        """Each line is a statement; positions skip the indentation."""
+        statements = lex(["program define myreg", "    gen x = 1", "end"]).statements
+
+        assert statements[1] == Statement(2, 4, 2, 13, "gen x = 1")
+        assert [s.code for s in statements] == [
+            "program define myreg",
+            "gen x = 1",
+            "end",
+        ]
+
+    def test_comments(self):
+        """Comment lines and trailing comments are not code."""
+        source = """\
+* star comment
+// line comment
+gen x = 1 // trailing
+gen y = 2 /* inline */ + 1
+/* block /* nested */
+   still a comment */ gen z = 3"""
+
+        assert _codes(source) == [
+            (3, "gen x = 1"),
+            (4, "gen y = 2   + 1"),
+            (6, "gen z = 3"),
+        ]
+
+    def test_comment_markers_inside_code(self):
+        """// in a string or a URL and * inside a statement are code."""
+        source = """\
+display "a // b /* c"
+copy http://example.com/data.csv data.csv
+gen y = x * 2"""
+
+        assert _codes(source) == [
+            (1, 'display "a // b /* c"'),
+            (2, "copy http://example.com/data.csv data.csv"),
+            (3, "gen y = x * 2"),
+        ]
+
+    def test_compound_strings(self):
+        """Compound strings may contain quotes and comment markers."""
+        source = 'local s `"say "hi" // `"nested"\' "\' // comment'
+
+        assert _codes(source) == [(1, 'local s `"say "hi" // `"nested"\' "\'')]
+
+    def test_continuation(self):
+        """/// joins lines into one statement reported on its first line."""
+        statements = lex(["regress y x1 ///", "    x2, robust", "gen z = 1"]).statements
+
+        assert [(s.line, s.end_line, s.code) for s in statements] == [
+            (1, 2, "regress y x1      x2, robust"),
+            (3, 3, "gen z = 1"),
+        ]
+
+    def test_delimit(self):
+        """After #delimit ; statements end at semicolons, not line ends."""
+        source = """\
+#delimit ;
+regress y x1
+    x2; gen z = ";";
+* a comment;
+#delimit cr
+gen w = 1"""
+        statements = lex(source.split("\n")).statements
+
+        assert [(s.line, s.code, s.delimited) for s in statements] == [
+            (2, "regress y x1     x2", True),
+            (3, 'gen z = ";"', True),
+            (6, "gen w = 1", False),
+        ]
+        assert (statements[0].end_line, statements[0].end_column) == (3, 7)
+
+    def test_mata_blocks(self):
+        """Mata blocks are reported, not split into Stata statements."""
+        source = """\
+gen x = 1
+mata:
+/* end */
+y = 1
+end
+gen z = 2"""
+        lexed = lex(source.split("\n"))
+
+        assert [s.line for s in lexed.statements] == [1, 6]
+        assert lexed.mata_blocks == [(2, 5)]
+
+
+class TestStatementProbes:
+    """Tests for probes placed by statement."""
+
+    def _instrument(self, tmp_path: Path, source: str) -> str:
+        path = tmp_path / "myreg.ado"
+        path.write_text(source)
+        _instrument_source(path, tmp_path / "out.ado", 1, InstrumentOptions())
+        return (tmp_path / "out.ado").read_text()
+
+    def test_probe_after_comment(self, tmp_path):
+        """A statement after a comment gets its probe on its own line."""
+        instrumented = self._instrument(
+            tmp_path, "program define myreg\n    /* a */ gen x = 1\nend"
+        )
+
+        assert '/* a */ \ndisplay `"{* COV:1:2 }"\'\ngen x = 1' in instrumented
+
+    def test_quietly_block_probes_are_noisy(self, tmp_path):
+        """Log probes inside quietly blocks are displayed with noisily."""
+        source = "program define myreg\n    quietly {\n        gen x = 1\n    }\nend"
+
+        assert 'noisily display `"{* COV:1:3 }"\'' in self._instrument(tmp_path, source)
+
+    def test_delimit_probes_end_with_semicolon(self, tmp_path):
+        """Probes in #delimit ; code are terminated by a semicolon."""
+        source = "#delimit ;\nprogram define myreg;\n    gen x = 1;\nend;"
+
+        assert 'display `"{* COV:1:3 }"\';\n' in self._instrument(tmp_path, source)
+
+    def test_total_lines_follow_statements(self, tmp_path):
+        """Only the first line of a statement is executable."""
+        path = tmp_path / "myreg.ado"
+        path.write_text(
+            "#delimit ;\nprogram define myreg;\n    regress y\n"
+            "        x;\n#delimit cr\n    /* note */\nend"
+        )
+
+        assert get_total_lines(path) == {3}
@@ -0,0 +1,195 @@
+"""Tests for the source index and lazy instrumentation."""
+
+import functools
+from pathlib import Path
+
+from statatest.coverage.aggregator import aggregate_coverage
+from statatest.coverage.instrument import setup_instrumented_environment
+from statatest.coverage.reachability import (
+    SourceIndex,
+    reachable_sources,
+    scan_source,
+    unreachable_sources,
+)
+from statatest.coverage.workspace import RunRoot
+
+
+def _write(path: Path, text: str) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+class TestScanSource:
+    """Tests for reading program definitions and calls."""
+
+    def test_records_definitions_calls_and_do_files(self, tmp_path):
+        """Definitions, names used in code, do targets and fixtures are kept."""
+        path = _write(
+            tmp_path / "myreg.ado",
+            "program define myreg\n"
+            "    // helper_in_comment is not a call\n"
+            "    local cmd myreg_fit\n"
+            "    `cmd' y x\n"
+            '    capture do "$root/code/Clean.do"\n'
+            "    run prepare\n"
+            "    use_fixture panel\n"
+            "end\n"
+            "program define myreg_fit\n"
+            "    regress y x\n"
+            "end\n",
+        )
+
+        entry = scan_source(path)
+
+        assert entry.programs == ["myreg", "myreg_fit"]
+        assert "helper_in_comment" not in entry.calls
+        assert {"cmd", "regress", "fixture_panel"} <= set(entry.calls)
+        assert "myreg_fit" not in entry.calls  # defined here
+        assert entry.do_files == ["clean.do", "prepare.do"]
+        assert entry.lines == [3, 4, 5, 6, 7, 10]
+
+    def test_index_rereads_changed_files(self, tmp_path):
+        """Entries are reused until the file changes, and persist."""
+        path = _write(tmp_path / "a.ado", "program define a\n    b\nend\n")
+        index = SourceIndex.for_project(tmp_path)
+
+        assert "c" not in index.entry(path).calls
+        index.save()
+        _write(path, "program define a\n    b\n    c\nend\n")
+
+        reloaded = SourceIndex.for_project(tmp_path)
+        assert reloaded.entries == index.entries
+        assert {"b", "c"} <= set(reloaded.entry(path).calls)
+
+
+class TestReachableSources:
+    """Tests for finding the sources the selected tests can reach."""
+
+    def _project(self, tmp_path):
+        code = tmp_path / "code"
+        sources = {
+            "code/a.ado": _write(
+                code / "a.ado", 'program define a\n    b_fit\n    do "clean.do"\nend\n'
+            ),
+            "code/b.ado": _write(
+                code / "b.ado",
+                "program define b\nend\nprogram define b_fit\n    c\nend\n",
+            ),
+            "code/c.ado": _write(code / "c.ado", "program define c\nend\n"),
+            "code/d.ado": _write(code / "d.ado", "program define d\n    a\nend\n"),
+            "code/clean.do": _write(code / "clean.do", "gen x = 1\n"),
+            "code/other.do": _write(code / "other.do", "gen y = 1\n"),
+            "code/fixture_panel.ado": _write(
+                code / "fixture_panel.ado", "program define fixture_panel\nend\n"
+            ),
+        }
+        test = _write(
+            tmp_path / "tests" / "test_a.do",
+            "// @uses_fixture: panel\nprogram define test_a\n    a\nend\n",
+        )
+        return sources, test
+
+    def test_follows_calls_do_files_and_fixtures(self, tmp_path):
+        """Programs are reached by file name or by a program they define."""
+        sources, test = self._project(tmp_path)
+
+        reached = reachable_sources(sources, [test], SourceIndex())
+
+        assert reached == {
+            "code/a.ado",
+            "code/b.ado",
+            "code/c.ado",
+            "code/clean.do",
+            "code/fixture_panel.ado",
+        }
+
+    def test_unreachable_sources_keep_their_lines(self, tmp_path):
+        """Unreachable sources are returned with their executable lines."""
+        sources, test = self._project(tmp_path)
+
+        unreached = unreachable_sources(
+            sources, [test, tmp_path / "missing.do"], SourceIndex()
+        )
+
+        assert unreached == {"code/d.ado": [2], "code/other.do": [1]}
+
+    def test_latin1_files_are_scanned(self, tmp_path):
+        """Test and source files that are not UTF-8 are read as Latin-1."""
+        source = tmp_path / "code" / "a.ado"
+        source.parent.mkdir()
+        source.write_bytes(
+            "program define a\n    // café\n    b\nend\n".encode("latin-1")
+        )
+        b = _write(tmp_path / "code" / "b.ado", "program define b\nend\n")
+        test = tmp_path / "test_a.do"
+        test.write_bytes("// café\na\n".encode("latin-1"))
+
+        reached = reachable_sources(
+            {"code/a.ado": source, "code/b.ado": b}, [test], SourceIndex()
+        )
+
+        assert reached == {"code/a.ado", "code/b.ado"}
+
+    def test_unreadable_sources_are_reachable(self, tmp_path):
+        """A source that cannot be read is not reported as not loaded."""
+        sources, test = self._project(tmp_path)
+        unreadable = tmp_path / "code" / "e.ado"
+        unreadable.mkdir()
+        sources["code/e.ado"] = unreadable
+
+        unreached = unreachable_sources(sources, [test], SourceIndex())
+
+        assert "code/e.ado" not in unreached
+        assert unreached == {"code/d.ado": [2], "code/other.do": [1]}
+
+
+class TestLazyInstrumentation:
+    """Tests for instrumenting only the reachable sources."""
+
+    def test_unreached_sources_are_not_instrumented(self, tmp_path):
+        """Unreached sources run uninstrumented and are reported not loaded."""
+        source_dir = tmp_path / "code"
+        _write(source_dir / "a.ado", "program define a\n    gen x = 1\nend\n")
+        _write(source_dir / "b.ado", "program define b\n    gen y = 1\nend\n")
+        test = _write(tmp_path / "tests" / "test_a.do", "a\n")
+        lazy = functools.partial(
+            unreachable_sources, entry_points=[test], index=SourceIndex()
+        )
+
+        with RunRoot.create(tmp_path) as run_root:
+            run_dir, files = setup_instrumented_environment(
+                [source_dir], tmp_path, run_root=run_root, lazy=lazy
+            )
+
+            by_path = {f.path: f for f in files.values()}
+            assert by_path["code/a.ado"].instrumented
+            assert not by_path["code/b.ado"].instrumented
+            assert by_path["code/b.ado"].probe_count == 0
+            assert "COV:" in (run_dir / "a.ado").read_text()
+            assert (run_dir / "b.ado").read_text() == (source_dir / "b.ado").read_text()
+            shared = tmp_path / ".statatest" / "instrumented"
+            assert not (shared / "b.ado").exists()
+
+        report = aggregate_coverage([], files)
+        assert report.files["code/b.ado"].lines_total == {2}
+        assert report.files["code/b.ado"].coverage_percent == 0.0
+
+    def test_cached_copies_are_used(self, tmp_path):
+        """An unreached source with an up-to-date instrumented copy uses it."""
+        source_dir = tmp_path / "code"
+        _write(source_dir / "a.ado", "program define a\n    gen x = 1\nend\n")
+        _write(source_dir / "b.ado", "program define b\n    gen y = 1\nend\n")
+        setup_instrumented_environment([source_dir], tmp_path)
+        test = _write(tmp_path / "tests" / "test_a.do", "a\n")
+        lazy = functools.partial(
+            unreachable_sources, entry_points=[test], index=SourceIndex()
+        )
+
+        with RunRoot.create(tmp_path) as run_root:
+            run_dir, files = setup_instrumented_environment(
+                [source_dir], tmp_path, run_root=run_root, lazy=lazy
+            )
+
+            assert all(f.instrumented for f in files.values())
+            assert "COV:" in (run_dir / "b.ado").read_text()
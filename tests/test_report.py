@@ -8,7 +8,7 @@ import pytest
 
 from statatest.core.models import TestResult
 from statatest.coverage.reporter import generate_html, generate_lcov
-from statatest.reporting import write_junit_xml
+from statatest.reporting import Timings, format_timings, write_junit_xml
 
 
 @pytest.fixture
@@ -84,8 +84,8 @@ def test_generate_lcov():
             passed=True,
             duration=1.0,
             coverage_hits={
-                "myfunction.ado": {1, 2, 3, 5, 7},
-                "other.ado": {10, 20},
+                "myfunction.ado": {1: 1, 2: 1, 3: 1, 5: 1, 7: 1},
+                "other.ado": {10: 1, 20: 1},
             },
         ),
     ]
@@ -112,13 +112,13 @@ def test_generate_lcov_aggregates_coverage():
             test_file="test1.do",
             passed=True,
             duration=1.0,
-            coverage_hits={"myfunction.ado": {1, 2, 3}},
+            coverage_hits={"myfunction.ado": {1: 1, 2: 1, 3: 1}},
         ),
         TestResult(
             test_file="test2.do",
             passed=True,
             duration=1.0,
-            coverage_hits={"myfunction.ado": {3, 4, 5}},
+            coverage_hits={"myfunction.ado": {3: 1, 4: 1, 5: 1}},
         ),
     ]
 
@@ -128,9 +128,11 @@ def test_generate_lcov_aggregates_coverage():
 
         content = output_path.read_text()
 
-        # Lines 1-5 should all be covered (union of both test results)
-        for line in range(1, 6):
+        # Lines 1-5 should all be covered (union of both test results);
+        # line 3 ran once in each test
+        for line in (1, 2, 4, 5):
             assert f"DA:{line},1" in content
+        assert "DA:3,2" in content
 
 
 def test_write_junit_xml_with_stdout():
@@ -181,7 +183,7 @@ def test_generate_html_creates_index():
             test_file="test.do",
             passed=True,
             duration=1.0,
-            coverage_hits={"myfunction.ado": {1, 2, 3}},
+            coverage_hits={"myfunction.ado": {1: 1, 2: 1, 3: 1}},
         ),
     ]
 
@@ -205,8 +207,8 @@ def test_generate_html_creates_file_reports():
             passed=True,
             duration=1.0,
             coverage_hits={
-                "myfunction.ado": {1, 2, 3},
-                "helper/utils.ado": {10, 20},
+                "myfunction.ado": {1: 1, 2: 1, 3: 1},
+                "helper/utils.ado": {10: 1, 20: 1},
             },
         ),
     ]
@@ -228,13 +230,13 @@ def test_generate_html_multiple_results():
             test_file="test1.do",
             passed=True,
             duration=1.0,
-            coverage_hits={"file.ado": {1, 2}},
+            coverage_hits={"file.ado": {1: 1, 2: 1}},
         ),
         TestResult(
             test_file="test2.do",
             passed=True,
             duration=1.0,
-            coverage_hits={"file.ado": {2, 3}},
+            coverage_hits={"file.ado": {2: 1, 3: 1}},
         ),
     ]
 
@@ -245,3 +247,21 @@ def test_generate_html_multiple_results():
         index_content = (output_dir / "index.html").read_text()
         # Should show file in index with combined coverage
         assert "file.ado" in index_content
+
+
+def test_format_timings():
+    """Test that phase timings are listed in order with a total."""
+    timings = Timings()
+    with timings.measure("collection"):
+        pass
+    timings.phases["instrumentation"] = 1.5
+    timings.note("instrumentation", "3 files, 42 probes")
+
+    lines = format_timings(timings)
+
+    assert lines[0] == "Timings:"
+    assert lines[1].split()[0] == "collection"
+    assert "1.500s" in lines[2]
+    assert "(3 files, 42 probes)" in lines[2]
+    assert lines[-1].split()[0] == "total"
+    assert format_timings(Timings()) == []
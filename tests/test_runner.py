@@ -6,12 +6,22 @@ from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 from statatest.core.config import Config
-from statatest.core.models import TestFile
+from statatest.core.models import TestFile, TestResult
 from statatest.execution import run_tests
-from statatest.execution.executor import _get_ado_paths, _run_single_test
+from statatest.execution.executor import (
+    _cleanup_environment,
+    _get_ado_paths,
+    _prepare_environment,
+    _run_single_test,
+)
+from statatest.execution.models import StataOutput
 from statatest.execution.parser import (
     extract_error_message as _extract_error_message,
 )
+from statatest.execution.parser import (
+    parse_coverage_counts,
+    parse_test_output,
+)
 from statatest.execution.parser import (
     parse_coverage_markers as _parse_coverage_markers,
 )
@@ -63,6 +73,15 @@ class TestCreateWrapperDo:
         assert 'adopath + "/pkg/ado/assertions"' in wrapper
         assert "// Additional ado paths" in wrapper
 
+    def test_instrumented_dir_sets_do_redirect(self):
+        """Test that _stt_do is told where instrumented .do files are."""
+        wrapper = _create_wrapper_do(
+            Path("test_example.do"), {}, [], instrumented_dir=Path("/p/instr")
+        )
+
+        assert 'adopath ++ "/p/instr"' in wrapper
+        assert f'global STATATEST_DO_DIR "{Path("/p/instr/do")}"' in wrapper
+
     def test_includes_conftest_files(self):
         """Test that conftest.do files are loaded."""
         test_path = Path("/project/tests/test_example.do")
@@ -144,6 +163,27 @@ class TestCreateWrapperDo:
         test_pos = wrapper.find("test_example.do")
         assert setup_pos < test_pos
 
+    def test_writes_coverage_counters_after_test(self):
+        """Test that counts_path flushes counters once, even if the test fails."""
+        wrapper = _create_wrapper_do(
+            Path("test_example.do"),
+            {},
+            [],
+            log_path=Path("/project/.statatest/cov.smcl"),
+            counts_path=Path("/project/.statatest/cov.cov"),
+        )
+
+        assert 'capture noisily do "test_example.do"' in wrapper
+        assert 'local _stt_counters : all globals "_stc_*"' in wrapper
+        assert (
+            'file open `_stt_fh\' using "/project/.statatest/cov.cov", write text replace'
+            in wrapper
+        )
+        assert "if `_stt_rc' exit `_stt_rc'" in wrapper
+        # Counters are written after the test and before the log is closed
+        test_pos = wrapper.find("test_example.do")
+        assert test_pos < wrapper.find("file write") < wrapper.find("log close")
+
 
 class TestParseCoverageMarkers:
     """Tests for _parse_coverage_markers function."""
@@ -163,7 +203,7 @@ class TestParseCoverageMarkers:
 
         hits = _parse_coverage_markers(smcl)
 
-        assert hits["file.ado"] == {1, 5, 10}
+        assert hits["file.ado"] == {1: 1, 5: 1, 10: 1}
 
     def test_parses_multiple_files(self):
         """Test parsing markers for multiple files."""
@@ -171,8 +211,8 @@ class TestParseCoverageMarkers:
 
         hits = _parse_coverage_markers(smcl)
 
-        assert hits["a.ado"] == {1, 3}
-        assert hits["b.ado"] == {2}
+        assert hits["a.ado"] == {1: 1, 3: 1}
+        assert hits["b.ado"] == {2: 1}
 
     def test_returns_empty_when_no_markers(self):
         """Test that empty dict is returned when no markers found."""
@@ -183,6 +223,39 @@ class TestParseCoverageMarkers:
         assert hits == {}
 
 
+class TestParseCoverageCounts:
+    """Tests for parse_coverage_counts function."""
+
+    def test_parses_counters(self):
+        """Test parsing flushed in-memory counters."""
+        content = "_stc_3_12 57\n_stc_3_14 1\n_stc_10_2 1000000\n"
+
+        hits = parse_coverage_counts(content)
+
+        assert hits == {"3": {12: 57, 14: 1}, "10": {2: 1000000}}
+
+    def test_parses_branch_counters(self):
+        """Test that branch probe counters keep their suffixed file id."""
+        hits = parse_coverage_counts("_stc_3_12 5\n_stc_3b_12 2\n")
+
+        assert hits == {"3": {12: 5}, "3b": {12: 2}}
+
+    def test_counts_are_merged_into_test_result(self):
+        """Test that counters and log markers both end up in the result."""
+        test = TestFile(path=Path("tests/test_a.do"))
+        output = StataOutput(
+            returncode=0,
+            log_content="{* COV:1:5 }",
+            stderr="",
+            duration=0.1,
+            coverage_counts="_stc_1_5 2\n_stc_2_7 3\n",
+        )
+
+        result = parse_test_output(test, output, coverage=True)
+
+        assert result.coverage_hits == {"1": {5: 3}, "2": {7: 3}}
+
+
 class TestExtractErrorMessage:
     """Tests for _extract_error_message function."""
 
@@ -278,6 +351,22 @@ class TestRunTests:
         call_args = mock_run_single.call_args
         assert call_args[0][3] == instr_dir  # instrumented_dir arg
 
+    @patch("statatest.execution.executor._run_single_test")
+    def test_runs_tests_in_shared_pool(self, mock_run_single):
+        """Test that workers > 1 runs all tests and keeps result order."""
+        config = Config(workers=3)
+        tests = [TestFile(path=Path(f"/t{i}.do")) for i in range(5)]
+
+        def fake_run(test, *args):
+            return TestResult(test_file=test.path.name, passed=True, duration=0.1)
+
+        mock_run_single.side_effect = fake_run
+
+        results = run_tests(tests, config)
+
+        assert [r.test_file for r in results] == [f"t{i}.do" for i in range(5)]
+        assert mock_run_single.call_count == 5
+
 
 class TestRunSingleTest:
     """Tests for _run_single_test function."""
@@ -325,3 +414,24 @@ class TestRunSingleTest:
 
         assert result.passed is False
         assert "not found" in result.error_message.lower()
+
+
+class TestPrepareEnvironment:
+    """Tests for _prepare_environment function."""
+
+    def test_redirects_latin1_test_file(self, tmp_path):
+        """A Latin-1 test file is redirected and keeps its encoding."""
+        test_path = tmp_path / "test_cafe.do"
+        test_path.write_bytes('// café\ndo "clean.do"\n'.encode("latin-1"))
+
+        env = _prepare_environment(
+            TestFile(path=test_path), Config(), True, tmp_path / "instrumented"
+        )
+        try:
+            (copy,) = env.redirected_paths
+            assert copy.read_bytes() == (
+                '// café\n_stt_do do "clean.do"\n'.encode("latin-1")
+            )
+            assert str(copy) in env.wrapper_path.read_text()
+        finally:
+            _cleanup_environment(env)